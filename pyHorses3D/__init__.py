@@ -5,14 +5,54 @@ pyHorses3D - Python interface for the Horses3D CFD solver
 
 This package provides tools to interact with the Horses3D CFD solver,
 manage control files, process simulation results, and visualize data.
+
+Classes and submodules are imported on first access, so that importing the
+package (or running the command-line interface) does not pay for modules and
+dependencies it does not use.
 """
 
-from .horses3d import Horses3D
-from .control import Horses3DControl
-from .plot import Horses3DPlot
-from .mesh import Horses3DMesh
-from .solution import Horses3DSolution
-from . import examples
-from . import cli
+import importlib
 
 __version__ = '0.2.0'
+
+# Public name -> submodule that defines it
+_LAZY_ATTRIBUTES = {
+    'Horses3D': 'horses3d',
+    'Horses3DControl': 'control',
+    'Horses3DPlot': 'plot',
+    'Horses3DMesh': 'mesh',
+    'Horses3DSolution': 'solution',
+    'Horses3DArchive': 'archive',
+    'Horses3DCatalog': 'catalog',
+    'Horses3DChunkedArray': 'chunked',
+    'Horses3DStatistics': 'stats',
+    'Horses3DDerivatives': 'derivatives',
+    'Horses3DGeometry': 'geometry',
+    'Horses3DIntegrals': 'integrals',
+    'Horses3DMonitors': 'monitors',
+    'Horses3DPOD': 'decomposition',
+    'Horses3DProbes': 'probes',
+    'Horses3DResampler': 'resampling',
+    'Horses3DResourceSampler': 'resources',
+    'Horses3DLine': 'probes',
+    'Horses3DSharedMesh': 'sharedmesh',
+    'Horses3DTelemetry': 'telemetry',
+    'Horses3DWatcher': 'watch',
+}
+
+_LAZY_SUBMODULES = ('examples', 'cli')
+
+__all__ = list(_LAZY_ATTRIBUTES) + list(_LAZY_SUBMODULES)
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(f'.{_LAZY_ATTRIBUTES[name]}', __name__), name)
+    elif name in _LAZY_SUBMODULES:
+        value = importlib.import_module(f'.{name}', __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
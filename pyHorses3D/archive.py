@@ -0,0 +1,277 @@
+# archive.py
+
+"""
+Chunked, compressed time-series archives for Horses3D runs.
+
+An archive packs the snapshots of a run, its mesh and its metadata into a
+single zip file. Every conserved variable is split into chunks of
+``blockSize`` elements by ``timeBlock`` snapshots, so reading a subset of
+elements or times only decompresses the chunks that cover it.
+"""
+
+import json
+import zipfile
+import numpy as np
+from .hsol import read_header, index_selection
+from .solution import Horses3DSolution
+from .mesh import Horses3DMesh
+
+ARCHIVE_FORMAT = 'pyHorses3D-archive'
+ARCHIVE_VERSION = 1
+
+def _shuffle(array):
+    # Group bytes by significance so that deflate sees long runs of similar exponents
+    raw = np.ascontiguousarray(array).view(np.uint8).reshape(-1, array.dtype.itemsize)
+    return np.ascontiguousarray(raw.T).tobytes()
+
+def _unshuffle(buffer, dtype, shape):
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(buffer, dtype=np.uint8).reshape(dtype.itemsize, -1)
+    return np.ascontiguousarray(raw.T).view(dtype).reshape(shape)
+
+def pack_run(solutionFiles, archivePath, meshFile=None, control=None,
+             blockSize=1024, timeBlock=16, dtype=None, compresslevel=6):
+    """
+    Pack the snapshots of a run into a chunked, compressed archive.
+
+    Snapshots are read one at a time and buffered ``timeBlock`` at a time,
+    so memory use does not depend on the number of snapshots.
+
+    Args:
+        solutionFiles (list): Solution files to pack, in time order
+        archivePath (str): Path of the archive to create
+        meshFile (str, optional): Mesh file to store alongside the snapshots
+        control (Horses3DControl, optional): Control object whose parameters
+                                             are stored as metadata
+        blockSize (int, optional): Elements per chunk. Defaults to 1024.
+        timeBlock (int, optional): Snapshots per chunk. Defaults to 16.
+        dtype (str, optional): Storage dtype (e.g. 'float32'). Defaults to
+                               the dtype returned by the reader.
+        compresslevel (int, optional): Deflate level (0-9). Defaults to 6.
+
+    Returns:
+        str: The path of the archive
+    """
+    if not solutionFiles:
+        raise ValueError("No solution files to pack")
+
+    reader = Horses3DSolution()
+    variables = list(reader.magnitudes.keys())
+    metadata = {
+        'format': ARCHIVE_FORMAT,
+        'version': ARCHIVE_VERSION,
+        'blockSize': int(blockSize),
+        'timeBlock': int(timeBlock),
+        'files': [],
+        'times': [],
+        'iterations': [],
+        'refValues': [],
+        'mesh': meshFile is not None,
+        'control': dict(control.parameters) if control is not None else {},
+    }
+
+    with zipfile.ZipFile(archivePath, 'w', compression=zipfile.ZIP_DEFLATED,
+                         compresslevel=compresslevel) as zf:
+
+        def write_chunk(name, array):
+            with zf.open(name, 'w', force_zip64=True) as member:
+                member.write(_shuffle(array))
+
+        def flush(buffer, timeChunk):
+            block = np.stack(buffer)
+            for v, variable in enumerate(variables):
+                for e, start in enumerate(range(0, block.shape[1], blockSize)):
+                    write_chunk(f"Q/{variable}/t{timeChunk}/e{e}.bin",
+                                block[:, start:start + blockSize, ..., v])
+
+        buffer = []
+        for solutionFile in solutionFiles:
+            header = read_header(solutionFile)
+            Q = reader._Q_from_file(solutionFile).transpose(0,2,3,4,1)
+            if dtype is not None:
+                Q = Q.astype(dtype)
+
+            if not metadata['files']:
+                if Q.shape[-1] > len(variables):
+                    variables += [f"q{i}" for i in range(len(variables), Q.shape[-1])]
+                variables = variables[:Q.shape[-1]]
+                metadata.update({
+                    'variables': variables,
+                    'nElements': int(Q.shape[0]),
+                    'nodes': [int(n) for n in Q.shape[1:4]],
+                    'dtype': Q.dtype.str,
+                    'fileType': header['fileType'],
+                    'nodeType': header['nodeType'],
+                })
+            elif Q.shape[:4] != (metadata['nElements'], *metadata['nodes']):
+                raise ValueError(f"Snapshot {solutionFile} does not match the shape of the first snapshot")
+
+            metadata['files'].append(str(solutionFile))
+            metadata['times'].append(header['time'])
+            metadata['iterations'].append(header['iteration'])
+            metadata['refValues'].append(header['refValues'].tolist())
+
+            buffer.append(Q)
+            if len(buffer) == timeBlock:
+                flush(buffer, (len(metadata['files']) - 1) // timeBlock)
+                buffer = []
+
+        if buffer:
+            flush(buffer, (len(metadata['files']) - 1) // timeBlock)
+
+        if meshFile is not None:
+            mesh = Horses3DMesh()._Q_from_file(meshFile).transpose(0,2,3,4,1)
+            metadata['meshDtype'] = mesh.dtype.str
+            metadata['meshNodes'] = [int(n) for n in mesh.shape[1:4]]
+            for e, start in enumerate(range(0, mesh.shape[0], blockSize)):
+                write_chunk(f"mesh/e{e}.bin", mesh[start:start + blockSize])
+
+        zf.writestr('metadata.json', json.dumps(metadata))
+
+    return archivePath
+
+class Horses3DArchive:
+    """
+    Reader for archives created with :func:`pack_run`.
+
+    Attributes:
+        metadata (dict): Archive metadata (shapes, times, iterations, ...)
+        variables (list): Names of the stored conserved variables
+        times (numpy.ndarray): Physical time of each snapshot
+        iterations (numpy.ndarray): Iteration of each snapshot
+    """
+    def __init__(self, archivePath):
+        """
+        Open an archive for reading.
+
+        Args:
+            archivePath (str): Path to the archive
+        """
+        self.archivePath = archivePath
+        self._zf = zipfile.ZipFile(archivePath, 'r')
+        self.metadata = json.loads(self._zf.read('metadata.json'))
+        if self.metadata.get('format') != ARCHIVE_FORMAT:
+            raise IOError(f"Not a pyHorses3D archive: {archivePath}")
+
+        self.variables = self.metadata['variables']
+        self.times = np.asarray(self.metadata['times'])
+        self.iterations = np.asarray(self.metadata['iterations'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.times)
+
+    def close(self):
+        self._zf.close()
+
+    @property
+    def nElements(self):
+        return self.metadata['nElements']
+
+    def _read_chunk(self, name, dtype, shape):
+        return _unshuffle(self._zf.read(name), dtype, shape)
+
+    def readVariable(self, variable, elements=None, times=None):
+        """
+        Read one conserved variable for a subset of elements and snapshots.
+
+        Only the chunks overlapping the selection are decompressed.
+
+        Args:
+            variable (str): Variable name (e.g. 'rho', 'rhou', 'rhoe')
+            elements (slice, tuple or array, optional): Element selection.
+                     A (start, stop) tuple selects a contiguous range.
+                     Defaults to all elements.
+            times (slice or array, optional): Snapshot selection. Defaults to all.
+
+        Returns:
+            numpy.ndarray: Array of shape (nTimes, nElements, N1, N2, N3)
+        """
+        if variable not in self.variables:
+            raise ValueError(f"Invalid variable. Please provide one of: {', '.join(self.variables)}.")
+
+        meta = self.metadata
+        blockSize, timeBlock = meta['blockSize'], meta['timeBlock']
+        nTimes, nElements = len(self.times), meta['nElements']
+        elements = index_selection(elements, nElements)
+        times = index_selection(times, nTimes)
+
+        out = np.empty((len(times), len(elements), *meta['nodes']), dtype=meta['dtype'])
+        eBlocks = elements // blockSize
+        tBlocks = times // timeBlock
+        for tb in np.unique(tBlocks):
+            tMask = np.nonzero(tBlocks == tb)[0]
+            tLocal = times[tMask] - tb*timeBlock
+            nt = min(timeBlock, nTimes - tb*timeBlock)
+            for eb in np.unique(eBlocks):
+                eMask = np.nonzero(eBlocks == eb)[0]
+                eLocal = elements[eMask] - eb*blockSize
+                ne = min(blockSize, nElements - eb*blockSize)
+                chunk = self._read_chunk(f"Q/{variable}/t{tb}/e{eb}.bin", meta['dtype'],
+                                         (nt, ne, *meta['nodes']))
+                out[np.ix_(tMask, eMask)] = chunk[np.ix_(tLocal, eLocal)]
+        return out
+
+    def readSnapshots(self, elements=None, times=None):
+        """
+        Read all conserved variables in the layout used by Horses3DSolution.
+
+        Args:
+            elements (slice, tuple or array, optional): Element selection
+            times (slice or array, optional): Snapshot selection
+
+        Returns:
+            numpy.ndarray: Array of shape (nTimes, nElements, N1, N2, N3, nVariables)
+        """
+        return np.stack([self.readVariable(variable, elements, times) for variable in self.variables], axis=-1)
+
+    def readHeaders(self, times=None):
+        """
+        Header fields of the archived snapshots, as returned by hsol.read_header.
+
+        Args:
+            times (slice or array, optional): Snapshot selection
+
+        Returns:
+            list: One header dictionary per selected snapshot
+        """
+        meta = self.metadata
+        return [{
+            'title': '',
+            'fileType': meta['fileType'],
+            'nodeType': meta['nodeType'],
+            'nElements': meta['nElements'],
+            'iteration': int(self.iterations[t]),
+            'time': float(self.times[t]),
+            'refValues': np.asarray(meta['refValues'][t]),
+        } for t in index_selection(times, len(self.times))]
+
+    def readMesh(self, elements=None):
+        """
+        Read the mesh node coordinates stored in the archive.
+
+        Args:
+            elements (slice, tuple or array, optional): Element selection
+
+        Returns:
+            numpy.ndarray: Array of shape (nElements, N1, N2, N3, 3)
+        """
+        meta = self.metadata
+        if not meta['mesh']:
+            raise ValueError(f"Archive has no mesh: {self.archivePath}")
+
+        blockSize, nElements = meta['blockSize'], meta['nElements']
+        elements = index_selection(elements, nElements)
+        out = np.empty((len(elements), *meta['meshNodes'], 3), dtype=meta['meshDtype'])
+        eBlocks = elements // blockSize
+        for eb in np.unique(eBlocks):
+            eMask = np.nonzero(eBlocks == eb)[0]
+            ne = min(blockSize, nElements - eb*blockSize)
+            chunk = self._read_chunk(f"mesh/e{eb}.bin", meta['meshDtype'], (ne, *meta['meshNodes'], 3))
+            out[eMask] = chunk[elements[eMask] - eb*blockSize]
+        return out
@@ -0,0 +1,187 @@
+# batch.py
+
+"""
+Parallel batch post-processing of Horses3D time series.
+
+Every selected snapshot is decoded, its derived fields are computed and the
+fields are written to one .npz file per snapshot. Snapshots are independent,
+so they are spread over a pool of worker processes. The mesh and its metric
+terms are computed once and placed in shared memory, and the workers attach
+to them without copying.
+"""
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+from .hsol import read_header
+from .mesh import Horses3DMesh
+from .solution import Horses3DSolution
+
+DEFAULT_FIELDS = ('V', 'p', 'T', 'a', 'M')
+
+# Per-process state set by the pool initializer
+_worker = {}
+
+def select_files(solutionFiles=(), patterns=None, selection=None):
+    """
+    Select solution files by glob patterns and/or an index range.
+
+    Args:
+        solutionFiles (list, optional): Candidate files, e.g. from Horses3D.getSolutionFileNames
+        patterns (list, optional): Glob patterns whose matches replace the candidates
+        selection (str or slice, optional): Range of the sorted files, as a slice or a
+                                            'start:stop[:step]' string (Python slice semantics)
+
+    Returns:
+        list: Selected files, sorted and without duplicates
+    """
+    if patterns:
+        solutionFiles = [f for pattern in patterns for f in glob.glob(pattern)]
+    files = sorted(set(solutionFiles))
+
+    if isinstance(selection, str):
+        selection = slice(*[int(part) if part else None for part in selection.split(':')])
+    return files[selection] if selection is not None else files
+
+@lru_cache(maxsize=4)
+def _mesh_derivatives(meshFile, size, mtime):
+    from .derivatives import Horses3DDerivatives
+    mesh = Horses3DMesh()._Q_from_file(meshFile).transpose(0,2,3,4,1)
+    return Horses3DDerivatives(mesh, read_header(meshFile)['nodeType'])
+
+def mesh_derivatives(meshFile):
+    """
+    Derivative operator of a mesh file, built once per process and file.
+
+    Args:
+        meshFile (str): Mesh file, or a glob pattern whose first match (sorted) is used,
+                        e.g. when the solver has not written the mesh yet at setup time
+
+    Returns:
+        Horses3DDerivatives: The operator
+    """
+    if glob.has_magic(meshFile):
+        matches = sorted(glob.glob(meshFile))
+        if not matches:
+            raise FileNotFoundError(f"No mesh file matches {meshFile}")
+        meshFile = matches[0]
+    stat = os.stat(meshFile)
+    return _mesh_derivatives(os.path.abspath(meshFile), stat.st_size, stat.st_mtime_ns)
+
+def process_file(solutionFile, fields=DEFAULT_FIELDS, outputDirectory='POST', derivatives=None, meshFile=None):
+    """
+    Decode one snapshot, compute its fields and write them as .npz.
+
+    The output holds one array per field, of shape (nElements, N1, N2, N3),
+    plus the snapshot 'time' and 'iteration'.
+
+    Args:
+        solutionFile (str): Solution file
+        fields (tuple, optional): Conserved or derived quantities to write
+        outputDirectory (str, optional): Directory of the output. Defaults to 'POST'.
+        derivatives (Horses3DDerivatives, optional): Operator for vorticity, Q and lambda-2
+        meshFile (str, optional): Mesh file or glob pattern, used for vorticity, Q and lambda-2
+                                  when no derivatives are given (see :func:`mesh_derivatives`).
+                                  Unlike derivatives, it is cheap to pass to worker processes.
+
+    Returns:
+        dict: 'file', 'output', 'elements', 'bytes' and 'seconds'
+    """
+    start = time.perf_counter()
+    if derivatives is None and meshFile is not None \
+            and any(field in Horses3DSolution.gradientQuantities for field in fields):
+        derivatives = mesh_derivatives(meshFile)
+    header = read_header(solutionFile)
+    snapshot = Horses3DSolution()
+    snapshot.loadSingleSolution(solutionFile)
+    snapshot.computeQuantities(0, fields, derivatives)
+
+    Q = snapshot.solution[0]
+    name = os.path.splitext(os.path.basename(solutionFile))[0]
+    output = os.path.join(outputDirectory, name + '.npz')
+    np.savez(output, time=header['time'], iteration=header['iteration'],
+             **{field: Q[..., snapshot.magnitudes[field]] for field in fields})
+
+    return {
+        'file': solutionFile,
+        'output': output,
+        'elements': Q.shape[0],
+        'bytes': os.path.getsize(solutionFile),
+        'seconds': time.perf_counter() - start,
+    }
+
+def _initialize_worker(fields, outputDirectory, meshHandle):
+    _worker['fields'] = fields
+    _worker['outputDirectory'] = outputDirectory
+    _worker['derivatives'] = None
+    if meshHandle is not None:
+        from .sharedmesh import Horses3DSharedMesh
+        _worker['mesh'] = Horses3DSharedMesh.attach(meshHandle)
+        _worker['derivatives'] = _worker['mesh'].derivatives()
+
+def _process_in_worker(solutionFile):
+    return process_file(solutionFile, _worker['fields'], _worker['outputDirectory'], _worker['derivatives'])
+
+def process_series(solutionFiles, fields=DEFAULT_FIELDS, outputDirectory='POST', jobs=1, meshFile=None, callback=None):
+    """
+    Process a series of snapshots, in parallel when jobs > 1.
+
+    Args:
+        solutionFiles (list): Solution files to process
+        fields (tuple, optional): Conserved or derived quantities to write. Defaults to V, p, T, a and M.
+        outputDirectory (str, optional): Directory of the outputs (created if needed). Defaults to 'POST'.
+        jobs (int, optional): Number of worker processes. Defaults to 1.
+        meshFile (str, optional): Mesh file, required for vorticity, Q and lambda-2
+        callback (callable, optional): Called with the result of each file as it completes
+
+    Returns:
+        dict: Totals ('files', 'elements', 'bytes', 'seconds'), throughput
+              ('filesPerSecond', 'elementsPerSecond', 'megabytesPerSecond') and
+              the per-file 'results'
+    """
+    fields = tuple(fields)
+    needsMesh = any(field in Horses3DSolution.gradientQuantities for field in fields)
+    if needsMesh and meshFile is None:
+        raise ValueError("Vorticity, Q and lambda-2 need the mesh file")
+
+    os.makedirs(outputDirectory, exist_ok=True)
+    start = time.perf_counter()
+    results = []
+
+    if jobs > 1 and len(solutionFiles) > 1:
+        from .sharedmesh import Horses3DSharedMesh
+        shared = Horses3DSharedMesh.fromFile(meshFile) if needsMesh else None
+        try:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(solutionFiles)), initializer=_initialize_worker,
+                                     initargs=(fields, outputDirectory, shared.handle if shared else None)) as executor:
+                for result in executor.map(_process_in_worker, solutionFiles):
+                    results.append(result)
+                    if callback:
+                        callback(result)
+        finally:
+            if shared is not None:
+                shared.close()
+                shared.unlink()
+    else:
+        derivatives = mesh_derivatives(meshFile) if needsMesh else None
+        for solutionFile in solutionFiles:
+            results.append(process_file(solutionFile, fields, outputDirectory, derivatives))
+            if callback:
+                callback(results[-1])
+
+    seconds = time.perf_counter() - start
+    elements = sum(r['elements'] for r in results)
+    nbytes = sum(r['bytes'] for r in results)
+    return {
+        'files': len(results),
+        'elements': elements,
+        'bytes': nbytes,
+        'seconds': seconds,
+        'filesPerSecond': len(results) / seconds if seconds else None,
+        'elementsPerSecond': elements / seconds if seconds else None,
+        'megabytesPerSecond': nbytes / 1e6 / seconds if seconds else None,
+        'results': results,
+    }
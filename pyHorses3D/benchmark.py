@@ -0,0 +1,223 @@
+# benchmark.py
+
+"""
+Performance benchmarks for the pyHorses3D read and post-processing paths.
+
+The benchmarks run on a synthetic run generated with the synthetic module,
+so no solver binary is needed. Each benchmark reports the best wall time
+over several repeats, its throughput (elements/s and, where files are read,
+MB/s) and the peak Python-heap memory traced during one run. The decode
+cache is disabled while they run, so file reads are always measured cold
+rather than served from the cache. Results are
+written as JSON, and two result files can be compared to catch regressions
+between releases.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from . import synthetic
+from .cache import decode_cache
+from .mesh import Horses3DMesh
+from .plot import Horses3DPlot
+from .solution import Horses3DSolution
+
+def _measure(function, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+def _derived_quantities(Q):
+    solution = Horses3DSolution()
+    solution.solution.append(Q)
+    solution.computeVelocityMagnitude(0)
+    solution.computePressure(0)
+    solution.computeTemperature(0)
+    solution.computeSpeedOfSound(0)
+    solution.computeMach(0)
+
+_IMPORT_PROBE = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(' '.join(name for name in {heavy} if name in sys.modules))
+'''
+
+HEAVY_MODULES = ('matplotlib', 'scipy', 'mpl_toolkits')
+
+def measure_import_time(module='pyHorses3D.cli', repeats=5):
+    """
+    Cold-start import time of a module, measured in fresh interpreters.
+
+    Args:
+        module (str, optional): Module to import. Defaults to 'pyHorses3D.cli'.
+        repeats (int, optional): Interpreters started (best time is kept). Defaults to 5.
+
+    Returns:
+        dict: 'module', 'seconds' and 'heavyModules', the heavy dependencies
+              (matplotlib, scipy) that the import pulled in
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (root, os.environ.get('PYTHONPATH')))))
+    # Measure the import without the decode cache that PYHORSES3D_CACHE enables
+    env.pop('PYHORSES3D_CACHE', None)
+    code = _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)
+
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+        seconds, heavy = (output.split('\n') + [''])[:2]
+        times.append(float(seconds))
+
+    return {'module': module, 'seconds': min(times), 'heavyModules': heavy.split()}
+
+def run_benchmarks(nElements=4096, order=4, nSnapshots=4, repeats=3, directory=None):
+    """
+    Run the benchmark suite on a freshly generated synthetic run.
+
+    Args:
+        nElements (int, optional): Number of elements. Defaults to 4096.
+        order (int, optional): Polynomial order. Defaults to 4.
+        nSnapshots (int, optional): Solution files read by the time-series benchmark. Defaults to 4.
+        repeats (int, optional): Repeats per benchmark (best time is kept). Defaults to 3.
+        directory (str, optional): Where to generate the run. Defaults to a temporary directory.
+
+    Returns:
+        dict: Environment, configuration and one entry per benchmark with
+              'seconds', 'elementsPerSecond', 'megabytesPerSecond' and 'peakMemoryMB'
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        run = synthetic.generate_run(directory or tmp, nElements=nElements, order=order, nSnapshots=nSnapshots)
+        solutionFile = run['solutions'][-1]
+        solutionBytes = os.path.getsize(solutionFile)
+        meshBytes = os.path.getsize(run['mesh'])
+        seriesBytes = sum(os.path.getsize(f) for f in run['solutions'])
+        residualsBytes = os.path.getsize(run['residuals'])
+
+        reader = Horses3DSolution()
+        Q = reader._Q_from_file(solutionFile).transpose(0,2,3,4,1)
+        mesh = Horses3DMesh()._Q_from_file(run['mesh']).transpose(0,2,3,4,1)
+        plot = Horses3DPlot()
+        with open(run['residuals']) as file:
+            residuals = file.readlines()
+
+        cases = {
+            'read_solution': (lambda: Horses3DSolution().loadSingleSolution(solutionFile), nElements, solutionBytes),
+            'read_mesh': (lambda: Horses3DMesh().loadMesh(run['mesh']), nElements, meshBytes),
+            'read_time_series': (lambda: [Horses3DSolution().loadSingleSolution(f) for f in run['solutions']],
+                                 nElements * nSnapshots, seriesBytes),
+            'derived_quantities': (lambda: _derived_quantities(Q.copy()), nElements, None),
+            'slice_interpolation': (lambda: plot.slicePlane(mesh, Q, 'rho', plane='XY', value=np.pi), nElements, None),
+            'parse_residuals': (lambda: plot.parseResiduals(residuals), None, residualsBytes),
+        }
+
+        results = {}
+        # The read benchmarks measure decoding, not hits of a cache enabled by PYHORSES3D_CACHE or --cache
+        cacheEnabled = decode_cache.enabled
+        decode_cache.disable()
+        try:
+            for name, (function, elements, nbytes) in cases.items():
+                seconds, peak = _measure(function, repeats)
+                results[name] = {
+                    'seconds': seconds,
+                    'elementsPerSecond': elements / seconds if elements else None,
+                    'megabytesPerSecond': nbytes / 1e6 / seconds if nbytes else None,
+                    'peakMemoryMB': peak / 1e6,
+                }
+        finally:
+            if cacheEnabled:
+                decode_cache.enable()
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+        },
+        'config': {'nElements': nElements, 'order': order, 'nSnapshots': nSnapshots, 'repeats': repeats},
+        'results': results,
+        'startup': measure_import_time(repeats=max(repeats, 3)),
+    }
+
+def save_results(results, filepath):
+    """
+    Write benchmark results as JSON.
+
+    Args:
+        results (dict): Output of :func:`run_benchmarks`
+        filepath (str): Path of the JSON file
+    """
+    with open(filepath, 'w') as file:
+        json.dump(results, file, indent=2)
+    return filepath
+
+def compare_results(baseline, current, threshold=0.2):
+    """
+    Compare two benchmark result sets.
+
+    Args:
+        baseline (dict or str): Reference results or the path of their JSON file
+        current (dict or str): New results or the path of their JSON file
+        threshold (float, optional): Relative slowdown reported as a regression. Defaults to 0.2.
+
+    Returns:
+        dict: Per-benchmark time ratio (current / baseline), a 'regressions' list
+              and 'sameConfig', False when the two runs used different sizes
+    """
+    if isinstance(baseline, str):
+        with open(baseline) as file:
+            baseline = json.load(file)
+    if isinstance(current, str):
+        with open(current) as file:
+            current = json.load(file)
+
+    ratios = {}
+    regressions = []
+    for name, result in current['results'].items():
+        if name in baseline['results']:
+            ratio = result['seconds'] / baseline['results'][name]['seconds']
+            ratios[name] = ratio
+            if ratio > 1.0 + threshold:
+                regressions.append(name)
+
+    if 'startup' in current and 'startup' in baseline:
+        ratio = current['startup']['seconds'] / baseline['startup']['seconds']
+        ratios['startup'] = ratio
+        if ratio > 1.0 + threshold:
+            regressions.append('startup')
+
+    return {'ratios': ratios, 'regressions': regressions, 'sameConfig': baseline['config'] == current['config']}
+
+def print_results(results):
+    """
+    Print a summary table of benchmark results.
+
+    Args:
+        results (dict): Output of :func:`run_benchmarks`
+    """
+    config = results['config']
+    print(f"Benchmarks: {config['nElements']} elements, order {config['order']}, {config['nSnapshots']} snapshots")
+    print(f"  {'benchmark':<22}{'time (s)':>12}{'elements/s':>14}{'MB/s':>10}{'peak MB':>10}")
+    for name, result in results['results'].items():
+        elements = f"{result['elementsPerSecond']:.3g}" if result['elementsPerSecond'] else '-'
+        mbs = f"{result['megabytesPerSecond']:.1f}" if result['megabytesPerSecond'] else '-'
+        print(f"  {name:<22}{result['seconds']:>12.4f}{elements:>14}{mbs:>10}{result['peakMemoryMB']:>10.1f}")
+    if 'startup' in results:
+        startup = results['startup']
+        heavy = ', '.join(startup['heavyModules']) or 'none'
+        print(f"  Cold start (import {startup['module']}): {startup['seconds']:.4f} s, heavy modules loaded: {heavy}")
@@ -0,0 +1,190 @@
+# cache.py
+
+"""
+Persistent on-disk cache of decoded Horses3D files.
+
+Decoding an .hsol or .hmesh file walks every element record, while reading
+the same arrays back from a .npy file is a memory map. Once enabled, the
+module-level DecodeCache stores the arrays decoded by Horses3DSolution and
+Horses3DMesh as .npy files, keyed by the path, size and modification time of
+the source file and by the reader version, so a changed file or reader is
+never served stale. Repeat loads map the cached arrays copy-on-write.
+
+The cache is bounded by a disk budget and evicts the least recently used
+entries. Entries are written under temporary names and renamed into place,
+so concurrent processes can share a cache directory: readers only ever see
+complete files, and an entry evicted while mapped stays valid for its reader.
+"""
+
+import hashlib
+import os
+import uuid
+import numpy as np
+
+# Bump when the decoded layout changes, so older entries are not reused
+READER_VERSION = 1
+
+DEFAULT_BUDGET = 4 * 2**30
+
+def default_directory():
+    """Cache directory: $PYHORSES3D_CACHE, else the user cache directory."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.environ.get('PYHORSES3D_CACHE') or os.path.join(base, 'pyHorses3D')
+
+class DecodeCache:
+    """
+    Disk cache of decoded arrays with LRU eviction.
+
+    Attributes:
+        enabled (bool): Whether loads go through the cache
+        directory (str): Cache directory
+        budget (int): Disk budget in bytes
+        hits (int): Loads served from the cache
+        misses (int): Loads decoded and stored
+    """
+    def __init__(self, directory=None, budget=DEFAULT_BUDGET):
+        self.enabled = False
+        self.directory = directory
+        self.budget = budget
+        self.hits = 0
+        self.misses = 0
+
+    def enable(self, directory=None, budget=None):
+        """
+        Route decodes through the cache.
+
+        Args:
+            directory (str, optional): Cache directory. Defaults to :func:`default_directory`.
+            budget (int, optional): Disk budget in bytes. Defaults to 4 GiB.
+        """
+        self.directory = directory or self.directory or default_directory()
+        if budget is not None:
+            self.budget = budget
+        os.makedirs(self.directory, exist_ok=True)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def key(self, fname):
+        """Cache key of a file: its absolute path, size, modification time and the reader version."""
+        stat = os.stat(fname)
+        identity = f"{os.path.abspath(fname)}|{stat.st_size}|{stat.st_mtime_ns}|{READER_VERSION}"
+        return hashlib.sha1(identity.encode()).hexdigest()
+
+    def _paths(self, key, count):
+        return [os.path.join(self.directory, f"{key}.{i}.npy") for i in range(count)]
+
+    def load(self, fname, decode, count=1):
+        """
+        Arrays decoded from a file, from the cache when possible.
+
+        Args:
+            fname (str): Source .hsol or .hmesh file
+            decode (callable): Decoder called with fname on a miss, returning a tuple of
+                               count arrays (None entries are allowed and not stored)
+            count (int, optional): Number of arrays returned by decode. Defaults to 1.
+
+        Returns:
+            tuple: The arrays, memory-mapped copy-on-write on a hit
+        """
+        key = self.key(fname)
+        paths = self._paths(key, count)
+        marker = os.path.join(self.directory, f"{key}.entry")
+        try:
+            # The marker lists which of the arrays exist (None entries are not stored)
+            with open(marker) as file:
+                present = [flag == '1' for flag in file.read().split(',')]
+            arrays = tuple(np.load(path, mmap_mode='c') if stored else None for path, stored in zip(paths, present))
+        except (FileNotFoundError, ValueError):
+            # Missing, evicted meanwhile or still being written by another process
+            pass
+        else:
+            try:
+                # The marker's modification time is the LRU clock
+                os.utime(marker)
+            except FileNotFoundError:
+                pass
+            self.hits += 1
+            return arrays
+
+        arrays = decode(fname)
+        self.misses += 1
+        try:
+            for path, array in zip(paths, arrays):
+                if array is not None:
+                    self._write(path, lambda file: np.save(file, array))
+            flags = ','.join('0' if array is None else '1' for array in arrays)
+            self._write(marker, lambda file: file.write(flags.encode()))
+            self.evict()
+        except OSError:
+            # A full or read-only cache never fails the load itself
+            pass
+        return arrays
+
+    def _write(self, path, writer):
+        # Temporary names start with a dot, so eviction and lookups ignore them
+        directory, name = os.path.split(path)
+        temporary = os.path.join(directory, f".{name}.{os.getpid()}.{uuid.uuid4().hex[:8]}")
+        try:
+            with open(temporary, 'wb') as file:
+                writer(file)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def _entries(self):
+        # key -> [last use, bytes, file names]
+        entries = {}
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            key, _, suffix = entry.name.partition('.')
+            record = entries.setdefault(key, [0.0, 0, []])
+            if suffix == 'entry':
+                record[0] = stat.st_mtime
+                # The marker goes first, so readers see the entry as missing rather than incomplete
+                record[2].insert(0, entry.name)
+            else:
+                record[2].append(entry.name)
+            record[1] += stat.st_size
+        return entries
+
+    def usage(self):
+        """Bytes used by the cache."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return 0
+        return sum(size for _, size, _ in self._entries().values())
+
+    def evict(self, budget=None):
+        """
+        Remove the least recently used entries until the cache fits its budget.
+
+        Args:
+            budget (int, optional): Bytes to keep. Defaults to the cache budget.
+        """
+        budget = self.budget if budget is None else budget
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries.values())
+        for lastUse, size, names in sorted(entries.values(), key=lambda record: record[0]):
+            if total <= budget:
+                break
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def clear(self):
+        """Remove every entry."""
+        self.evict(budget=0)
+
+decode_cache = DecodeCache()
+if os.environ.get('PYHORSES3D_CACHE'):
+    decode_cache.enable()
@@ -0,0 +1,210 @@
+# catalog.py
+
+"""
+Header-only scan of Horses3D runs and an on-disk catalog of their snapshots.
+
+Only the fixed 204-byte header of each file is read: element count, node
+type, iteration, time and reference values. Many files are scanned in
+parallel threads. The results are kept in a small SQLite database in the run
+directory. Snapshots can then be queried by time or iteration without opening
+the data, and a rescan only reads files that are new or have changed since
+the last scan.
+"""
+
+import fnmatch
+import glob
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from .hsol import read_header
+
+CATALOG_NAME = '.pyhorses3d_catalog.sqlite'
+
+_COLUMNS = ('path', 'size', 'mtime', 'title', 'fileType', 'nodeType', 'nElements', 'iteration', 'time', 'refValues')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    title TEXT,
+    fileType INTEGER,
+    nodeType INTEGER,
+    nElements INTEGER,
+    iteration INTEGER,
+    time REAL,
+    refValues TEXT
+);
+CREATE INDEX IF NOT EXISTS snapshots_time ON snapshots (time);
+CREATE INDEX IF NOT EXISTS snapshots_iteration ON snapshots (iteration);
+"""
+
+def _scan_file(fname):
+    try:
+        stat = os.stat(fname)
+        header = read_header(fname)
+    except (IOError, OSError):
+        # Missing, unreadable or still being written
+        return None
+    header.update(path=fname, size=stat.st_size, mtime=stat.st_mtime)
+    return header
+
+def scan_headers(files, jobs=8):
+    """
+    Read the headers of many files in parallel.
+
+    Args:
+        files (list): Paths of .hsol or .hmesh files
+        jobs (int, optional): Number of reader threads. Defaults to 8.
+
+    Returns:
+        list: One header dictionary per readable file (see hsol.read_header),
+              with 'path', 'size' and 'mtime' added, in the order of ``files``
+    """
+    if jobs > 1 and len(files) > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            headers = list(executor.map(_scan_file, files))
+    else:
+        headers = [_scan_file(fname) for fname in files]
+    return [header for header in headers if header is not None]
+
+class Horses3DCatalog:
+    """
+    SQLite catalog of the snapshots of a run directory.
+
+    Paths are stored relative to the run directory, so the catalog stays
+    valid when the directory is moved.
+
+    Attributes:
+        directory (str): Run directory
+        path (str): Path of the SQLite database
+    """
+    def __init__(self, directory='.', path=None):
+        """
+        Open (or create) the catalog of a run directory.
+
+        Args:
+            directory (str, optional): Run directory. Defaults to the working directory.
+            path (str, optional): Database path. Defaults to CATALOG_NAME inside the directory.
+        """
+        self.directory = directory
+        self.path = path or os.path.join(directory, CATALOG_NAME)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.executescript(_SCHEMA)
+
+    def update(self, pattern='RESULTS/*.hsol', jobs=8):
+        """
+        Bring the catalog up to date with the files on disk.
+
+        Only new or modified files (by size and modification time) are read.
+        Catalogued files matching the pattern that no longer exist are removed.
+
+        Args:
+            pattern (str, optional): Glob pattern relative to the run directory.
+                                     Defaults to 'RESULTS/*.hsol'.
+            jobs (int, optional): Number of reader threads. Defaults to 8.
+
+        Returns:
+            int: Number of files (re)scanned
+        """
+        files = {os.path.relpath(fname, self.directory): fname
+                 for fname in glob.glob(os.path.join(self.directory, pattern))}
+        known = {path: (size, mtime) for path, size, mtime
+                 in self._connection.execute('SELECT path, size, mtime FROM snapshots')}
+
+        stale = []
+        for path, fname in files.items():
+            stat = os.stat(fname)
+            if known.get(path) != (stat.st_size, stat.st_mtime):
+                stale.append(fname)
+
+        rows = [(os.path.relpath(h['path'], self.directory), h['size'], h['mtime'], h['title'], h['fileType'],
+                 h['nodeType'], h['nElements'], h['iteration'], h['time'], json.dumps(h['refValues'].tolist()))
+                for h in scan_headers(stale, jobs)]
+        removed = [(path,) for path in known
+                   if path not in files and fnmatch.fnmatch(path, os.path.normpath(pattern))]
+
+        with self._connection:
+            self._connection.executemany(f"INSERT OR REPLACE INTO snapshots VALUES ({', '.join('?' * len(_COLUMNS))})", rows)
+            self._connection.executemany('DELETE FROM snapshots WHERE path = ?', removed)
+        return len(rows)
+
+    def _records(self, where='', parameters=()):
+        cursor = self._connection.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM snapshots {where} ORDER BY iteration, path", parameters)
+        records = []
+        for row in cursor:
+            record = dict(zip(_COLUMNS, row))
+            record['path'] = os.path.join(self.directory, record['path'])
+            record['refValues'] = json.loads(record['refValues'])
+            records.append(record)
+        return records
+
+    def query(self, timeRange=None, iterationRange=None, fileType=None):
+        """
+        Catalogued snapshots, ordered by iteration.
+
+        Args:
+            timeRange (tuple, optional): Inclusive (start, end) physical time; None for an open end
+            iterationRange (tuple, optional): Inclusive (start, end) iteration; None for an open end
+            fileType (int, optional): Keep only this file type (see hsol)
+
+        Returns:
+            list: One dictionary per snapshot with the header fields, 'path', 'size' and 'mtime'
+        """
+        conditions, parameters = [], []
+        for column, bounds in (('time', timeRange), ('iteration', iterationRange)):
+            if bounds is not None:
+                start, end = bounds
+                if start is not None:
+                    conditions.append(f'{column} >= ?')
+                    parameters.append(start)
+                if end is not None:
+                    conditions.append(f'{column} <= ?')
+                    parameters.append(end)
+        if fileType is not None:
+            conditions.append('fileType = ?')
+            parameters.append(fileType)
+
+        where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return self._records(where, parameters)
+
+    def files(self, timeRange=None, iterationRange=None, fileType=None):
+        """
+        Paths of the catalogued snapshots, ordered by iteration.
+
+        Args:
+            timeRange (tuple, optional): Inclusive (start, end) physical time
+            iterationRange (tuple, optional): Inclusive (start, end) iteration
+            fileType (int, optional): Keep only this file type
+
+        Returns:
+            list: File paths
+        """
+        return [record['path'] for record in self.query(timeRange, iterationRange, fileType)]
+
+    def nearest(self, time):
+        """
+        Snapshot closest in time.
+
+        Args:
+            time (float): Physical time
+
+        Returns:
+            dict: The snapshot record, or None if the catalog is empty
+        """
+        records = self._records('WHERE path = (SELECT path FROM snapshots ORDER BY ABS(time - ?) LIMIT 1)', (time,))
+        return records[0] if records else None
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM snapshots').fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,370 @@
+# chunked.py
+
+"""
+Out-of-core, lazily evaluated arrays over the snapshots of a run.
+
+A Horses3DChunkedArray stands for the (nTimes, nElements, N1, N2, N3,
+nVariables) array of a series of solution files without loading it.
+Selections by time, element and variable, elementwise arithmetic (numpy
+ufuncs and operators) and derived quantities only build up the recipe.
+Nothing is read until a reduction or compute() evaluates it chunk by chunk:
+one snapshot by a block of elements per chunk, read with hsol.read_elements
+and derived with Horses3DSolution. Chunks are evaluated in a thread pool and
+sized so that the chunks in flight stay within a memory budget.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
+from .hsol import read_header, read_elements, offset_table, index_selection
+from .profiling import profiler
+from .solution import Horses3DSolution
+
+CONSERVED = ('rho', 'rhou', 'rhov', 'rhow', 'rhoe')
+
+# Chunks in flight per worker thread, and working arrays per chunk (reads and derived intermediates)
+_CHUNKS_PER_JOB = 2
+_WORKING_COPIES = 4
+
+# Starting value of the reductions
+_REDUCTIONS = {np.add: 0.0, np.minimum: np.inf, np.maximum: -np.inf}
+
+def _is_variables(key):
+    return isinstance(key, str) or (isinstance(key, (list, tuple)) and key and all(isinstance(k, str) for k in key))
+
+class _Source:
+    # Leaf of the recipe: snapshots read from files, with derived quantities
+    def __init__(self, files, elements, variables, meshFile, dtype):
+        self.files = files
+        self.elements = elements
+        self.variables = variables
+        self.meshFile = meshFile
+        self.dtype = dtype
+        self.derivatives = None
+        if any(name in Horses3DSolution.gradientQuantities for name in variables):
+            if meshFile is None:
+                raise ValueError("Vorticity, Q and lambda-2 need the mesh file")
+            # Built once per mesh file (see batch.mesh_derivatives), here rather than in
+            # the worker threads, which share it
+            from .batch import mesh_derivatives
+            self.derivatives = mesh_derivatives(meshFile)
+            self.derivatives.inverseMetric
+
+    def __call__(self, t, e):
+        elements = self.elements[e]
+        with profiler.stage('chunked.read') as stage:
+            Q, G = read_elements(self.files[t], elements)
+            stage.add(bytes=Q.nbytes + (0 if G is None else G.nbytes), elements=len(elements))
+
+        snapshot = Horses3DSolution()
+        snapshot.solution = [Q.transpose(0, 2, 3, 4, 1)]
+        snapshot.gradients = [None if G is None else G.transpose(0, 2, 3, 4, 1, 5)]
+        derivatives = None
+        if self.derivatives is not None:
+            from .derivatives import Horses3DDerivatives
+            d = self.derivatives
+            derivatives = Horses3DDerivatives.fromMetrics(d.jacobianMatrix[elements], d.nodeType,
+                                                          d.jacobian[elements], d.inverseMetric[elements])
+        snapshot.computeQuantities(0, self.variables, derivatives)
+        return snapshot.solution[0][..., [snapshot.magnitudes[name] for name in self.variables]].astype(self.dtype, copy=False)
+
+class Horses3DChunkedArray(NDArrayOperatorsMixin):
+    """
+    Lazy (nTimes, nElements, N1, N2, N3, nVariables) array over solution files.
+
+    Attributes:
+        shape (tuple): Shape of the array
+        variables (list): Name of each entry of the last axis
+        times (numpy.ndarray): Physical time of each snapshot
+        iterations (numpy.ndarray): Iteration of each snapshot
+        headers (list): Header of the file of each snapshot (see hsol.read_header)
+        elements (numpy.ndarray): Index of each element in the files
+        memoryBudget (int): Bytes of the chunks evaluated at the same time
+        jobs (int): Number of worker threads
+    """
+    def __init__(self, kernel, shape, variables, times, iterations, elements, dtype,
+                 memoryBudget, jobs, source=None, headers=None):
+        self._kernel = kernel
+        self._source = source
+        self.shape = tuple(int(n) for n in shape)
+        self.variables = list(variables)
+        self.times = times
+        self.iterations = iterations
+        self.headers = list(headers) if headers is not None else [None] * len(times)
+        self.elements = elements
+        self.dtype = np.dtype(dtype)
+        self.memoryBudget = memoryBudget
+        self.jobs = jobs
+
+    @classmethod
+    def fromFiles(cls, solutionFiles, variables=CONSERVED, meshFile=None, dtype=np.float64,
+                  memoryBudget=512*2**20, jobs=None):
+        """
+        Describe a series of solution files, without reading their data.
+
+        Args:
+            solutionFiles (list): Solution files, one snapshot each
+            variables (tuple, optional): Conserved or derived quantities (see Horses3DSolution).
+                                         Defaults to the conserved variables.
+            meshFile (str, optional): Mesh file, required for vorticity, Q and lambda-2
+            dtype (numpy.dtype, optional): Type of the evaluated values, e.g. float32 to halve
+                                           the size of the results. Defaults to float64.
+            memoryBudget (int, optional): Bytes of the chunks in flight. Defaults to 512 MiB.
+            jobs (int, optional): Worker threads. Defaults to the number of CPUs.
+
+        Returns:
+            Horses3DChunkedArray: The lazy array
+        """
+        solutionFiles = list(solutionFiles)
+        if not solutionFiles:
+            raise ValueError("No solution files given")
+        table = offset_table(solutionFiles[0])
+        shapes = table['shapes'][:, 0]
+        if (shapes != shapes[0]).any():
+            raise ValueError("Chunked arrays need elements of the same polynomial order")
+
+        variables = [variables] if isinstance(variables, str) else list(variables)
+        headers = [read_header(f) for f in solutionFiles]
+        elements = np.arange(table['nElements'])
+        source = _Source(solutionFiles, elements, variables, meshFile, np.dtype(dtype))
+        return cls(source, (len(solutionFiles), table['nElements'], *shapes[0][1:], len(variables)), variables,
+                   np.array([h['time'] for h in headers]), np.array([h['iteration'] for h in headers]),
+                   elements, dtype, memoryBudget, jobs or os.cpu_count() or 1, source=source, headers=headers)
+
+    def __repr__(self):
+        return f"Horses3DChunkedArray(shape={self.shape}, variables={self.variables}, dtype={self.dtype})"
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def _derive(self, kernel, variables, dtype, source=None, **metadata):
+        fields = dict(shape=self.shape, times=self.times, iterations=self.iterations, headers=self.headers,
+                      elements=self.elements)
+        fields.update(metadata)
+        shape = (*fields.pop('shape')[:-1], len(variables))
+        return Horses3DChunkedArray(kernel, shape, variables, fields['times'], fields['iterations'],
+                                    fields['elements'], dtype, self.memoryBudget, self.jobs, source,
+                                    fields['headers'])
+
+    # Selection
+
+    def __getitem__(self, key):
+        """
+        Select by time, element and variable: a[times], a[times, elements],
+        a['p'], a[times, elements, ['p', 'M']]. Selections keep every axis.
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        variables = None
+        if key and _is_variables(key[-1]):
+            variables, key = key[-1], key[:-1]
+        if len(key) > 2:
+            raise IndexError("Only time, element and variable selections are supported")
+        times, elements = (tuple(key) + (None, None))[:2]
+        return self.select(times, elements, variables)
+
+    def select(self, times=None, elements=None, variables=None):
+        """
+        Lazy selection of snapshots, elements and variables.
+
+        On an array read from files, variables may also name derived quantities
+        that were not requested in fromFiles; only the selected quantities are
+        then computed.
+
+        Args:
+            times (int, slice, tuple or array, optional): Snapshot selection
+            elements (int, slice, tuple or array, optional): Element selection
+            variables (str or list, optional): Variable names or indices
+
+        Returns:
+            Horses3DChunkedArray: The selection
+        """
+        tIdx = index_selection(times, self.shape[0])
+        eIdx = index_selection(elements, self.shape[1])
+        metadata = dict(times=self.times[tIdx], iterations=self.iterations[tIdx],
+                        headers=[self.headers[t] for t in tIdx], elements=self.elements[eIdx],
+                        shape=(len(tIdx), len(eIdx), *self.shape[2:]))
+
+        if variables is None:
+            variables = self.variables
+        variables = [variables] if isinstance(variables, (str, int, np.integer)) else list(variables)
+
+        if self._source is not None:
+            # Push the selection down to the files, so unused quantities are never derived
+            s = self._source
+            names = [self.variables[v] if isinstance(v, (int, np.integer)) else v for v in variables]
+            source = _Source([s.files[t] for t in tIdx], s.elements[eIdx], names, s.meshFile, s.dtype)
+            return self._derive(source, names, self.dtype, source=source, **metadata)
+
+        vIdx = [v if isinstance(v, (int, np.integer)) else self.variables.index(v) for v in variables]
+        parent = self._kernel
+        return self._derive(lambda t, e: parent(tIdx[t], eIdx[e])[..., vIdx],
+                            [self.variables[v] for v in vIdx], self.dtype, **metadata)
+
+    # Elementwise operations
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or 'out' in kwargs:
+            return NotImplemented
+        arrays = [x for x in inputs if isinstance(x, Horses3DChunkedArray)]
+        for x in arrays:
+            if x.shape[:-1] != self.shape[:-1]:
+                raise ValueError(f"Shapes {x.shape} and {self.shape} do not match")
+        nVariables = max(x.shape[-1] for x in arrays)
+        if any(x.shape[-1] not in (1, nVariables) for x in arrays):
+            raise ValueError("The variable axes do not broadcast")
+
+        def kernel(t, e):
+            return ufunc(*[x._kernel(t, e) if isinstance(x, Horses3DChunkedArray) else x for x in inputs], **kwargs)
+
+        first = next(x for x in arrays if x.shape[-1] == nVariables)
+        dtype = np.result_type(*[x.dtype if isinstance(x, Horses3DChunkedArray) else x for x in inputs])
+        variables = first.variables if len(arrays) == 1 else [f'{ufunc.__name__}{i}' for i in range(nVariables)]
+        return self._derive(kernel, variables, dtype)
+
+    def map(self, func, variables=None, dtype=None):
+        """
+        Apply a function to every chunk.
+
+        Args:
+            func (callable): Maps an array of shape (nChunkElements, N1, N2, N3, nVariables)
+                             to one with the same leading axes
+            variables (list, optional): Names of the output variables. Defaults to the current ones.
+            dtype (numpy.dtype, optional): Output type. Defaults to the current one.
+
+        Returns:
+            Horses3DChunkedArray: The lazy result
+        """
+        parent = self._kernel
+        return self._derive(lambda t, e: func(parent(t, e)), variables or self.variables, dtype or self.dtype)
+
+    def astype(self, dtype):
+        """Lazy conversion of the values to another type."""
+        parent = self._kernel
+        return self._derive(lambda t, e: parent(t, e).astype(dtype, copy=False), self.variables, dtype)
+
+    # Evaluation
+
+    def _chunk_elements(self):
+        # Elements per chunk so that the chunks in flight fit the memory budget
+        perElement = int(np.prod(self.shape[2:5])) * max(self.shape[5], len(CONSERVED)) * 8 * _WORKING_COPIES
+        inFlight = _CHUNKS_PER_JOB * self.jobs
+        return int(np.clip(self.memoryBudget // (inFlight * perElement), 1, max(self.shape[1], 1)))
+
+    def _evaluate(self, consume):
+        # Evaluate every chunk in the thread pool and hand it to consume(t, elementSlice, block)
+        # in the calling thread, with a bounded number of chunks in flight
+        step = self._chunk_elements()
+        tasks = ((t, slice(e, min(e + step, self.shape[1]))) for t in range(self.shape[0])
+                 for e in range(0, self.shape[1], step))
+        inFlight = _CHUNKS_PER_JOB * self.jobs
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            pending = {}
+            for t, e in tasks:
+                pending[executor.submit(self._kernel, t, np.arange(e.start, e.stop))] = (t, e)
+                if len(pending) >= inFlight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        consume(*pending.pop(future), future.result())
+            for future in list(pending):
+                consume(*pending.pop(future), future.result())
+
+    def compute(self, out=None):
+        """
+        Evaluate the whole array.
+
+        Args:
+            out (numpy.ndarray, optional): Destination of the array's shape, e.g. a
+                                           numpy.lib.format.open_memmap to stay out of core.
+                                           Allocated in memory by default.
+
+        Returns:
+            numpy.ndarray: The values
+        """
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        elif out.shape != self.shape:
+            raise ValueError(f"The output must have shape {self.shape}")
+
+        def store(t, e, block):
+            out[t, e] = block
+
+        self._evaluate(store)
+        return out
+
+    def reduce(self, ufunc, axis=None):
+        """
+        Chunked reduction with np.add, np.minimum or np.maximum.
+
+        Args:
+            ufunc (numpy.ufunc): Reduction
+            axis (int or tuple, optional): Axes to reduce (0 time, 1 element, 2-4 nodes,
+                                           5 variable). Defaults to all.
+
+        Returns:
+            numpy.ndarray: The reduced values
+        """
+        if ufunc not in _REDUCTIONS:
+            raise ValueError("Supported reductions: numpy.add, numpy.minimum, numpy.maximum")
+        axes = tuple(range(self.ndim)) if axis is None else tuple(np.atleast_1d(axis) % self.ndim)
+        outShape = tuple(1 if a in axes else n for a, n in enumerate(self.shape))
+        out = np.full(outShape, _REDUCTIONS[ufunc], dtype=np.result_type(self.dtype, np.float64))
+
+        chunkAxes = tuple(a - 1 for a in axes if a > 0)
+        def combine(t, e, block):
+            partial = ufunc.reduce(block, axis=chunkAxes, keepdims=True) if chunkAxes else block
+            index = (0 if 0 in axes else t, slice(None) if 1 in axes else e)
+            ufunc(out[index], partial, out=out[index])
+
+        self._evaluate(combine)
+        return out.reshape([n for a, n in enumerate(outShape) if a not in axes])
+
+    def sum(self, axis=None):
+        """Chunked sum over the given axes (see :meth:`reduce`)."""
+        return self.reduce(np.add, axis)
+
+    def mean(self, axis=None):
+        """Chunked mean over the given axes (see :meth:`reduce`)."""
+        axes = tuple(range(self.ndim)) if axis is None else tuple(np.atleast_1d(axis) % self.ndim)
+        return self.sum(axes) / np.prod([self.shape[a] for a in axes])
+
+    def min(self, axis=None):
+        """Chunked minimum over the given axes (see :meth:`reduce`)."""
+        return self.reduce(np.minimum, axis)
+
+    def max(self, axis=None):
+        """Chunked maximum over the given axes (see :meth:`reduce`)."""
+        return self.reduce(np.maximum, axis)
+
+    def toSolution(self):
+        """
+        Evaluate the array into a Horses3DSolution, one snapshot per time.
+
+        The header of each snapshot is that of its file, with the time and
+        iteration of the array, so that snapshots of every element can be
+        written with saveSolution; subsets of the elements need partial=True.
+
+        Returns:
+            Horses3DSolution: Snapshots with the variables as magnitudes, and the
+                              selected elements in its elements attribute
+        """
+        solution = Horses3DSolution()
+        solution.magnitudes = {name: v for v, name in enumerate(self.variables)}
+        for values, header, time, iteration in zip(self.compute(), self.headers, self.times, self.iterations):
+            if header is not None:
+                header = dict(header, time=float(time), iteration=int(iteration))
+            solution.solution.append(values)
+            solution.gradients.append(None)
+            solution.headers.append(header)
+            solution.elements.append(self.elements)
+        return solution
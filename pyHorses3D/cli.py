@@ -13,13 +13,19 @@ import os
 import sys
 import platform
 from .horses3d import Horses3D
-from .examples import full_workflow_example
+from .solution import Horses3DSolution
+from .profiling import profiler
 
 def main():
     """
     Main entry point for the pyHorses3D command-line interface.
     """
     parser = argparse.ArgumentParser(description='pyHorses3D - Python interface for the Horses3D CFD solver')
+    parser.add_argument('--profile', action='store_true', help='Print per-stage timings and throughput on exit')
+    parser.add_argument('--profile-output', help='Write the per-stage profile summary to this JSON file')
+    parser.add_argument('--trace-output', help='Write the profiled stages as a Chrome trace to this JSON file')
+    parser.add_argument('--cache', action='store_true', help='Cache decoded solution and mesh files on disk')
+    parser.add_argument('--cache-dir', help='Directory of --cache (default: $PYHORSES3D_CACHE or ~/.cache/pyHorses3D)')
     subparsers = parser.add_subparsers(dest='command', help='Command to execute')
     
     # Run simulation command
@@ -27,11 +33,23 @@ def main():
     run_parser.add_argument('solver', help='Path to the Horses3D solver executable')
     run_parser.add_argument('control', help='Path to the control file')
     run_parser.add_argument('--residuals', action='store_true', help='Plot residuals after simulation')
+    run_parser.add_argument('--watch', action='store_true', help='Process solution files while the solver runs')
+    run_parser.add_argument('--fields', default='V,p,T,a,M', help='Comma-separated quantities written by --watch')
+    run_parser.add_argument('--jobs', type=int, default=1, help='Number of --watch worker processes')
+    run_parser.add_argument('--output', default='POST', help='Directory of the files processed by --watch')
+    run_parser.add_argument('--echo-interval', type=float, default=0.0,
+                            help='Minimum seconds between echoed iteration rows (0 echoes every line)')
+    run_parser.add_argument('--quiet', action='store_true', help='Do not echo the solver output')
     
     # Process simulation command
     process_parser = subparsers.add_parser('process', help='Process simulation results')
     process_parser.add_argument('solver', help='Path to the Horses3D solver executable')
     process_parser.add_argument('control', help='Path to the control file')
+    process_parser.add_argument('--files', nargs='+', help='Glob patterns of the solution files (default: all files of the run)')
+    process_parser.add_argument('--range', dest='selection', help='Range of the sorted solution files, as start:stop[:step]')
+    process_parser.add_argument('--fields', default='V,p,T,a,M', help='Comma-separated quantities to write (e.g. p,T,M,Q)')
+    process_parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes')
+    process_parser.add_argument('--output', default='POST', help='Directory of the processed .npz files')
     process_parser.add_argument('--vtk', action='store_true', help='Generate VTK files for visualization')
     
     # Visualize simulation command
@@ -48,23 +66,78 @@ def main():
     example_parser.add_argument('solver', help='Path to the Horses3D solver executable')
     example_parser.add_argument('control', help='Path to the control file')
     
+    # Benchmark command
+    bench_parser = subparsers.add_parser('benchmark', help='Run the performance benchmarks on synthetic data')
+    bench_parser.add_argument('--elements', type=int, default=4096, help='Number of elements')
+    bench_parser.add_argument('--order', type=int, default=4, help='Polynomial order')
+    bench_parser.add_argument('--snapshots', type=int, default=4, help='Number of solution files')
+    bench_parser.add_argument('--repeats', type=int, default=3, help='Repeats per benchmark')
+    bench_parser.add_argument('--output', help='Write the results to this JSON file')
+    bench_parser.add_argument('--baseline', help='Compare against a previous JSON results file')
+    bench_parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown reported as a regression')
+    
     args = parser.parse_args()
     
     if args.command is None:
         parser.print_help()
         return
     
-    # Handle commands
+    if args.cache or args.cache_dir:
+        from .cache import decode_cache
+        decode_cache.enable(args.cache_dir)
+
+    profiling = args.profile or args.profile_output or args.trace_output
+    if profiling:
+        profiler.enable()
+
+    try:
+        run_command(args)
+    finally:
+        if profiling:
+            report_profile(args.profile, args.profile_output, args.trace_output)
+
+def run_command(args):
+    """
+    Dispatch the parsed command-line arguments to their command.
+    
+    Args:
+        args (argparse.Namespace): Parsed arguments
+    """
     if args.command == 'run':
-        run_simulation(args.solver, args.control, args.residuals)
+        run_simulation(args.solver, args.control, args.residuals, args.watch,
+                       args.fields.split(','), args.jobs, args.output, not args.quiet, args.echo_interval)
     elif args.command == 'process':
-        process_simulation(args.solver, args.control, args.vtk)
+        process_simulation(args.solver, args.control, args.vtk, args.files, args.selection,
+                           args.fields.split(','), args.jobs, args.output)
     elif args.command == 'visualize':
         visualize_simulation(args.solver, args.control, args.variable, args.plane, args.value, args.streamlines)
     elif args.command == 'example':
         run_example(args.solver, args.control)
+    elif args.command == 'benchmark':
+        run_benchmark(args.elements, args.order, args.snapshots, args.repeats,
+                      args.output, args.baseline, args.threshold)
 
-def run_simulation(solver_path, control_file, plot_residuals=False):
+def report_profile(show=True, summary_file=None, trace_file=None):
+    """
+    Report the stages recorded by the profiler.
+    
+    Args:
+        show (bool, optional): Print the summary table. Defaults to True.
+        summary_file (str, optional): JSON file to write the summary to
+        trace_file (str, optional): JSON file to write the Chrome trace to
+    """
+    if show:
+        print("Profile:")
+        profiler.printSummary()
+    if summary_file:
+        profiler.saveSummary(summary_file)
+        print(f"Profile summary written to {summary_file}")
+    if trace_file:
+        profiler.saveChromeTrace(trace_file)
+        print(f"Trace written to {trace_file}")
+
+def run_simulation(solver_path, control_file, plot_residuals=False, watch=False,
+                   fields=('V', 'p', 'T', 'a', 'M'), jobs=1, output='POST', echo=True, echo_interval=0.0):
     """
     Run a Horses3D simulation.
     
@@ -73,47 +146,84 @@ def run_simulation(solver_path, control_file, plot_residuals=False):
         control_file (str): Path to the control file
         plot_residuals (bool, optional): Whether to plot residuals after the simulation.
                                         Defaults to False.
+        watch (bool, optional): Process each solution file while the solver runs. Defaults to False.
+        fields (list, optional): Quantities written for each solution file. Defaults to V, p, T, a and M.
+        jobs (int, optional): Number of worker processes. Defaults to 1.
+        output (str, optional): Directory of the processed files. Defaults to 'POST'.
+        echo (bool, optional): Echo the solver output. Defaults to True.
+        echo_interval (float, optional): Minimum seconds between echoed iteration rows. Defaults to 0.0.
     """
     print(f"Running simulation with control file: {control_file}")
     solver = Horses3D(solver_path, control_file)
     solver.control.loadControlFile()
-    solver.runHorses3D(plotResiduals=plot_residuals)
+
+    pipeline = None
+    if watch:
+        from functools import partial
+        from .batch import process_file
+        os.makedirs(output, exist_ok=True)
+        # The solver writes the mesh at start-up: each worker reads it on its first gradient quantity
+        mesh_pattern = solver.getHMeshFilePattern() if any(
+            field in Horses3DSolution.gradientQuantities for field in fields) else None
+        pipeline = partial(process_file, fields=tuple(fields), outputDirectory=output, meshFile=mesh_pattern)
+
+    results = solver.runHorses3D(plotResiduals=plot_residuals, pipeline=pipeline, jobs=jobs,
+                                 echo=echo, echoInterval=echo_interval)
+    rates = solver.telemetry.throughput() if solver.telemetry is not None else {}
+    if rates:
+        print(f"Throughput: {rates['iterationsPerSecond']:.3g} iterations/s"
+              + (f", {rates['dofUpdatesPerSecond']:.3g} DOF updates/s" if 'dofUpdatesPerSecond' in rates else ""))
+    usage = solver.resources.summary() if solver.resources is not None else {}
+    if usage:
+        print(f"Resources: {usage['cpuUtilization']:.2f} cores on average, {usage['rssPeak'] / 2**20:.1f} MiB peak RSS, "
+              f"{usage['readBytes'] / 2**20:.1f} MiB read, {usage['writeBytes'] / 2**20:.1f} MiB written")
+    if watch:
+        print(f"Processed {len(results or {})} solution files into {output}")
     print("Simulation completed successfully")
 
-def process_simulation(solver_path, control_file, generate_vtk=False):
+def process_simulation(solver_path, control_file, generate_vtk=False, files=None, selection=None,
+                       fields=('V', 'p', 'T', 'a', 'M'), jobs=1, output='POST'):
     """
     Process simulation results.
     
+    Every selected snapshot is decoded, its fields are computed and written to
+    one .npz file per snapshot, in parallel when jobs > 1.
+    
     Args:
         solver_path (str): Path to the Horses3D solver executable
         control_file (str): Path to the control file
         generate_vtk (bool, optional): Whether to generate VTK files for visualization.
                                       Defaults to False.
+        files (list, optional): Glob patterns of the solution files. Defaults to all files of the run.
+        selection (str, optional): Range of the sorted solution files, as 'start:stop[:step]'
+        fields (list, optional): Quantities to write. Defaults to V, p, T, a and M.
+        jobs (int, optional): Number of worker processes. Defaults to 1.
+        output (str, optional): Directory of the processed files. Defaults to 'POST'.
     """
+    from .batch import select_files, process_series
+
     print(f"Processing simulation results for control file: {control_file}")
     solver = Horses3D(solver_path, control_file)
     solver.control.loadControlFile()
     
     try:
         # Get solution files
-        solution_files = solver.getSolutionFileNames()
+        solution_files = select_files([] if files else solver.getSolutionFileNames(), files, selection)
         print(f"Found {len(solution_files)} solution files")
         
-        # Load the most recent solution
         if solution_files:
-            solver.solution.loadSingleSolution(solution_files[-1])
-            
-            # Compute derived quantities
-            print("Computing derived quantities...")
-            solver.solution.computeVelocityMagnitude(0)
-            solver.solution.computePressure(0)
-            solver.solution.computeTemperature(0)
-            solver.solution.computeSpeedOfSound(0)
-            solver.solution.computeMach(0)
-            
-            print("Derived quantities computed:")
-            for key in solver.solution.magnitudes.keys():
-                print(f"  {key} at index {solver.solution.magnitudes[key]}")
+            mesh_file = None
+            if any(field in Horses3DSolution.gradientQuantities for field in fields):
+                mesh_file = sorted(solver.getHMeshFileName())[0]
+
+            print(f"Computing {', '.join(fields)} with {jobs} worker(s)...")
+            summary = process_series(solution_files, fields, output, jobs, mesh_file)
+
+            print(f"Processed {summary['files']} files ({summary['elements']} elements, "
+                  f"{summary['bytes'] / 1e6:.1f} MB) in {summary['seconds']:.2f} s")
+            print(f"  {summary['filesPerSecond']:.2f} files/s, {summary['elementsPerSecond']:.3g} elements/s, "
+                  f"{summary['megabytesPerSecond']:.1f} MB/s")
+            print(f"Results written to {output}")
             
             # Generate VTK files if requested
             if generate_vtk:
@@ -121,7 +231,7 @@ def process_simulation(solver_path, control_file, generate_vtk=False):
                 # TODO: Implement VTK file generation
         else:
             print("No solution files found")
-    except FileNotFoundError as e:
+    except (FileNotFoundError, ValueError) as e:
         print(f"Error: {e}")
         sys.exit(1)
 
@@ -199,6 +309,8 @@ def run_example(solver_path, control_file):
         solver_path (str): Path to the Horses3D solver executable
         control_file (str): Path to the control file
     """
+    from .examples import full_workflow_example
+
     print(f"Running example workflow with control file: {control_file}")
     try:
         full_workflow_example(control_file, solver_path)
@@ -206,5 +318,37 @@ def run_example(solver_path, control_file):
         print(f"Error: {e}")
         sys.exit(1)
 
+def run_benchmark(elements=4096, order=4, snapshots=4, repeats=3, output=None, baseline=None, threshold=0.2):
+    """
+    Run the performance benchmarks on a synthetic run.
+    
+    Args:
+        elements (int, optional): Number of elements. Defaults to 4096.
+        order (int, optional): Polynomial order. Defaults to 4.
+        snapshots (int, optional): Number of solution files. Defaults to 4.
+        repeats (int, optional): Repeats per benchmark. Defaults to 3.
+        output (str, optional): JSON file to write the results to
+        baseline (str, optional): JSON results file to compare against
+        threshold (float, optional): Relative slowdown reported as a regression. Defaults to 0.2.
+    """
+    from . import benchmark
+
+    results = benchmark.run_benchmarks(elements, order, snapshots, repeats)
+    benchmark.print_results(results)
+
+    if output:
+        benchmark.save_results(results, output)
+        print(f"Results written to {output}")
+
+    if baseline:
+        comparison = benchmark.compare_results(baseline, results, threshold)
+        if not comparison['sameConfig']:
+            print("Warning: the baseline was run with a different configuration")
+        for name, ratio in comparison['ratios'].items():
+            print(f"  {name}: {ratio:.2f}x baseline time")
+        if comparison['regressions']:
+            print(f"Regressions: {', '.join(comparison['regressions'])}")
+            sys.exit(1)
+
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,221 @@
+# decomposition.py
+
+"""
+Streaming POD and DMD modal decompositions of Horses3D snapshots.
+
+Snapshots are consumed one at a time from any iterator and folded into a
+rank-truncated incremental SVD (Brand's update). Memory is proportional to
+the mesh size times the number of retained modes, and the data matrix is
+never formed. Inner products can be weighted with the quadrature weights
+from Horses3DIntegrals, so that modes are orthogonal in the L2 sense over
+the domain. DMD is computed on the POD coordinates of the snapshots.
+"""
+
+import numpy as np
+from .solution import Horses3DSolution
+
+def snapshot_stream(solutionFiles, variables=('rho', 'rhou', 'rhov', 'rhow', 'rhoe'), mean=None):
+    """
+    Iterate over solution files, yielding one snapshot at a time.
+
+    Args:
+        solutionFiles (list): Solution files in time order
+        variables (tuple, optional): Conserved or derived quantities stacked in
+                                     each snapshot. Defaults to the conserved variables.
+        mean (numpy.ndarray, optional): Field subtracted from every snapshot,
+                                        e.g. from Horses3DStatistics.mean
+
+    Yields:
+        numpy.ndarray: Snapshot of shape (nElements, N1, N2, N3, len(variables))
+    """
+    for solutionFile in solutionFiles:
+        snapshot = Horses3DSolution()
+        snapshot.loadSingleSolution(solutionFile)
+        snapshot.computeQuantities(0, variables)
+        Q = np.stack([snapshot.solution[0][..., snapshot.magnitudes[name]] for name in variables], axis=-1)
+        yield Q if mean is None else Q - mean
+
+class Horses3DPOD:
+    """
+    Proper orthogonal decomposition by incremental SVD.
+
+    Attributes:
+        rank (int): Maximum number of retained modes (None keeps all)
+        count (int): Number of snapshots processed
+        singularValues (numpy.ndarray): Singular values in decreasing order
+    """
+    def __init__(self, weights=None, rank=None, tolerance=1e-10, reorthogonalizeEvery=32):
+        """
+        Initialize an empty decomposition.
+
+        Args:
+            weights (numpy.ndarray, optional): Quadrature weights of the inner
+                     product, e.g. Horses3DIntegrals.weights. Broadcast over the
+                     trailing variable axis of the snapshots.
+            rank (int, optional): Number of modes to retain. Defaults to all.
+            tolerance (float, optional): Relative residual below which a snapshot
+                                         adds no new direction. Defaults to 1e-10.
+            reorthogonalizeEvery (int, optional): Snapshots between re-orthogonalizations
+                                                  of the basis. Defaults to 32.
+        """
+        self.weights = weights
+        self.rank = rank
+        self.tolerance = tolerance
+        self.reorthogonalizeEvery = reorthogonalizeEvery
+
+        self.count = 0
+        self.shape = None
+        self._sqrtW = None
+        self._U = None
+        self.singularValues = None
+        self._V = None
+
+    def _weighted(self, snapshot):
+        x = np.asarray(snapshot, dtype=np.float64)
+        if self.shape is None:
+            self.shape = x.shape
+            if self.weights is not None:
+                w = self.weights[..., np.newaxis] if x.ndim == self.weights.ndim + 1 else self.weights
+                self._sqrtW = np.sqrt(np.broadcast_to(w, x.shape)).ravel()
+        elif x.shape != self.shape:
+            raise ValueError(f"Snapshot shape {x.shape} does not match {self.shape}")
+
+        x = x.ravel()
+        return x * self._sqrtW if self._sqrtW is not None else x
+
+    def update(self, snapshot):
+        """
+        Fold one snapshot into the decomposition.
+
+        Args:
+            snapshot (numpy.ndarray): Snapshot of any fixed shape
+        """
+        x = self._weighted(snapshot)
+        self.count += 1
+
+        if self._U is None:
+            norm = np.linalg.norm(x)
+            self._U = (x / norm if norm > 0 else x)[:, np.newaxis]
+            self.singularValues = np.array([norm])
+            self._V = np.ones((1, 1))
+            return
+
+        k = len(self.singularValues)
+        p = self._U.T @ x
+        r = x - self._U @ p
+        rho = np.linalg.norm(r)
+        grow = rho > self.tolerance * max(np.linalg.norm(x), 1e-300)
+
+        K = np.zeros((k + 1, k + 1))
+        K[:k, :k] = np.diag(self.singularValues)
+        K[:k, k] = p
+        K[k, k] = rho if grow else 0.0
+        Uk, Sk, VkT = np.linalg.svd(K)
+
+        V = np.zeros((self._V.shape[0] + 1, k + 1))
+        V[:-1, :k] = self._V
+        V[-1, k] = 1.0
+        V = V @ VkT.T
+
+        if grow:
+            U = np.hstack((self._U, (r / rho)[:, np.newaxis])) @ Uk
+        else:
+            # No new direction: the basis is only rotated
+            U, Sk, V = self._U @ Uk[:k, :k], Sk[:k], V[:, :k]
+
+        keep = len(Sk) if self.rank is None else min(self.rank, len(Sk))
+        self._U, self.singularValues, self._V = U[:, :keep], Sk[:keep], V[:, :keep]
+
+        if self.count % self.reorthogonalizeEvery == 0:
+            self._reorthogonalize()
+
+    def _reorthogonalize(self):
+        Qb, R = np.linalg.qr(self._U)
+        u, s, vt = np.linalg.svd(R * self.singularValues)
+        self._U, self.singularValues, self._V = Qb @ u, s, self._V @ vt.T
+
+    def fit(self, snapshots):
+        """
+        Fold a stream of snapshots into the decomposition.
+
+        Args:
+            snapshots (iterable): Snapshots in time order, e.g. from :func:`snapshot_stream`
+
+        Returns:
+            Horses3DPOD: This decomposition
+        """
+        for snapshot in snapshots:
+            self.update(snapshot)
+        return self
+
+    @property
+    def modes(self):
+        """Spatial modes, shape (nModes, *snapshotShape), orthonormal in the weighted inner product."""
+        U = self._U / self._sqrtW[:, np.newaxis] if self._sqrtW is not None else self._U
+        return U.T.reshape((-1,) + self.shape)
+
+    @property
+    def amplitudes(self):
+        """Temporal coefficients of each mode, shape (nModes, nSnapshots)."""
+        return (self._V * self.singularValues).T
+
+    @property
+    def energy(self):
+        """Fraction of the total (retained) energy captured by each mode."""
+        e = self.singularValues**2
+        return e / e.sum()
+
+    def reconstruct(self, index, nModes=None):
+        """
+        Rebuild a snapshot from the leading modes.
+
+        Args:
+            index (int): Snapshot index in the stream
+            nModes (int, optional): Number of modes to use. Defaults to all retained.
+
+        Returns:
+            numpy.ndarray: Reconstructed snapshot
+        """
+        nModes = nModes or len(self.singularValues)
+        coefficients = self.amplitudes[:nModes, index]
+        return np.tensordot(coefficients, self.modes[:nModes], axes=1)
+
+    def dmd(self, dt=1.0, rank=None):
+        """
+        Dynamic mode decomposition on the POD coordinates of the snapshots.
+
+        Args:
+            dt (float, optional): Time between consecutive snapshots. Defaults to 1.0.
+            rank (int, optional): Number of POD modes used. Defaults to all retained.
+
+        Returns:
+            dict: 'eigenvalues' (discrete), 'frequencies' and 'growthRates'
+                  (continuous time), 'modes' of shape (nModes, *snapshotShape)
+                  and 'amplitudes' of the first snapshot
+        """
+        if self.count < 2:
+            raise ValueError("DMD needs at least two snapshots")
+
+        rank = rank or len(self.singularValues)
+        Z = self.amplitudes[:rank]
+        Z1, Z2 = Z[:, :-1], Z[:, 1:]
+
+        u, s, vt = np.linalg.svd(Z1, full_matrices=False)
+        s = s[s > self.tolerance * s[0]]
+        u, vt = u[:, :len(s)], vt[:len(s)]
+        Atilde = u.T @ Z2 @ vt.T / s
+        eigenvalues, W = np.linalg.eig(Atilde)
+
+        # Exact DMD modes in POD coordinates, lifted to physical space
+        Phi = (Z2 @ vt.T / s) @ W
+        modes = np.tensordot(Phi.T, self.modes[:rank], axes=1)
+        amplitudes = np.linalg.lstsq(Phi, Z[:, 0].astype(complex), rcond=None)[0]
+
+        logs = np.log(eigenvalues.astype(complex)) / dt
+        return {
+            'eigenvalues': eigenvalues,
+            'frequencies': logs.imag / (2*np.pi),
+            'growthRates': logs.real,
+            'modes': modes,
+            'amplitudes': amplitudes,
+        }
@@ -0,0 +1,171 @@
+# derivatives.py
+
+"""
+Spectral differentiation on Horses3D meshes.
+
+Derivatives are taken element by element with the cached 1D nodal
+differentiation matrices, batched over all elements with einsum, and mapped
+to physical space with the mesh metric terms. The velocity gradient tensor
+feeds the vortex identification fields: vorticity, Q-criterion and lambda-2.
+"""
+
+import numpy as np
+from .polynomials import derivative_matrix, node_type
+from .solution import Horses3DSolution
+
+class Horses3DDerivatives:
+    """
+    Physical-space derivatives with cached metric terms.
+
+    Attributes:
+        nodeType (str): Node family of the elements ('gauss' or 'gauss-lobatto')
+        jacobianMatrix (numpy.ndarray): dx_d/dxi_r at every node, shape (nElements, N1, N2, N3, 3, 3)
+        jacobian (numpy.ndarray): Jacobian determinant at every node, shape (nElements, N1, N2, N3)
+    """
+    def __init__(self, mesh, nodeType='gauss'):
+        """
+        Compute the metric terms of a mesh.
+
+        Args:
+            mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+                                  as stored in Horses3DMesh.mesh
+            nodeType (int or str, optional): Node family, as a header code or a name.
+                                             Defaults to 'gauss'.
+        """
+        self.nodeType = node_type(nodeType)
+        self.shape = mesh.shape[:4]
+        self.jacobianMatrix = self.referenceDerivatives(mesh)
+        self.jacobian = np.linalg.det(self.jacobianMatrix)
+        self._inverseMetric = None
+
+    @classmethod
+    def fromMetrics(cls, jacobianMatrix, nodeType='gauss', jacobian=None, inverseMetric=None):
+        """
+        Build the operator from precomputed metric terms, e.g. attached from shared memory.
+
+        Args:
+            jacobianMatrix (numpy.ndarray): dx_d/dxi_r at every node, shape (nElements, N1, N2, N3, 3, 3)
+            nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+            jacobian (numpy.ndarray, optional): Jacobian determinant. Computed if not given.
+            inverseMetric (numpy.ndarray, optional): dxi_r/dx_d. Computed on first use if not given.
+
+        Returns:
+            Horses3DDerivatives: The operator
+        """
+        derivatives = cls.__new__(cls)
+        derivatives.nodeType = node_type(nodeType)
+        derivatives.shape = jacobianMatrix.shape[:4]
+        derivatives.jacobianMatrix = jacobianMatrix
+        derivatives.jacobian = np.linalg.det(jacobianMatrix) if jacobian is None else jacobian
+        derivatives._inverseMetric = inverseMetric
+        return derivatives
+
+    @property
+    def inverseMetric(self):
+        """dxi_r/dx_d at every node, shape (nElements, N1, N2, N3, 3, 3). Computed on first use."""
+        if self._inverseMetric is None:
+            self._inverseMetric = np.linalg.inv(self.jacobianMatrix)
+        return self._inverseMetric
+
+    def referenceDerivatives(self, field):
+        """
+        Derivatives of a nodal field along the three reference directions.
+
+        Args:
+            field (numpy.ndarray): Nodal field, shape (nElements, N1, N2, N3, ...)
+
+        Returns:
+            numpy.ndarray: Array with a trailing axis of size 3 holding d/dxi, d/deta, d/dzeta
+        """
+        D = [derivative_matrix(n, self.nodeType) for n in field.shape[1:4]]
+        return np.stack((np.einsum('il,eljk...->eijk...', D[0], field, optimize=True),
+                         np.einsum('jl,eilk...->eijk...', D[1], field, optimize=True),
+                         np.einsum('kl,eijl...->eijk...', D[2], field, optimize=True)), axis=-1)
+
+    def gradient(self, field):
+        """
+        Physical gradient of a nodal field.
+
+        Args:
+            field (numpy.ndarray): Scalar field (nElements, N1, N2, N3) or vector
+                                   field (nElements, N1, N2, N3, nComponents)
+
+        Returns:
+            numpy.ndarray: Field with a trailing axis of size 3 holding d/dx, d/dy, d/dz
+        """
+        # Chain rule: df/dx_d = sum_r df/dxi_r dxi_r/dx_d
+        dF = self.referenceDerivatives(field)
+        if field.ndim == 4:
+            return (dF[..., np.newaxis, :] @ self.inverseMetric)[..., 0, :]
+        return dF @ self.inverseMetric
+
+    def velocityGradient(self, Q, magnitudes=None):
+        """
+        Velocity gradient tensor of a snapshot.
+
+        Args:
+            Q (numpy.ndarray): Snapshot, shape (nElements, N1, N2, N3, nVariables)
+            magnitudes (dict, optional): Indices of the conserved variables in Q
+
+        Returns:
+            numpy.ndarray: G[..., c, d] = du_c/dx_d, shape (nElements, N1, N2, N3, 3, 3)
+        """
+        magnitudes = magnitudes or Horses3DSolution().magnitudes
+        rho = Q[..., magnitudes['rho']]
+        U = Q[..., [magnitudes['rhou'], magnitudes['rhov'], magnitudes['rhow']]] / rho[..., np.newaxis]
+        return self.gradient(U)
+
+    @staticmethod
+    def vorticity(G):
+        """
+        Args:
+            G (numpy.ndarray): Velocity gradient tensor from :meth:`velocityGradient`
+
+        Returns:
+            numpy.ndarray: Vorticity vector, shape (nElements, N1, N2, N3, 3)
+        """
+        return np.stack((G[..., 2, 1] - G[..., 1, 2],
+                         G[..., 0, 2] - G[..., 2, 0],
+                         G[..., 1, 0] - G[..., 0, 1]), axis=-1)
+
+    @staticmethod
+    def qCriterion(G):
+        """
+        Q-criterion, 0.5 * (|Omega|^2 - |S|^2).
+
+        Args:
+            G (numpy.ndarray): Velocity gradient tensor from :meth:`velocityGradient`
+
+        Returns:
+            numpy.ndarray: Q field, shape (nElements, N1, N2, N3)
+        """
+        # |Omega|^2 - |S|^2 reduces to -G_cd G_dc
+        return -0.5 * np.einsum('...cd,...dc->...', G, G)
+
+    @staticmethod
+    def lambda2(G):
+        """
+        Second eigenvalue of S^2 + Omega^2 (vortex cores where it is negative).
+
+        Args:
+            G (numpy.ndarray): Velocity gradient tensor from :meth:`velocityGradient`
+
+        Returns:
+            numpy.ndarray: lambda-2 field, shape (nElements, N1, N2, N3)
+        """
+        S = 0.5 * (G + np.swapaxes(G, -1, -2))
+        W = 0.5 * (G - np.swapaxes(G, -1, -2))
+        A = S @ S + W @ W
+
+        # Closed-form eigenvalues of a symmetric 3x3 matrix (trigonometric method)
+        q = np.trace(A, axis1=-2, axis2=-1) / 3.0
+        off = A[..., 0, 1]**2 + A[..., 0, 2]**2 + A[..., 1, 2]**2
+        diag = (A[..., 0, 0] - q)**2 + (A[..., 1, 1] - q)**2 + (A[..., 2, 2] - q)**2
+        p = np.sqrt((diag + 2.0*off) / 6.0)
+        safe = np.where(p > 0.0, p, 1.0)
+        B = (A - q[..., np.newaxis, np.newaxis] * np.eye(3)) / safe[..., np.newaxis, np.newaxis]
+        r = np.clip(np.linalg.det(B) / 2.0, -1.0, 1.0)
+        phi = np.arccos(r) / 3.0
+        largest = q + 2.0*p*np.cos(phi)
+        smallest = q + 2.0*p*np.cos(phi + 2.0*np.pi/3.0)
+        return 3.0*q - largest - smallest
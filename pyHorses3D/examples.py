@@ -8,8 +8,10 @@ tasks when working with the Horses3D solver interface.
 """
 
 import os
+import numpy as np
 import matplotlib.pyplot as plt
 from .horses3d import Horses3D
+from .integrals import Horses3DIntegrals
 
 def setup_taylor_green_vortex(control_file_path, solver_path):
     """
@@ -135,6 +137,41 @@ def analyze_time_evolution(solver, solution_files, variable='V'):
         plt.tight_layout()
         plt.show()
 
+def analyze_taylor_green_vortex(solver):
+    """
+    Plot the standard Taylor-Green vortex diagnostics.
+
+    Computes the volume-averaged kinetic energy, its dissipation rate and the
+    enstrophy for every solution file of a finished run.
+
+    Args:
+        solver (Horses3D): Configured Horses3D solver interface
+
+    Returns:
+        dict: Time series with keys 'time', 'iteration', 'kineticEnergy',
+              'enstrophy' and 'dissipation'
+    """
+    solution_files = solver.getSolutionFileNames()
+    mesh_files = solver.getHMeshFileName()
+
+    # Geometry read from its store next to the mesh after the first run
+    integrals = Horses3DIntegrals.fromFile(mesh_files[0])
+    history = integrals.history(sorted(solution_files))
+    history['dissipation'] = -np.gradient(history['kineticEnergy'], history['time'])
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+    ax1.plot(history['time'], history['kineticEnergy'])
+    ax1.set_xlabel('Time')
+    ax1.set_ylabel('Kinetic energy')
+    ax2.plot(history['time'], history['dissipation'], label='-dE/dt')
+    ax2.plot(history['time'], history['enstrophy'], label='Enstrophy')
+    ax2.set_xlabel('Time')
+    ax2.legend()
+    plt.tight_layout()
+    plt.show()
+
+    return history
+
 def full_workflow_example(control_file, solver_path):
     """
     Complete workflow example from setup to visualization.
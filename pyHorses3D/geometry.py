@@ -0,0 +1,249 @@
+# geometry.py
+
+"""
+Per-element geometry of Horses3D meshes, computed once and stored on disk.
+
+One vectorized pass over the node coordinates yields the metric terms
+(Jacobian matrix, determinant and inverse), the quadrature weights times
+|J|, and from them the element volumes, centroids, bounding boxes and
+characteristic lengths. On request, Horses3DGeometry.fromFile stores them
+next to the .hmesh file, keyed by its size and modification time, so
+differentiation, integration, spatial lookups and CFL/resolution diagnostics
+reuse them across sessions instead of recomputing them. The store is several
+times the size of the mesh, so it is opt-in.
+"""
+
+import glob
+import hashlib
+import os
+import numpy as np
+from .hsol import read_header, read_elements
+from .polynomials import nodes_and_weights, node_type, NODE_TYPE_CODES, NODE_TYPES
+
+# Bump when the stored arrays change, so older stores are rebuilt
+GEOMETRY_VERSION = 1
+
+class Horses3DGeometry:
+    """
+    Metric terms and per-element geometric quantities of a mesh.
+
+    Attributes:
+        nodeType (str): Node family of the elements
+        shape (tuple): (nElements, N1, N2, N3)
+        jacobianMatrix (numpy.ndarray): dx_d/dxi_r at every node, shape (nElements, N1, N2, N3, 3, 3)
+        jacobian (numpy.ndarray): Jacobian determinant at every node, shape (nElements, N1, N2, N3)
+        inverseMetric (numpy.ndarray): dxi_r/dx_d at every node, shape (nElements, N1, N2, N3, 3, 3)
+        weights (numpy.ndarray): Quadrature weight times |J| at every node, shape (nElements, N1, N2, N3)
+        volumes (numpy.ndarray): Element volumes, shape (nElements,)
+        centroids (numpy.ndarray): Element centroids, shape (nElements, 3)
+        boxes (numpy.ndarray): Element bounding boxes, shape (nElements, 2, 3)
+        lengths (numpy.ndarray): Element lengths along the three reference directions, shape (nElements, 3)
+        h (numpy.ndarray): Characteristic length, the cube root of the volume, shape (nElements,)
+    """
+    # Arrays persisted by save and restored by load
+    fields = ('jacobianMatrix', 'jacobian', 'inverseMetric', 'weights', 'volumes', 'centroids', 'boxes', 'lengths', 'h')
+
+    def __init__(self, mesh, nodeType='gauss'):
+        """
+        Compute the geometry of a mesh.
+
+        Args:
+            mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+                                  as stored in Horses3DMesh.mesh
+            nodeType (int or str, optional): Node family, as a header code or a name.
+                                             Defaults to 'gauss'.
+        """
+        from .derivatives import Horses3DDerivatives
+        from .probes import bounding_boxes
+
+        self.nodeType = node_type(nodeType)
+        self.shape = tuple(mesh.shape[:4])
+
+        derivatives = Horses3DDerivatives(mesh, self.nodeType)
+        self.jacobianMatrix = derivatives.jacobianMatrix
+        self.jacobian = derivatives.jacobian
+        self.inverseMetric = np.linalg.inv(self.jacobianMatrix)
+
+        w = [nodes_and_weights(n, self.nodeType)[1] for n in self.shape[1:]]
+        self.weights = np.abs(self.jacobian) * np.einsum('i,j,k->ijk', *w)
+        self.volumes = self.weights.sum(axis=(1, 2, 3))
+        self.centroids = np.einsum('eijk,eijkd->ed', self.weights, mesh, optimize=True) / self.volumes[:, np.newaxis]
+        self.boxes = bounding_boxes(mesh, self.nodeType)
+
+        # |dx/dxi_r| integrated over the reference element (volume 8) and times the reference length 2
+        stretch = np.linalg.norm(self.jacobianMatrix, axis=-2)
+        self.lengths = np.einsum('ijk,eijkr->er', np.einsum('i,j,k->ijk', *w), stretch, optimize=True) / 4.0
+        self.h = np.cbrt(self.volumes)
+
+    @classmethod
+    def fromArrays(cls, nodeType, **arrays):
+        """
+        Restore a geometry from its arrays, e.g. read from a store or shared memory.
+
+        Args:
+            nodeType (int or str): Node family
+            **arrays: The arrays listed in :attr:`fields`
+
+        Returns:
+            Horses3DGeometry: The geometry
+        """
+        geometry = cls.__new__(cls)
+        geometry.nodeType = node_type(nodeType)
+        for name in cls.fields:
+            setattr(geometry, name, arrays[name])
+        geometry.shape = tuple(geometry.jacobian.shape)
+        return geometry
+
+    @classmethod
+    def fromFile(cls, meshFile, store=False):
+        """
+        Geometry of a mesh file, optionally read from and written to a store next to the file.
+
+        Args:
+            meshFile (str): Path to the .hmesh file
+            store (bool, optional): Read the store when up to date, and write it otherwise,
+                                    replacing stores of earlier versions of the file.
+                                    Defaults to False.
+
+        Returns:
+            Horses3DGeometry: The geometry
+        """
+        path = cls.storePath(meshFile)
+        if store and os.path.exists(path):
+            try:
+                return cls.load(path)
+            except (OSError, ValueError, KeyError):
+                # Partial or outdated store: rebuild it
+                pass
+
+        mesh = read_elements(meshFile)[0].transpose(0, 2, 3, 4, 1)
+        geometry = cls(mesh, read_header(meshFile)['nodeType'])
+        if store:
+            try:
+                geometry.save(path)
+                cls._remove_stale_stores(meshFile, path)
+            except OSError:
+                # Read-only mesh directory: the geometry is still usable
+                pass
+        return geometry
+
+    @staticmethod
+    def _remove_stale_stores(meshFile, current):
+        # Stores keyed by an earlier size or modification time of the mesh are never read again
+        directory, name = os.path.split(os.path.abspath(meshFile))
+        for path in glob.glob(os.path.join(glob.escape(directory), f".{glob.escape(name)}.geometry_*.npz")):
+            if path != current:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def storePath(meshFile):
+        """Path of the geometry store of a mesh file."""
+        stat = os.stat(meshFile)
+        key = repr((stat.st_size, stat.st_mtime_ns, GEOMETRY_VERSION))
+        digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+        directory, name = os.path.split(os.path.abspath(meshFile))
+        return os.path.join(directory, f".{name}.geometry_{digest}.npz")
+
+    @classmethod
+    def storedField(cls, meshFile, name):
+        """
+        One array of the geometry store of a mesh file, read without the others.
+
+        Args:
+            meshFile (str): Path to the .hmesh file
+            name (str): One of :attr:`fields`, e.g. 'boxes'
+
+        Returns:
+            numpy.ndarray: The array, or None when the file has no up-to-date store
+        """
+        path = cls.storePath(meshFile)
+        if not os.path.exists(path):
+            return None
+        try:
+            # .npz members are read on access, so only this array is loaded
+            with np.load(path) as data:
+                return data[name]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, fname):
+        """
+        Write the geometry as an .npz file.
+
+        Args:
+            fname (str): Path of the file
+        """
+        # Written under a temporary name, so concurrent readers never see a partial file
+        temporary = f"{fname}.{os.getpid()}.tmp.npz"
+        np.savez(temporary, nodeType=NODE_TYPE_CODES[self.nodeType],
+                 **{name: getattr(self, name) for name in self.fields})
+        os.replace(temporary, fname)
+
+    @classmethod
+    def load(cls, fname):
+        """
+        Read a geometry written by :meth:`save`.
+
+        Args:
+            fname (str): Path of the file
+
+        Returns:
+            Horses3DGeometry: The geometry
+        """
+        with np.load(fname) as data:
+            return cls.fromArrays(NODE_TYPES[int(data['nodeType'])], **{name: data[name] for name in cls.fields})
+
+    def derivatives(self):
+        """
+        Returns:
+            Horses3DDerivatives: Operator built on the stored metric terms
+        """
+        from .derivatives import Horses3DDerivatives
+        return Horses3DDerivatives.fromMetrics(self.jacobianMatrix, self.nodeType, self.jacobian, self.inverseMetric)
+
+    def subset(self, elements):
+        """
+        Geometry of a subset of the elements, e.g. for a region loaded with
+        Horses3DSolution.loadSingleSolution(..., region=...).
+
+        Args:
+            elements (array_like): Element indices
+
+        Returns:
+            Horses3DGeometry: The geometry of the selected elements
+        """
+        return self.fromArrays(self.nodeType, **{name: getattr(self, name)[elements] for name in self.fields})
+
+    def nodeSpacing(self):
+        """
+        Mean node spacing of each element along the reference directions.
+
+        Returns:
+            numpy.ndarray: Element length divided by the nodes per direction, shape (nElements, 3)
+        """
+        return self.lengths / np.array(self.shape[1:])
+
+    def cflNumber(self, Q, dt, magnitudes=None, gamma=1.4):
+        """
+        Convective CFL number of each element, dt * max(|u| + a) / min(node spacing).
+
+        Args:
+            Q (numpy.ndarray): Snapshot, shape (nElements, N1, N2, N3, nVariables)
+            dt (float): Time step
+            magnitudes (dict, optional): Indices of the conserved variables in Q
+            gamma (float, optional): Ratio of specific heats. Defaults to 1.4.
+
+        Returns:
+            numpy.ndarray: CFL number, shape (nElements,)
+        """
+        from .solution import Horses3DSolution
+        magnitudes = magnitudes or Horses3DSolution().magnitudes
+        rho = Q[..., magnitudes['rho']]
+        rhoU = Q[..., [magnitudes['rhou'], magnitudes['rhov'], magnitudes['rhow']]]
+        speed = np.linalg.norm(rhoU, axis=-1) / rho
+        p = (gamma - 1.0) * (Q[..., magnitudes['rhoe']] - 0.5 * rho * speed**2)
+        signal = (speed + np.sqrt(gamma * p / rho)).max(axis=(1, 2, 3))
+        return dt * signal / self.nodeSpacing().min(axis=1)
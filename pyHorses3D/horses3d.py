@@ -5,10 +5,19 @@ import sys
 import os
 import glob
 import platform
+import re
 from .control import Horses3DControl
 from .plot import Horses3DPlot
 from .mesh import Horses3DMesh
 from .solution import Horses3DSolution
+from .profiling import profiled
+from .telemetry import Horses3DTelemetry, count_dofs
+from .resources import Horses3DResourceSampler
+
+def _output_order(fname):
+    # Order output files by the number before the extension (iteration), numerically
+    match = re.search(r'_(\d+)\.[^.]+$', fname)
+    return (re.sub(r'_\d+(\.[^.]+)$', r'\1', fname), int(match.group(1)) if match else -1, fname)
 
 class Horses3D:
     """
@@ -25,6 +34,8 @@ class Horses3D:
         horses3dPath (str): Path to Horses3D executable
         solutionFileNames (list): List of solution file names
         meshFileNames (list): List of mesh file names
+        telemetry (Horses3DTelemetry): Parsed solver output of the last run
+        resources (Horses3DResourceSampler): CPU, memory and I/O samples of the last run
     """
     def __init__(self, solverPath, controlFilePath=None):
         """
@@ -42,41 +53,80 @@ class Horses3D:
         self.horses3dPath = solverPath
         self.solutionFileNames = []
         self.meshFileNames = []
+        self.telemetry = None
+        self.resources = None
 
-    def runHorses3D(self, plotResiduals=False):
+    @profiled('solver.run')
+    def runHorses3D(self, plotResiduals=False, pipeline=None, jobs=1, pollInterval=1.0,
+                    echo=True, echoInterval=0.0, sampleInterval=1.0):
         """
         Run the Horses3D solver with the current control file.
         
         This method creates a temporary control file, runs the solver,
-        and optionally plots the residuals after completion.
+        and optionally plots the residuals after completion. When a pipeline
+        is given, solution files are processed while the solver is still running.
         
         Args:
             plotResiduals (bool, optional): Whether to plot residuals after the simulation
                                            completes. Defaults to False.
+            pipeline (callable, optional): Called with the path of every solution file
+                                           as soon as it is written (see Horses3DWatcher)
+            jobs (int, optional): Number of pipeline workers. Defaults to 1.
+            pollInterval (float, optional): Seconds between scans for new files. Defaults to 1.0.
+            echo (bool, optional): Echo the solver output to the terminal. Defaults to True.
+            echoInterval (float, optional): Minimum seconds between echoed iteration rows;
+                                            0 echoes every line. Defaults to 0.0.
+                                            The parsed rows are kept in self.telemetry.
+            sampleInterval (float, optional): Seconds between samples of the CPU, memory and
+                                              I/O of the solver processes, kept in self.resources;
+                                              None disables sampling. Defaults to 1.0.
+
+        Returns:
+            dict: Results of the pipeline by solution file, when a pipeline is given
         """
+        watcher = None
+        sampler = None
         try:
+            if pipeline is not None:
+                from .watch import Horses3DWatcher
+                base_name = os.path.splitext(self.control.parameters["solution file name"])[0][1:]
+                watcher = Horses3DWatcher(f"{base_name}_*.hsol", pipeline, jobs=jobs,
+                                          pollInterval=pollInterval, ignoreExisting=True).start()
+
             config_file = self.control.saveControlFile('control_generated.control')
             # Handle Windows/WSL path conversion if needed
             if platform.system() == 'Windows' and self.horses3dPath.startswith('/mnt/'):
                 # Convert WSL path to Windows path if needed
                 drive_letter = self.horses3dPath.split('/')[2]
-                wsl_path = self.horses3dPath[self.horses3dPath.find('/mnt/')+5:]
-                win_path = f"{drive_letter}:{wsl_path.replace('/', '\\')}"
+                wsl_path = self.horses3dPath[self.horses3dPath.find('/mnt/')+5:].replace('/', '\\')
+                win_path = f"{drive_letter}:{wsl_path}"
                 command = f"{win_path} {config_file}"
             else:
                 command = f"{self.horses3dPath} {config_file}"
                 
             print(f"Running command: {command}")
             process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            self.telemetry = Horses3DTelemetry(echo=echo, echoInterval=echoInterval,
+                                               dofs=lambda: count_dofs(self.getHMeshFileName()[-1]))
+            if sampleInterval:
+                sampler = Horses3DResourceSampler(process.pid, sampleInterval).start()
+                self.resources = sampler
 
             with process.stdout as stdout, process.stderr as stderr:
                 for line in stdout:
-                    sys.stdout.write(line)
+                    self.telemetry.feed(line)
                 for line in stderr:
                     sys.stderr.write(line)
 
+            if sampler is not None:
+                sampler.stop()
             process.wait()
 
+            if watcher is not None:
+                watcher.stop()
+                for fname, error in watcher.errors.items():
+                    print(f"Error processing {fname}: {error}")
+
             if plotResiduals:
                 self.plot_residuals()
         except subprocess.CalledProcessError as e:
@@ -84,10 +134,17 @@ class Horses3D:
         except Exception as e:
             print(f"Unexpected error: {e}")
         finally:
+            if sampler is not None:
+                sampler.stop()
+            if watcher is not None:
+                watcher.stop()
             control_file_path = os.path.join(os.getcwd(), 'control_generated.control')
             if os.path.exists(control_file_path):
                 os.remove(control_file_path)
 
+        return watcher.results if watcher is not None else None
+
+    @profiled('residuals.plot')
     def plot_residuals(self):
         """
         Plot the residuals from the simulation.
@@ -106,10 +163,14 @@ class Horses3D:
         except Exception as e:
             print(f"Error plotting residuals: {e}")
 
+    @profiled('files.solutions')
     def getSolutionFileNames(self):
         """
         Get the names of solution files generated by the simulation.
         
+        Files written since the previous call are added; the list is kept
+        sorted by iteration and without duplicates.
+        
         Returns:
             list: List of solution file names
         """
@@ -122,10 +183,38 @@ class Horses3D:
             if not matching_files:
                 raise FileNotFoundError(f"No matching hsol files found for {solution_file_name}")
     
-            self.solutionFileNames.extend(matching_files)
+            self.solutionFileNames = sorted(set(self.solutionFileNames).union(matching_files), key=_output_order)
         return self.solutionFileNames
 
 
+    def getMonitors(self, directory='.'):
+        """
+        Reader of the volume monitors defined in the control file.
+
+        Call poll() on the returned object to read the rows written so far,
+        also while the solver is running.
+
+        Args:
+            directory (str, optional): Directory the solver runs in. Defaults to '.'.
+
+        Returns:
+            Horses3DMonitors: Incremental reader of the monitor files
+        """
+        from .monitors import Horses3DMonitors
+        return Horses3DMonitors(self.control, directory)
+
+    def getHMeshFilePattern(self):
+        """
+        Glob pattern of the mesh files written by the simulation.
+
+        Returns:
+            str: Pattern, e.g. 'MESH/case_*.hmesh'
+        """
+        solution_file_name = self.control.parameters.get("solution file name")
+        base_name = os.path.splitext(solution_file_name)[0]
+        extracted_name = base_name.split('/')[-1]
+        return f"MESH/{extracted_name}_*.hmesh"
+
     def getHMeshFileName(self):
         """
         Get the names of mesh files used by the simulation.
@@ -134,18 +223,12 @@ class Horses3D:
             list: List of mesh file names
         """
         solution_file_name = self.control.parameters.get("solution file name")
-
-        base_name = os.path.splitext(solution_file_name)[0]
-        extracted_name = base_name.split('/')[-1]
-        hMeshFile = "MESH/" + extracted_name
-
-        pattern = f"{hMeshFile}_*.hmesh"
-        matching_files = glob.glob(pattern)
+        matching_files = glob.glob(self.getHMeshFilePattern())
         
         if not matching_files:
             raise FileNotFoundError(f"No matching hmesh files found for {solution_file_name}")
 
-        self.meshFileNames.extend(matching_files)
+        self.meshFileNames = sorted(set(self.meshFileNames).union(matching_files), key=_output_order)
         return self.meshFileNames
 
 
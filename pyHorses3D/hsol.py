@@ -0,0 +1,247 @@
+# hsol.py
+
+"""
+Low-level access to Horses3D binary files (.hsol and .hmesh).
+
+Both file kinds share the same layout: a fixed 204-byte header followed by
+one record per element. Each record stores the array rank, the array shape
+and the array data in Fortran order.
+
+Since every record starts with its shape, the byte offset of each element
+can be tabulated without decoding the data, and a subset of elements can
+then be read directly from its byte ranges.
+"""
+
+import os
+from functools import lru_cache
+import numpy as np
+
+# File type codes stored in the header
+MESH_FILE = 1
+SOLUTION_FILE = 2
+SOLUTION_AND_GRADIENTS_FILE = 3
+STATS_FILE = 4
+
+# Byte offsets of the fixed header fields
+TITLE_SIZE = 128
+HEADER_SIZE = 152 + 6*8 + 4
+
+# Bytes of the rank and shape that precede the data of each record
+RECORD_HEADER_SIZE = 5*4
+
+def index_selection(selection, length):
+    """
+    Convert an int, slice, (start, stop) tuple or index list into an index array.
+
+    Negative ints and list entries count from the end. Raises IndexError for
+    indices or ranges outside [0, length).
+    """
+    if selection is None:
+        return np.arange(length)
+    if isinstance(selection, slice):
+        return np.arange(length)[selection]
+    if isinstance(selection, tuple) and len(selection) == 2:
+        start, stop = (int(bound) for bound in selection)
+        if not 0 <= start <= stop <= length:
+            raise IndexError(f"Range ({start}, {stop}) out of bounds for axis of length {length}")
+        return np.arange(start, stop)
+    indices = np.atleast_1d(np.asarray(selection, dtype=np.int64))
+    if indices.ndim != 1:
+        raise IndexError("Index selections must be one-dimensional")
+    indices = indices.copy()
+    indices[indices < 0] += length
+    if indices.size and (indices.min() < 0 or indices.max() >= length):
+        raise IndexError(f"Index out of range for axis of length {length}")
+    return indices
+
+def read_header(fname):
+    """
+    Read the fixed header of a Horses3D binary file.
+
+    Args:
+        fname (str): Path to the .hsol or .hmesh file
+
+    Returns:
+        dict: Header fields (title, fileType, nodeType, nElements,
+              iteration, time and refValues)
+    """
+    with open(fname, 'rb') as file:
+        buffer = file.read(HEADER_SIZE)
+
+    if len(buffer) < HEADER_SIZE:
+        raise IOError(f"Truncated Horses3D file header: {fname}")
+
+    ints = np.frombuffer(buffer, dtype=np.int32, count=4, offset=TITLE_SIZE)
+    time = np.frombuffer(buffer, dtype=np.float64, count=1, offset=144)
+    ref_values = np.frombuffer(buffer, dtype=np.float64, count=6, offset=152)
+
+    return {
+        'title': buffer[:TITLE_SIZE].decode('ascii', errors='replace').strip(' \x00'),
+        'fileType': int(ints[0]),
+        'nodeType': int(ints[1]),
+        'nElements': int(ints[2]),
+        'iteration': int(ints[3]),
+        'time': float(time[0]),
+        'refValues': ref_values.copy(),
+    }
+
+def write_file(fname, arrays, fileType=SOLUTION_FILE, nodeType=1, iteration=0, time=0.0,
+               refValues=None, title=''):
+    """
+    Write a Horses3D binary file in one buffered pass.
+
+    All element records are laid out in a single structured array, so the
+    whole file is written with two system calls regardless of the element count.
+
+    Args:
+        fname (str): Path of the file to write
+        arrays (list): Per-element records, each an array of shape
+                       (nElements, n0, N1, N2, N3) in the reader layout.
+                       Records are interleaved per element in the given order
+                       (e.g. [Q] or [Q, U_x, U_y, U_z]).
+        fileType (int, optional): File type code. Defaults to SOLUTION_FILE.
+        nodeType (int, optional): Node type code (1 Gauss, 2 Gauss-Lobatto). Defaults to 1.
+        iteration (int, optional): Iteration number. Defaults to 0.
+        time (float, optional): Physical time. Defaults to 0.0.
+        refValues (array_like, optional): The six reference values. Defaults to zeros.
+        title (str, optional): Title stored in the first 128 bytes
+
+    Returns:
+        str: The path of the written file
+    """
+    nElements = arrays[0].shape[0]
+    header = bytearray(HEADER_SIZE)
+    header[:TITLE_SIZE] = title.encode('ascii', errors='replace')[:TITLE_SIZE].ljust(TITLE_SIZE)
+    header[TITLE_SIZE:TITLE_SIZE + 16] = np.array([fileType, nodeType, nElements, iteration], dtype='<i4').tobytes()
+    header[144:152] = np.array([time], dtype='<f8').tobytes()
+    refValues = np.zeros(6) if refValues is None else np.asarray(refValues, dtype=np.float64)
+    header[152:200] = refValues.astype('<f8').tobytes()
+
+    fields = []
+    for r, array in enumerate(arrays):
+        if array.ndim != 5 or array.shape[0] != nElements:
+            raise ValueError(f"Record {r} must have shape (nElements, n0, N1, N2, N3)")
+        fields += [(f'rank{r}', '<i4'), (f'shape{r}', '<i4', (4,)), (f'data{r}', '<f8', (int(np.prod(array.shape[1:])),))]
+
+    records = np.empty(nElements, dtype=np.dtype(fields))
+    for r, array in enumerate(arrays):
+        records[f'rank{r}'] = 4
+        records[f'shape{r}'] = array.shape[1:]
+        # Fortran order within each element
+        records[f'data{r}'] = array.transpose(0, 4, 3, 2, 1).reshape(nElements, -1)
+
+    with open(fname, 'wb') as file:
+        file.write(header)
+        records.tofile(file)
+    return fname
+
+def _record_dtype(shapes):
+    # One element: a (rank, shape, data) record per array, as written by write_file
+    fields = []
+    for r, shape in enumerate(shapes):
+        fields += [(f'rank{r}', '<i4'), (f'shape{r}', '<i4', (4,)), (f'data{r}', '<f8', (int(np.prod(shape)),))]
+    return np.dtype(fields)
+
+@lru_cache(maxsize=256)
+def _offset_table(fname, size, mtime):
+    header = read_header(fname)
+    nElements = header['nElements']
+    nRecords = 4 if header['fileType'] == SOLUTION_AND_GRADIENTS_FILE else 1
+
+    with open(fname, 'rb') as file:
+        # Shapes of the records of the first element
+        shapes = []
+        offset = HEADER_SIZE
+        for r in range(nRecords):
+            file.seek(offset)
+            shape = np.frombuffer(file.read(RECORD_HEADER_SIZE), dtype='<i4')[1:]
+            shapes.append(shape)
+            offset += RECORD_HEADER_SIZE + 8*int(np.prod(shape))
+        stride = offset - HEADER_SIZE
+
+        if HEADER_SIZE + nElements*stride == size:
+            # Every element has the same order: the offsets follow from the stride
+            offsets = HEADER_SIZE + stride*np.arange(nElements, dtype=np.int64)
+            shapes = np.broadcast_to(np.array(shapes, dtype=np.int32), (nElements, nRecords, 4))
+        else:
+            # Mixed orders: walk the record shapes once
+            offsets = np.empty(nElements, dtype=np.int64)
+            shapes = np.empty((nElements, nRecords, 4), dtype=np.int32)
+            offset = HEADER_SIZE
+            for e in range(nElements):
+                offsets[e] = offset
+                for r in range(nRecords):
+                    file.seek(offset)
+                    shapes[e, r] = np.frombuffer(file.read(RECORD_HEADER_SIZE), dtype='<i4')[1:]
+                    offset += RECORD_HEADER_SIZE + 8*int(np.prod(shapes[e, r]))
+            if offset != size:
+                raise IOError(f"Inconsistent element records: {fname}")
+
+    offsets.setflags(write=False)
+    if shapes.flags.writeable:
+        shapes.setflags(write=False)
+    return {'fileType': header['fileType'], 'nElements': nElements, 'offsets': offsets, 'shapes': shapes}
+
+def offset_table(fname):
+    """
+    Byte offset and record shapes of every element of a Horses3D binary file.
+
+    Only the record shapes are read, and when all elements have the same
+    order only those of the first element. Tables are cached per file
+    (path, size and modification time) and are read-only.
+
+    Args:
+        fname (str): Path to the .hsol or .hmesh file
+
+    Returns:
+        dict: 'fileType', 'nElements', 'offsets' (nElements,) and the
+              record 'shapes' (nElements, nRecords, 4)
+    """
+    stat = os.stat(fname)
+    return _offset_table(os.path.abspath(fname), stat.st_size, stat.st_mtime_ns)
+
+def read_elements(fname, elements=None, table=None):
+    """
+    Read a subset of elements, touching only their byte ranges.
+
+    Consecutive elements are read with a single call, so contiguous
+    selections cost one read and scattered ones one read per element.
+
+    Args:
+        fname (str): Path to the .hsol or .hmesh file
+        elements (int, slice, tuple or array, optional): Element selection. Defaults to all.
+        table (dict, optional): Offset table of the file. Defaults to :func:`offset_table`.
+
+    Returns:
+        tuple: (Q, gradients) in the reader layout, Q of shape (nSelected, n0, N1, N2, N3)
+               and gradients of shape (nSelected, n0, N1, N2, N3, 3), or None when the
+               file has no gradients
+    """
+    table = table or offset_table(fname)
+    elements = index_selection(elements, table['nElements'])
+    shapes = table['shapes'][elements]
+    if len(elements) and (shapes != shapes[0]).any():
+        raise ValueError("The selected elements have different polynomial orders")
+
+    nRecords = table['shapes'].shape[1]
+    recordShapes = shapes[0] if len(elements) else table['shapes'][0]
+    records = np.empty(len(elements), dtype=_record_dtype(recordShapes))
+
+    # Runs of elements that are consecutive in the file
+    offsets = table['offsets'][elements]
+    breaks = np.flatnonzero(np.diff(elements) != 1) + 1
+    with open(fname, 'rb') as file:
+        for start, stop in zip(np.r_[0, breaks], np.r_[breaks, len(elements)]):
+            file.seek(offsets[start])
+            if file.readinto(memoryview(records[start:stop]).cast('B')) != records[start:stop].nbytes:
+                raise IOError(f"Truncated Horses3D file: {fname}")
+
+    arrays = []
+    for r, shape in enumerate(recordShapes):
+        if (records[f'rank{r}'] != 4).any() or (records[f'shape{r}'] != shape).any():
+            raise IOError(f"Inconsistent element records: {fname}")
+        # Fortran order within each element
+        arrays.append(records[f'data{r}'].reshape(len(elements), *shape[::-1]).transpose(0, 4, 3, 2, 1))
+
+    Grad = np.stack(arrays[1:], axis=-1) if nRecords == 4 else None
+    return np.ascontiguousarray(arrays[0]), Grad
@@ -0,0 +1,151 @@
+# integrals.py
+
+"""
+Quadrature-weighted volume integrals over Horses3D meshes.
+
+The Gauss-point Jacobians and quadrature weights come from the mesh
+geometry (Horses3DGeometry), computed once or read from its optional store
+next to the .hmesh file. After that, the volume integral of any nodal field
+is a single contraction with the cached weights. That makes time-series
+diagnostics such as the Taylor-Green kinetic energy and enstrophy cheap to
+evaluate.
+"""
+
+import numpy as np
+from .hsol import read_header
+from .geometry import Horses3DGeometry
+from .solution import Horses3DSolution
+
+class Horses3DIntegrals:
+    """
+    Volume integration with cached geometric weights.
+
+    Attributes:
+        geometry (Horses3DGeometry): Geometry of the mesh
+        derivatives (Horses3DDerivatives): Metric terms of the mesh, reused for
+                                           the derivatives in enstrophy
+        weights (numpy.ndarray): Quadrature weight times |J| at every node
+        volume (float): Total mesh volume
+    """
+    def __init__(self, mesh=None, nodeType='gauss', geometry=None):
+        """
+        Compute the geometric weights of a mesh, or take them from its geometry.
+
+        Args:
+            mesh (numpy.ndarray, optional): Node coordinates, shape (nElements, N1, N2, N3, 3)
+                                            as stored in Horses3DMesh.mesh
+            nodeType (int or str, optional): Node family, as a header code or a name.
+                                             Defaults to 'gauss'.
+            geometry (Horses3DGeometry, optional): Precomputed geometry, used instead of mesh
+        """
+        if geometry is None:
+            if mesh is None:
+                raise ValueError("Please provide the mesh or its geometry")
+            geometry = Horses3DGeometry(mesh, nodeType)
+        self.geometry = geometry
+        self.derivatives = geometry.derivatives()
+        self.nodeType = geometry.nodeType
+        self.shape = geometry.shape
+        self.weights = geometry.weights
+        self.volume = float(self.weights.sum())
+
+    @classmethod
+    def fromFile(cls, meshFile, store=False):
+        """
+        Integrals over the mesh of a .hmesh file.
+
+        Args:
+            meshFile (str): Path to the .hmesh file
+            store (bool, optional): Use the geometry store of the file (see
+                                    Horses3DGeometry.fromFile). Defaults to False.
+
+        Returns:
+            Horses3DIntegrals: The integrator
+        """
+        return cls(geometry=Horses3DGeometry.fromFile(meshFile, store))
+
+    def integrate(self, field):
+        """
+        Volume integral of a nodal field.
+
+        Args:
+            field (numpy.ndarray): Field of shape (..., nElements, N1, N2, N3). Leading
+                                   axes (e.g. time) are kept.
+
+        Returns:
+            float or numpy.ndarray: The integral over the whole mesh
+        """
+        return np.tensordot(field, self.weights, axes=4)
+
+    def average(self, field):
+        """
+        Volume average of a nodal field.
+
+        Args:
+            field (numpy.ndarray): Field of shape (..., nElements, N1, N2, N3)
+
+        Returns:
+            float or numpy.ndarray: The integral divided by the mesh volume
+        """
+        return self.integrate(field) / self.volume
+
+    def kineticEnergy(self, Q, magnitudes=None):
+        """
+        Volume-averaged kinetic energy, 1/V * int(0.5 rho u.u dV).
+
+        Args:
+            Q (numpy.ndarray): Snapshot, shape (nElements, N1, N2, N3, nVariables)
+            magnitudes (dict, optional): Indices of the conserved variables in Q
+
+        Returns:
+            float: Volume-averaged kinetic energy
+        """
+        magnitudes = magnitudes or Horses3DSolution().magnitudes
+        rho = Q[..., magnitudes['rho']]
+        rhoU = Q[..., [magnitudes['rhou'], magnitudes['rhov'], magnitudes['rhow']]]
+        return self.average(0.5 * np.einsum('...c,...c->...', rhoU, rhoU) / rho)
+
+    def enstrophy(self, Q, magnitudes=None):
+        """
+        Volume-averaged enstrophy, 1/V * int(0.5 rho w.w dV).
+
+        Args:
+            Q (numpy.ndarray): Snapshot, shape (nElements, N1, N2, N3, nVariables)
+            magnitudes (dict, optional): Indices of the conserved variables in Q
+
+        Returns:
+            float: Volume-averaged enstrophy
+        """
+        magnitudes = magnitudes or Horses3DSolution().magnitudes
+        rho = Q[..., magnitudes['rho']]
+        omega = self.derivatives.vorticity(self.derivatives.velocityGradient(Q, magnitudes))
+        return self.average(0.5 * rho * np.einsum('...c,...c->...', omega, omega))
+
+    def history(self, solutionFiles, quantities=('kineticEnergy', 'enstrophy')):
+        """
+        Evaluate volume diagnostics over a series of solution files.
+
+        Snapshots are read one at a time, so memory does not grow with the
+        length of the series.
+
+        Args:
+            solutionFiles (list): Solution files in time order
+            quantities (tuple, optional): Names of the diagnostics to evaluate.
+                                          Defaults to ('kineticEnergy', 'enstrophy').
+
+        Returns:
+            dict: 'time', 'iteration' and one array per diagnostic
+        """
+        reader = Horses3DSolution()
+        result = {'time': [], 'iteration': []}
+        result.update({name: [] for name in quantities})
+
+        for solutionFile in solutionFiles:
+            header = read_header(solutionFile)
+            Q = reader._Q_from_file(solutionFile).transpose(0,2,3,4,1)
+            result['time'].append(header['time'])
+            result['iteration'].append(header['iteration'])
+            for name in quantities:
+                result[name].append(getattr(self, name)(Q, reader.magnitudes))
+
+        return {key: np.asarray(values) for key, values in result.items()}
@@ -1,13 +1,39 @@
 import numpy as np
 import os
 import glob
+from .cache import decode_cache
+from .hsol import read_elements
+from .profiling import profiler
 
 class Horses3DMesh:
     def __init__(self):
         self.mesh = []
 
-    def loadMesh(self, filepath):
-        self.mesh.append(self._Q_from_file(filepath).transpose(0,2,3,4,1))
+    def loadMesh(self, filepath, elements=None, region=None):
+        # With elements or region, only the byte ranges of the selected elements are read
+        if region is not None:
+            from .region import elements_in_region
+            elements = elements_in_region(filepath, region)
+        with profiler.stage('mesh.read') as stage:
+            if elements is None:
+                if decode_cache.enabled:
+                    X, = decode_cache.load(filepath, lambda fname: (self._Q_from_file(fname),))
+                else:
+                    X = self._Q_from_file(filepath)
+                stage.add(bytes=os.path.getsize(filepath), elements=X.shape[0])
+            else:
+                X = read_elements(filepath, elements)[0]
+                stage.add(bytes=X.nbytes, elements=X.shape[0])
+        self.mesh.append(X.transpose(0,2,3,4,1))
+
+    def loadFromArchive(self, archive, elements=None):
+        from .archive import Horses3DArchive
+
+        if not isinstance(archive, Horses3DArchive):
+            with Horses3DArchive(archive) as opened:
+                return self.loadFromArchive(opened, elements)
+
+        self.mesh.append(archive.readMesh(elements))
 
     def _Q_from_file(self, fname):
         v1 = np.fromfile(fname, dtype=np.int32, count=2, sep='', offset=136)
@@ -0,0 +1,164 @@
+# modal.py
+
+"""
+Modal (Legendre) transforms, filters and resolution indicators per element.
+
+Nodal values are mapped to orthonormal Legendre coefficients with cached
+Vandermonde matrices, one direction at a time, for all elements of a snapshot
+in a single contraction. In the orthonormal basis the squared coefficients
+are the L2 energy of each mode in the reference element. The energy decay
+over the modes shows how well each element resolves the flow, e.g. for LES
+quality checks.
+"""
+
+from functools import lru_cache
+import numpy as np
+from .polynomials import vandermonde_matrix, node_type, GAUSS
+
+def _contract(matrices, field):
+    return np.einsum('ai,bj,ck,eijk...->eabc...', *matrices, field, optimize=True)
+
+def to_modal(field, nodeType=GAUSS):
+    """
+    Nodal to modal transform.
+
+    Args:
+        field (numpy.ndarray): Nodal values, shape (nElements, N1, N2, N3, ...)
+        nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+
+    Returns:
+        numpy.ndarray: Legendre coefficients c[e, i, j, k, ...] of the same shape
+    """
+    nodeType = node_type(nodeType)
+    return _contract([vandermonde_matrix(n, nodeType)[1] for n in field.shape[1:4]], field)
+
+def to_nodal(coefficients, nodeType=GAUSS):
+    """
+    Modal to nodal transform, the inverse of :func:`to_modal`.
+
+    Args:
+        coefficients (numpy.ndarray): Legendre coefficients, shape (nElements, N1, N2, N3, ...)
+        nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+
+    Returns:
+        numpy.ndarray: Nodal values of the same shape
+    """
+    nodeType = node_type(nodeType)
+    return _contract([vandermonde_matrix(n, nodeType)[0] for n in coefficients.shape[1:4]], coefficients)
+
+@lru_cache(maxsize=None)
+def filter_matrix(n, nodeType=GAUSS, cutoff=0, alpha=36.0, order=16):
+    """
+    Nodal matrix of a 1D modal filter, F = V diag(sigma) V^-1.
+
+    Modes up to the cutoff are kept. Above it, the exponential filter damps
+    mode k by sigma_k = exp(-alpha * ((k - cutoff) / (n - 1 - cutoff))^order).
+    With order=None the filter is a sharp cutoff.
+
+    Args:
+        n (int): Number of nodes
+        nodeType (str, optional): Node family. Defaults to 'gauss'.
+        cutoff (int, optional): Highest mode left untouched. Defaults to 0.
+        alpha (float, optional): Damping of the highest mode. Defaults to 36 (machine zero).
+        order (int, optional): Filter order; None for a sharp cutoff. Defaults to 16.
+
+    Returns:
+        numpy.ndarray: (n, n) matrix
+    """
+    V, Vinv = vandermonde_matrix(n, node_type(nodeType))
+    k = np.arange(n)
+    if order is None:
+        sigma = (k <= cutoff).astype(np.float64)
+    else:
+        eta = np.clip((k - cutoff) / max(n - 1 - cutoff, 1), 0.0, None)
+        sigma = np.exp(-alpha * eta**order)
+    F = (V * sigma) @ Vinv
+    F.setflags(write=False)
+    return F
+
+def modal_filter(field, nodeType=GAUSS, cutoff=0, alpha=36.0, order=16):
+    """
+    Filter a nodal field in modal space, direction by direction.
+
+    Args:
+        field (numpy.ndarray): Nodal values, shape (nElements, N1, N2, N3, ...)
+        nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+        cutoff (int, optional): Highest mode left untouched. Defaults to 0.
+        alpha (float, optional): Damping of the highest mode. Defaults to 36.
+        order (int, optional): Filter order; None for a sharp cutoff. Defaults to 16.
+
+    Returns:
+        numpy.ndarray: Filtered nodal values of the same shape
+    """
+    nodeType = node_type(nodeType)
+    return _contract([filter_matrix(n, nodeType, cutoff, alpha, order) for n in field.shape[1:4]], field)
+
+@lru_cache(maxsize=None)
+def _shells(shape):
+    # One-hot map from each mode (i, j, k) to its shell max(i, j, k)
+    i, j, k = np.meshgrid(*[np.arange(n) for n in shape], indexing='ij')
+    shell = np.maximum(np.maximum(i, j), k).ravel()
+    S = (shell[np.newaxis, :] == np.arange(max(shape))[:, np.newaxis]).astype(np.float64)
+    S.setflags(write=False)
+    return S
+
+def modal_energy(field, nodeType=GAUSS):
+    """
+    Energy of each modal shell per element.
+
+    Shell m gathers the modes whose highest 1D degree is m. The shells sum
+    to the L2 norm squared of the field in the reference element.
+
+    Args:
+        field (numpy.ndarray): Nodal values, shape (nElements, N1, N2, N3, ...)
+        nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+
+    Returns:
+        numpy.ndarray: Shell energies, shape (nElements, max(N1, N2, N3), ...)
+    """
+    c = to_modal(field, nodeType)
+    c2 = (c**2).reshape(c.shape[0], -1, *c.shape[4:])
+    return np.einsum('sn,en...->es...', _shells(c.shape[1:4]), c2, optimize=True)
+
+def resolution_indicator(field, nodeType=GAUSS):
+    """
+    Per-element resolution (smoothness) indicator of Persson and Peraire.
+
+    log10 of the fraction of energy in the highest modal shell. Well-resolved
+    elements give strongly negative values; values approaching 0 flag
+    under-resolved elements.
+
+    Args:
+        field (numpy.ndarray): Nodal values, shape (nElements, N1, N2, N3, ...)
+        nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+
+    Returns:
+        numpy.ndarray: Indicator, shape (nElements, ...)
+    """
+    E = modal_energy(field, nodeType)
+    tiny = np.finfo(np.float64).tiny
+    return np.log10(np.maximum(E[:, -1], tiny) / np.maximum(E.sum(axis=1), tiny))
+
+def decay_rate(field, nodeType=GAUSS):
+    """
+    Exponential decay rate of the modal energy per element.
+
+    Least-squares slope of -ln(E_m) against m over the shells m >= 1 (the
+    mean is excluded). Large rates mean rapidly converging, well-resolved
+    elements. Small or negative rates mean energy piles up in the high modes.
+
+    Args:
+        field (numpy.ndarray): Nodal values, shape (nElements, N1, N2, N3, ...)
+        nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+
+    Returns:
+        numpy.ndarray: Decay rate, shape (nElements, ...)
+    """
+    E = modal_energy(field, nodeType)[:, 1:]
+    if E.shape[1] < 2:
+        raise ValueError("The decay rate needs at least polynomial order 2")
+
+    y = -np.log(np.maximum(E, np.finfo(np.float64).tiny))
+    m = np.arange(1, E.shape[1] + 1, dtype=np.float64)
+    m = (m - m.mean()).reshape((1, -1) + (1,) * (E.ndim - 2))
+    return (m * (y - y.mean(axis=1, keepdims=True))).sum(axis=1) / (m**2).sum()
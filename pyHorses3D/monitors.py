@@ -0,0 +1,262 @@
+# monitors.py
+
+"""
+Reader of the volume-monitor output files written by Horses3D.
+
+Every `#define volume monitor` block of the control file makes the solver
+write `<solution file name>.<name>.volume`, named after the `name =` entry
+of the block: a short text header
+followed by one row per sampled iteration (iteration, time and the monitored
+values). Horses3DMonitors maps each monitor parsed by Horses3DControl to its
+file and tails it by byte offset. A poll reads only the bytes appended since
+the previous one and parses the complete lines in a single vectorized call,
+so the monitors of a long run can be polled every few seconds at a cost
+proportional to the new rows, not to the length of the run.
+"""
+
+import glob
+import io
+import os
+import re
+import numpy as np
+
+# Initial rows allocated per monitor; the buffers double when full
+_INITIAL_ROWS = 1024
+
+def monitor_file(solutionFileName, name, directory='.'):
+    """
+    Output file of a volume monitor.
+
+    Args:
+        solutionFileName (str): Value of 'solution file name' in the control file
+        name (str): Monitor name, the `name =` entry of its block
+        directory (str, optional): Directory the solver runs in. Defaults to '.'.
+
+    Returns:
+        str: Path of the `.volume` file
+    """
+    base = os.path.splitext(solutionFileName.strip().lstrip('/'))[0]
+    return os.path.join(directory, f"{base}.{name}.volume")
+
+def parse_rows(data, columns):
+    """
+    Parse complete rows of a monitor file in one vectorized call.
+
+    Args:
+        data (bytes): Text of whole lines
+        columns (int): Values per row
+
+    Returns:
+        numpy.ndarray: Values of shape (rows, columns)
+    """
+    text = data.decode('ascii', errors='replace')
+    # Fortran drops the 'E' of three-digit exponents (1.0-100)
+    text = re.sub(r'(\d)([+-]\d{3})\b', r'\1E\2', text)
+    values = np.fromstring(text, dtype=np.float64, sep=' ')
+    if values.size % columns:
+        # Malformed line: fall back to the line-by-line parser for a precise error
+        values = np.loadtxt(io.StringIO(text), dtype=np.float64, ndmin=2)
+    return values.reshape(-1, columns)
+
+class _MonitorFile:
+    # Tailing state of one monitor file
+
+    def __init__(self, path):
+        self.path = path
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.names = None
+        self.header = []
+        self.rows = 0
+        self.data = None
+
+    def _parse_header(self, lines):
+        # Header lines precede the first numeric row; the last one names the columns
+        for line in lines:
+            tokens = line.split()
+            if not tokens:
+                self.header.append(line)
+                continue
+            try:
+                float(tokens[0].replace(b'D', b'E'))
+            except ValueError:
+                self.header.append(line)
+                continue
+            return True
+        return False
+
+    def _columns(self, count):
+        names = re.split(r'\s{2,}', self.header[-1].decode('ascii', errors='replace').strip()) if self.header else []
+        names = [name for name in names if name] or ['Iteration', 'Time']
+        if len(names) < count:
+            # Vector-valued monitors name one variable for several columns
+            last = names[-1]
+            extra = count - len(names) + 1
+            names = names[:-1] + [f"{last}_{i+1}" for i in range(extra)]
+        return names[:count]
+
+    def poll(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+        if size < self.offset:
+            # Truncated, e.g. by a restart that rewrote the file
+            self.reset()
+        if size == self.offset:
+            return 0
+
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset)
+            chunk = file.read(size - self.offset)
+        # Only complete lines are consumed; a partial last line is read again next time
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            return 0
+        chunk = chunk[:end]
+
+        if self.names is None:
+            lines = chunk.splitlines(keepends=True)
+            self.header = []
+            if not self._parse_header(lines):
+                # Header only so far
+                self.header = []
+                return 0
+            skip = sum(len(line) for line in self.header)
+            self.offset += skip
+            chunk = chunk[skip:]
+            count = len(chunk.split(b'\n', 1)[0].split())
+            self.names = self._columns(count)
+            self.data = np.empty((_INITIAL_ROWS, count))
+
+        values = parse_rows(chunk.replace(b'D', b'E'), len(self.names))
+        needed = self.rows + len(values)
+        if needed > len(self.data):
+            grown = np.empty((max(needed, 2 * len(self.data)), len(self.names)))
+            grown[:self.rows] = self.data[:self.rows]
+            self.data = grown
+        self.data[self.rows:needed] = values
+        self.rows = needed
+        self.offset += len(chunk)
+        return len(values)
+
+    def columns(self):
+        if self.names is None:
+            return {}
+        return {name: self.data[:self.rows, j] for j, name in enumerate(self.names)}
+
+class Horses3DMonitors:
+    """
+    Incremental reader of the volume monitors of a run.
+
+    Attributes:
+        files (dict): Output file of each monitor, keyed as in Horses3DControl.monitors
+        definitions (dict): Monitor definitions, as parsed by Horses3DControl
+    """
+    def __init__(self, control, directory='.'):
+        """
+        Map the monitors of a control file to their output files.
+
+        Args:
+            control (Horses3DControl or str): Parsed control file, or its path
+            directory (str, optional): Directory the solver runs in. Defaults to '.'.
+        """
+        if isinstance(control, (str, os.PathLike)):
+            from .control import Horses3DControl
+            control = Horses3DControl(control)
+        solutionFileName = control.parameters.get("solution file name")
+        if not solutionFileName:
+            raise ValueError("The control file has no 'solution file name'")
+
+        self.directory = directory
+        self.definitions = dict(control.monitors)
+        self.files = {}
+        for key, definition in self.definitions.items():
+            # The solver names the file after the 'name' entry of the block
+            name = definition.get('name', key)
+            path = monitor_file(solutionFileName, name, directory)
+            if not os.path.exists(path):
+                # Fall back to a file of the same monitor elsewhere in the run directory
+                pattern = f"*.{glob.escape(name)}.volume"
+                matches = glob.glob(os.path.join(glob.escape(directory), '**', pattern), recursive=True)
+                path = matches[0] if len(matches) == 1 else path
+            self.files[key] = path
+        self._files = {name: _MonitorFile(path) for name, path in self.files.items()}
+
+    def poll(self):
+        """
+        Read the rows appended to every monitor file since the previous poll.
+
+        Returns:
+            dict: Number of new rows of each monitor
+        """
+        return {name: state.poll() for name, state in self._files.items()}
+
+    def reset(self):
+        """Forget the rows read so far; the next poll reads the files from the start."""
+        for state in self._files.values():
+            state.reset()
+
+    def __getitem__(self, name):
+        """
+        Columns of a monitor read so far.
+
+        Args:
+            name (str): Monitor name
+
+        Returns:
+            dict: Column name -> array of the rows read so far, e.g. 'Iteration', 'Time'
+                  and the monitored variable. The arrays are views that a later poll may replace.
+        """
+        return self._files[name].columns()
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    def latest(self):
+        """
+        Last row of every monitor, e.g. for a live dashboard.
+
+        Returns:
+            dict: Monitor name -> {column: value}, for the monitors with data
+        """
+        return {name: {column: float(values[-1]) for column, values in state.columns().items()}
+                for name, state in self._files.items() if state.rows}
+
+    def aligned(self, names=None):
+        """
+        Monitors aligned on the iterations present in all of them.
+
+        Args:
+            names (list, optional): Monitors to align. Defaults to all with data.
+
+        Returns:
+            dict: 'Iteration', 'Time' and '<monitor>.<column>' for every other column
+        """
+        names = [name for name in (names or self.files) if self._files[name].rows]
+        if not names:
+            return {}
+
+        columns = [self._files[name].columns() for name in names]
+        iterations = [values[next(iter(values))] for values in columns]
+        common = iterations[0]
+        for other in iterations[1:]:
+            common = np.intersect1d(common, other)
+        # A restart may repeat iterations: the last row of each iteration wins
+        first = columns[0]
+        table = {}
+        for name, values, iteration in zip(names, columns, iterations):
+            order = len(iteration) - 1 - np.unique(iteration[::-1], return_index=True)[1]
+            rows = order[np.searchsorted(iteration[order], common)]
+            keys = list(values)
+            if values is first:
+                table[keys[0]] = values[keys[0]][rows]
+                table[keys[1]] = values[keys[1]][rows]
+            for key in keys[2:]:
+                table[f"{name}.{key}"] = values[key][rows]
+        return table
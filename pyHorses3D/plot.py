@@ -1,7 +1,6 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.interpolate import griddata
 import re
+from .profiling import profiled
 
 class Horses3DPlot:
 
@@ -42,7 +41,10 @@ class Horses3DPlot:
         yi = np.linspace(y.min(), y.max(), num_y)
         return np.meshgrid(xi, yi)
 
+    @profiled('plot.field3d')
     def plot3DField(self, mesh, field, key, cmap='jet'):
+        import matplotlib.pyplot as plt
+
         self._validate_key(key)
 
         if self._is_2d_mesh(mesh):
@@ -67,7 +69,10 @@ class Horses3DPlot:
 
         plt.show()
 
-    def plot2DField(self, mesh, field, key, plane='XY', value=0, cmap='jet', isocontours=False, contour_levels=10):
+    @profiled('plot.slice')
+    def slicePlane(self, mesh, field, key, plane='XY', value=0):
+        from scipy.interpolate import griddata
+
         self._validate_key(key)
 
         coord_x, coord_y, coord_z = self._extract_coordinates(mesh)
@@ -91,6 +96,15 @@ class Horses3DPlot:
 
         X, Y = self._create_grid(x, y)
         Z = griddata((x, y), field[idx], (X, Y), method='cubic')
+        return X, Y, Z, x, y
+
+    @profiled('plot.field2d')
+    def plot2DField(self, mesh, field, key, plane='XY', value=0, cmap='jet', isocontours=False, contour_levels=10):
+        import matplotlib.pyplot as plt
+
+        X, Y, Z, x, y = self.slicePlane(mesh, field, key, plane, value)
+        if self._is_2d_mesh(mesh):
+            plane = 'XY'
 
         plt.figure(figsize=(10, 7))
         heatmap = plt.imshow(Z, extent=(x.min(), x.max(), y.min(), y.max()), origin='lower', cmap=cmap, aspect='auto')
@@ -105,7 +119,11 @@ class Horses3DPlot:
         plt.title(f'Heatmap in {plane} plane at {"Z" if plane == "XY" else ("Y" if plane == "XZ" else "X")} = {value}')
         plt.show()
 
+    @profiled('plot.streamlines')
     def plot2DStreamlines(self, mesh, field, plane='XY', value=0, cmap='jet'):
+        import matplotlib.pyplot as plt
+        from scipy.interpolate import griddata
+
         coord_x, coord_y, coord_z = self._extract_coordinates(mesh)
         rhou_field = field[..., self.magnitudes['rhou']].reshape(-1)
         rhov_field = field[..., self.magnitudes['rhov']].reshape(-1)
@@ -143,23 +161,33 @@ class Horses3DPlot:
 
         return
     
-    def plot3DIsoSurface(self, mesh, field, key, isovalue, cmap='jet'): 
-        self._validate_key(key)
+    @profiled('plot.isosurface')
+    def plot3DIsoSurface(self, mesh, field, key, isovalue, cmap='jet', resampler=None): 
+        import matplotlib.pyplot as plt
 
-        # Extract coordinates and field values
-        x, y, z = self._extract_coordinates(mesh)
+        self._validate_key(key)
         magnitude_index = self.magnitudes[key]
-        field_values = field[..., magnitude_index].reshape(-1)
 
-        # Create a smaller grid for interpolation to reduce memory usage
-        num_points = 50  # Adjust this number based on your memory constraints
-        xi = np.linspace(x.min(), x.max(), num_points)
-        yi = np.linspace(y.min(), y.max(), num_points)
-        zi = np.linspace(z.min(), z.max(), num_points)
-        X, Y, Z = np.meshgrid(xi, yi, zi)
+        if resampler is not None:
+            # Cached sparse operator (resampling.Horses3DResampler): one product per call
+            X, Y, Z = np.meshgrid(*resampler.axes, indexing='ij')
+            field_interp = resampler.resample(field[..., magnitude_index])
+        else:
+            from scipy.interpolate import griddata
+
+            # Extract coordinates and field values
+            x, y, z = self._extract_coordinates(mesh)
+            field_values = field[..., magnitude_index].reshape(-1)
 
-        # Interpolate field values onto the grid
-        field_interp = griddata((x, y, z), field_values, (X, Y, Z), method='linear')
+            # Create a smaller grid for interpolation to reduce memory usage
+            num_points = 50  # Adjust this number based on your memory constraints
+            xi = np.linspace(x.min(), x.max(), num_points)
+            yi = np.linspace(y.min(), y.max(), num_points)
+            zi = np.linspace(z.min(), z.max(), num_points)
+            X, Y, Z = np.meshgrid(xi, yi, zi)
+
+            # Interpolate field values onto the grid
+            field_interp = griddata((x, y, z), field_values, (X, Y, Z), method='linear')
 
         # Create a 3D plot with isosurfaces
         fig = plt.figure(figsize=(10, 7))
@@ -187,7 +215,8 @@ class Horses3DPlot:
         return
 
 
-    def plotResiduals(self, residuals_data):
+    @profiled('plot.residuals.parse')
+    def parseResiduals(self, residuals_data):
         # Initialize dictionaries to store data
         data = {}
         headers = None
@@ -211,6 +240,14 @@ class Horses3DPlot:
                     if value.strip():  # Check if value is not empty after stripping whitespace
                         data[header].append(float(value.strip()))
 
+        return headers, data
+
+    @profiled('plot.residuals')
+    def plotResiduals(self, residuals_data):
+        import matplotlib.pyplot as plt
+
+        headers, data = self.parseResiduals(residuals_data)
+
         # Plot residuals
         plt.figure(figsize=(8, 6))
 
@@ -0,0 +1,166 @@
+# polynomials.py
+
+"""
+One-dimensional nodal polynomial operators for Horses3D elements.
+
+Horses3D stores every element on a tensor product of Gauss or Gauss-Lobatto
+nodes. The operators here depend only on the number of nodes and the node
+type, so they are cached and shared by all elements and snapshots. Cached
+arrays are read-only.
+"""
+
+from functools import lru_cache
+import numpy as np
+
+GAUSS = 'gauss'
+GAUSS_LOBATTO = 'gauss-lobatto'
+
+# Node type codes found in the header of Horses3D files
+NODE_TYPES = {1: GAUSS, 2: GAUSS_LOBATTO}
+NODE_TYPE_CODES = {GAUSS: 1, GAUSS_LOBATTO: 2}
+
+def node_type(nodeType):
+    """
+    Normalize a node type given as a header code or a name.
+
+    Args:
+        nodeType (int or str): 1/'gauss' or 2/'gauss-lobatto'
+
+    Returns:
+        str: GAUSS or GAUSS_LOBATTO
+    """
+    if nodeType in NODE_TYPES:
+        return NODE_TYPES[nodeType]
+    if nodeType in (GAUSS, GAUSS_LOBATTO):
+        return nodeType
+    raise ValueError(f"Invalid node type. Please provide one of: {GAUSS}, {GAUSS_LOBATTO}.")
+
+def _readonly(array):
+    array.setflags(write=False)
+    return array
+
+@lru_cache(maxsize=None)
+def nodes_and_weights(n, nodeType=GAUSS):
+    """
+    Quadrature nodes and weights on [-1, 1].
+
+    Args:
+        n (int): Number of nodes (polynomial order + 1)
+        nodeType (str, optional): GAUSS or GAUSS_LOBATTO. Defaults to GAUSS.
+
+    Returns:
+        tuple: (nodes, weights) arrays of length n
+    """
+    nodeType = node_type(nodeType)
+    if nodeType == GAUSS or n == 1:
+        x, w = np.polynomial.legendre.leggauss(n)
+    else:
+        # Interior nodes are the roots of P'_{n-1}
+        P = np.polynomial.legendre.Legendre.basis(n - 1)
+        x = np.concatenate(([-1.0], np.sort(P.deriv().roots().real), [1.0]))
+        w = 2.0 / (n * (n - 1) * P(x)**2)
+    return _readonly(x), _readonly(w)
+
+@lru_cache(maxsize=None)
+def barycentric_weights(n, nodeType=GAUSS):
+    x, _ = nodes_and_weights(n, nodeType)
+    diff = x[:, None] - x[None, :]
+    np.fill_diagonal(diff, 1.0)
+    return _readonly(1.0 / diff.prod(axis=1))
+
+@lru_cache(maxsize=None)
+def derivative_matrix(n, nodeType=GAUSS):
+    """
+    Nodal differentiation matrix, D[i, j] = l_j'(x_i).
+
+    Args:
+        n (int): Number of nodes
+        nodeType (str, optional): GAUSS or GAUSS_LOBATTO. Defaults to GAUSS.
+
+    Returns:
+        numpy.ndarray: (n, n) matrix
+    """
+    x, _ = nodes_and_weights(n, nodeType)
+    wb = barycentric_weights(n, nodeType)
+    diff = x[:, None] - x[None, :]
+    np.fill_diagonal(diff, 1.0)
+    D = (wb[None, :] / wb[:, None]) / diff
+    np.fill_diagonal(D, 0.0)
+    np.fill_diagonal(D, -D.sum(axis=1))
+    return _readonly(D)
+
+@lru_cache(maxsize=None)
+def vandermonde_matrix(n, nodeType=GAUSS):
+    """
+    Vandermonde matrix of the orthonormal Legendre polynomials and its inverse.
+
+    V[i, k] = sqrt((2k+1)/2) P_k(x_i), so V maps modal to nodal values and
+    its inverse maps nodal values to modal coefficients.
+
+    Args:
+        n (int): Number of nodes
+        nodeType (str, optional): GAUSS or GAUSS_LOBATTO. Defaults to GAUSS.
+
+    Returns:
+        tuple: (V, Vinv), both (n, n)
+    """
+    x, _ = nodes_and_weights(n, nodeType)
+    V = np.polynomial.legendre.legvander(x, n - 1) * np.sqrt(np.arange(n) + 0.5)
+    return _readonly(V), _readonly(np.linalg.inv(V))
+
+def interpolation_matrix(xTarget, n, nodeType=GAUSS):
+    """
+    Lagrange interpolation matrix from the nodes to arbitrary points.
+
+    Args:
+        xTarget (array_like): Target points in [-1, 1]
+        n (int): Number of source nodes
+        nodeType (str, optional): GAUSS or GAUSS_LOBATTO. Defaults to GAUSS.
+
+    Returns:
+        numpy.ndarray: (len(xTarget), n) matrix with rows l_j(xTarget)
+    """
+    x, _ = nodes_and_weights(n, nodeType)
+    wb = barycentric_weights(n, nodeType)
+    xTarget = np.asarray(xTarget, dtype=np.float64)
+    diff = xTarget[..., None] - x
+    exact = np.isclose(diff, 0.0, rtol=0.0, atol=1e-14)
+    diff[exact] = 1.0
+    L = wb / diff
+    L /= L.sum(axis=-1, keepdims=True)
+    # Points that coincide with a node take that node's value exactly
+    hit = exact.any(axis=-1)
+    L[hit] = exact[hit]
+    return L
+
+@lru_cache(maxsize=None)
+def transfer_matrix(nFrom, nTo, nodeTypeFrom=GAUSS, nodeTypeTo=GAUSS, method='projection'):
+    """
+    Transfer matrix between two nodal bases of different size or node type.
+
+    'interpolation' evaluates the source polynomial at the target nodes.
+    'projection' is the L2 projection onto the target polynomials (exact
+    quadrature), which removes the discarded modes without aliasing them
+    when the order is reduced. Both are exact when the order is increased.
+
+    Args:
+        nFrom (int): Number of source nodes
+        nTo (int): Number of target nodes
+        nodeTypeFrom (str, optional): Source node type. Defaults to GAUSS.
+        nodeTypeTo (str, optional): Target node type. Defaults to GAUSS.
+        method (str, optional): 'projection' or 'interpolation'. Defaults to 'projection'.
+
+    Returns:
+        numpy.ndarray: (nTo, nFrom) matrix
+    """
+    nodeTypeFrom, nodeTypeTo = node_type(nodeTypeFrom), node_type(nodeTypeTo)
+    if method == 'interpolation':
+        T = interpolation_matrix(nodes_and_weights(nTo, nodeTypeTo)[0], nFrom, nodeTypeFrom)
+    elif method == 'projection':
+        xq, wq = nodes_and_weights(max(nFrom, nTo), GAUSS)
+        Lto = interpolation_matrix(xq, nTo, nodeTypeTo)
+        Lfrom = interpolation_matrix(xq, nFrom, nodeTypeFrom)
+        T = np.linalg.solve(Lto.T @ (wq[:, None] * Lto), Lto.T @ (wq[:, None] * Lfrom))
+    else:
+        raise ValueError("Invalid method. Please provide one of: projection, interpolation.")
+    return _readonly(T)
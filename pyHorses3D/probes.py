@@ -0,0 +1,315 @@
+# probes.py
+
+"""
+Batched point probes on high-order Horses3D meshes.
+
+Each probe is located once: candidate elements come from a KD-tree over
+element bounding-box centres, filtered by the boxes themselves, and every
+box is scanned for the probes that none of the nearest elements contains
+(e.g. in stretched meshes). The reference coordinates are found by a
+vectorized Newton inversion of the element mapping. The tensor-product Lagrange weights of every probe are then
+cached. Sampling a snapshot takes one gather of the owning elements and one
+small dense contraction.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+from .hsol import read_header
+from .polynomials import nodes_and_weights, interpolation_matrix, derivative_matrix, node_type
+from .solution import Horses3DSolution
+
+# Points per candidate element tested along a segment by Horses3DLine.crossedElements
+_CROSSING_SAMPLES = 16
+
+# Point-box pairs tested per batch by the full box scan of Horses3DProbes
+_SCAN_PAIRS = 2**24
+
+def _tensor_basis(L1, L2, L3):
+    return np.einsum('pi,pj,pk->pijk', L1, L2, L3).reshape(len(L1), -1)
+
+def bounding_boxes(mesh, nodeType='gauss'):
+    """
+    Axis-aligned bounding boxes of high-order elements.
+
+    Args:
+        mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+        nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+
+    Returns:
+        numpy.ndarray: (nElements, 2, 3) lower and upper corners
+    """
+    # Gauss nodes do not reach the element faces: pad the node box by the missing end intervals
+    nodeType = node_type(nodeType)
+    X = np.ascontiguousarray(mesh.reshape(mesh.shape[0], -1, 3).transpose(0, 2, 1))
+    lo, hi = X.min(axis=-1), X.max(axis=-1)
+    outer = min(nodes_and_weights(n, nodeType)[0][-1] for n in mesh.shape[1:4])
+    stretch = (1.0 - outer) / (2.0 * outer) if outer > 0 else 1.0
+    # Per direction, so the boxes of stretched elements stay tight across their thin directions
+    pad = (stretch + 0.01) * (hi - lo)
+    return np.stack((lo - pad, hi + pad), axis=1)
+
+class Horses3DProbes:
+    """
+    Point probes with cached element location and interpolation weights.
+
+    Attributes:
+        points (numpy.ndarray): Probe coordinates, shape (nProbes, 3)
+        elements (numpy.ndarray): Element that contains each probe (-1 if not found)
+        reference (numpy.ndarray): Reference coordinates of each probe in its element
+        weights (numpy.ndarray): Lagrange weights, shape (nProbes, N1*N2*N3)
+        found (numpy.ndarray): Boolean mask of probes located inside the mesh
+    """
+    def __init__(self, mesh, points, nodeType='gauss', candidates=8, tolerance=1e-8, maxIterations=20, boxes=None):
+        """
+        Locate the probes in the mesh.
+
+        Args:
+            mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+            points (array_like): Probe coordinates, shape (nProbes, 3)
+            nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+            candidates (int, optional): Nearest elements tried first per probe; probes not
+                                        found in them are tested against every element
+                                        whose bounding box contains them. Defaults to 8.
+            tolerance (float, optional): Reference-space tolerance of the inversion
+                                         and of the inside test. Defaults to 1e-8.
+            maxIterations (int, optional): Newton iterations per candidate. Defaults to 20.
+            boxes (numpy.ndarray, optional): Precomputed element bounding boxes, e.g. from
+                                             Horses3DSharedMesh. Computed if not given.
+        """
+        self.mesh = mesh
+        self.nodeType = node_type(nodeType)
+        self.shape = mesh.shape[:4]
+        self.points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        self.tolerance = tolerance
+        self.maxIterations = maxIterations
+
+        self._D = [derivative_matrix(n, self.nodeType) for n in self.shape[1:]]
+        self.boxes = bounding_boxes(mesh, self.nodeType) if boxes is None else boxes
+        self._tree = cKDTree(0.5 * (self.boxes[:, 0] + self.boxes[:, 1]))
+
+        nProbes = len(self.points)
+        self.elements = np.full(nProbes, -1, dtype=np.int64)
+        self.reference = np.zeros((nProbes, 3))
+        self._locate(min(candidates, self.shape[0]))
+        self.found = self.elements >= 0
+
+        L = [interpolation_matrix(self.reference[:, d], n, self.nodeType) for d, n in enumerate(self.shape[1:])]
+        self.weights = _tensor_basis(*L)
+
+    def _map(self, elements, xi):
+        """Physical coordinates and Jacobian of the element mapping at reference points."""
+        n = self.shape[1:]
+        L = [interpolation_matrix(xi[:, d], n[d], self.nodeType) for d in range(3)]
+        dL = [L[d] @ self._D[d] for d in range(3)]
+        X = self.mesh[elements]
+        x = np.einsum('pi,pj,pk,pijkd->pd', L[0], L[1], L[2], X, optimize=True)
+        J = np.stack((np.einsum('pi,pj,pk,pijkd->pd', dL[0], L[1], L[2], X, optimize=True),
+                      np.einsum('pi,pj,pk,pijkd->pd', L[0], dL[1], L[2], X, optimize=True),
+                      np.einsum('pi,pj,pk,pijkd->pd', L[0], L[1], dL[2], X, optimize=True)), axis=-1)
+        return x, J
+
+    def _invert(self, elements, points):
+        """Vectorized Newton inversion x(xi) = point. Returns xi and an inside/converged mask."""
+        xi = np.zeros((len(points), 3))
+        converged = np.zeros(len(points), dtype=bool)
+        for _ in range(self.maxIterations):
+            active = ~converged
+            if not active.any():
+                break
+            x, J = self._map(elements[active], xi[active])
+            step = np.linalg.solve(J, (points[active] - x)[..., np.newaxis])[..., 0]
+            xi[active] = np.clip(xi[active] + step, -1.5, 1.5)
+            converged[np.nonzero(active)[0][np.abs(step).max(axis=1) < self.tolerance]] = True
+        inside = converged & (np.abs(xi).max(axis=1) <= 1.0 + 1e-6)
+        return xi, inside
+
+    def _locate(self, candidates):
+        _, nearest = self._tree.query(self.points, k=candidates)
+        nearest = nearest.reshape(len(self.points), -1)
+
+        pending = np.arange(len(self.points))
+        for c in range(nearest.shape[1]):
+            if pending.size == 0:
+                break
+            elements = nearest[pending, c]
+            box = self.boxes[elements]
+            p = self.points[pending]
+            inBox = np.all((p >= box[:, 0]) & (p <= box[:, 1]), axis=1)
+
+            tried = pending[inBox]
+            if tried.size:
+                xi, inside = self._invert(elements[inBox], self.points[tried])
+                self.elements[tried[inside]] = elements[inBox][inside]
+                self.reference[tried[inside]] = xi[inside]
+            pending = pending[self.elements[pending] < 0]
+
+        # The containing element is not always among the nearest centres: scan every box
+        batch = max(1, _SCAN_PAIRS // len(self.boxes))
+        for start in range(0, pending.size, batch):
+            probes = pending[start:start + batch]
+            p = self.points[probes, np.newaxis]
+            inBox = np.all((p >= self.boxes[:, 0]) & (p <= self.boxes[:, 1]), axis=-1)
+            row, elements = np.nonzero(inBox)
+            untried = ~(nearest[probes[row]] == elements[:, np.newaxis]).any(axis=1)
+            row, elements = row[untried], elements[untried]
+            if row.size == 0:
+                continue
+            xi, inside = self._invert(elements, self.points[probes[row]])
+            # First containing element of each probe
+            hits = np.flatnonzero(inside)
+            hits = hits[np.unique(row[hits], return_index=True)[1]]
+            self.elements[probes[row[hits]]] = elements[hits]
+            self.reference[probes[row[hits]]] = xi[hits]
+
+    def evaluate(self, field):
+        """
+        Interpolate a nodal field at the probes.
+
+        Args:
+            field (numpy.ndarray): Field of shape (nElements, N1, N2, N3, ...)
+
+        Returns:
+            numpy.ndarray: Values of shape (nProbes, ...). Probes outside the mesh are NaN.
+        """
+        if field.shape[:4] != self.shape:
+            raise ValueError(f"Field shape {field.shape[:4]} does not match the mesh {self.shape}")
+
+        gathered = field[np.where(self.found, self.elements, 0)]
+        gathered = gathered.reshape(len(self.points), self.weights.shape[1], *field.shape[4:])
+        values = np.einsum('pn,pn...->p...', self.weights, gathered, optimize=True)
+        values[~self.found] = np.nan
+        return values
+
+    def history(self, solutionFiles, variables=('rho', 'rhou', 'rhov', 'rhow', 'rhoe')):
+        """
+        Probe time histories over a series of solution files.
+
+        Args:
+            solutionFiles (list): Solution files in time order
+            variables (tuple, optional): Conserved or derived quantities to sample
+
+        Returns:
+            dict: 'time', 'iteration' and 'values' of shape (nTimes, nProbes, nVariables)
+        """
+        times, iterations, values = [], [], []
+        for solutionFile in solutionFiles:
+            header = read_header(solutionFile)
+            snapshot = Horses3DSolution()
+            snapshot.loadSingleSolution(solutionFile)
+            snapshot.computeQuantities(0, variables)
+            columns = [snapshot.magnitudes[name] for name in variables]
+            times.append(header['time'])
+            iterations.append(header['iteration'])
+            values.append(self.evaluate(snapshot.solution[0])[:, columns])
+
+        return {'time': np.asarray(times), 'iteration': np.asarray(iterations), 'values': np.asarray(values)}
+
+class Horses3DLine(Horses3DProbes):
+    """
+    Samples along a line or polyline, for wake and boundary-layer profiles.
+
+    The samples are spread uniformly in arc length and located once, so
+    extracting profiles of any variable over a whole time series reuses the
+    same element lookup and interpolation weights.
+
+    Attributes:
+        vertices (numpy.ndarray): Polyline vertices, shape (nVertices, 3)
+        distance (numpy.ndarray): Arc length of each sample from the first vertex
+    """
+    def __init__(self, mesh, vertices, nSamples, nodeType='gauss', **kwargs):
+        """
+        Place and locate the samples of a polyline.
+
+        Args:
+            mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+            vertices (array_like): Polyline vertices, shape (nVertices, 3). Two
+                                   vertices define a straight line.
+            nSamples (int): Number of samples, including both end points
+            nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+            **kwargs: Location options passed to Horses3DProbes
+        """
+        self.vertices = np.atleast_2d(np.asarray(vertices, dtype=np.float64))
+        if len(self.vertices) < 2:
+            raise ValueError("A line needs at least two vertices")
+
+        segments = np.diff(self.vertices, axis=0)
+        cumulative = np.concatenate(([0.0], np.cumsum(np.linalg.norm(segments, axis=1))))
+        self.distance = np.linspace(0.0, cumulative[-1], nSamples)
+        self._cumulative = cumulative
+        self._crossed = None
+
+        # Segment of each sample and its position along that segment
+        segment = np.clip(np.searchsorted(cumulative, self.distance, side='right') - 1, 0, len(segments) - 1)
+        length = cumulative[segment + 1] - cumulative[segment]
+        t = np.divide(self.distance - cumulative[segment], length, out=np.zeros_like(length), where=length > 0)
+        points = self.vertices[segment] + t[:, np.newaxis] * segments[segment]
+
+        super().__init__(mesh, points, nodeType, **kwargs)
+
+    @property
+    def crossedElements(self):
+        """
+        Elements crossed by the polyline, in the order they are traversed.
+
+        Each segment is clipped against every element bounding box (slab test),
+        and the part of the segment inside a box is tested against the mapped
+        element at a number of points. The result does not depend on nSamples;
+        an element is only missed if the polyline cuts through less than about
+        1/16 of the extent of its bounding box.
+        """
+        if self._crossed is None:
+            self._crossed = self._crossed_elements()
+        return self._crossed
+
+    def _crossed_elements(self):
+        # Elements containing samples are crossed for certain
+        elements = [self.elements[self.found]]
+        distances = [self.distance[self.found]]
+
+        lower, upper = self.boxes[:, 0], self.boxes[:, 1]
+        fractions = (np.arange(_CROSSING_SAMPLES) + 0.5) / _CROSSING_SAMPLES
+        for s, (a, b) in enumerate(zip(self.vertices[:-1], self.vertices[1:])):
+            d = b - a
+            # Slab test: parameter interval of the segment inside every box
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t1, t2 = (lower - a) / d, (upper - a) / d
+            parallel = d == 0
+            inSlab = (lower <= a) & (a <= upper)
+            # Parallel to a slab: (-inf, inf) inside it, no constraint; (inf, inf) outside it,
+            # so that the box is entered after it is left and never crossed
+            t1 = np.where(parallel & inSlab, -np.inf, np.where(parallel, np.inf, t1))
+            t2 = np.where(parallel, np.inf, t2)
+            enter = np.maximum(np.minimum(t1, t2).max(axis=1), 0.0)
+            leave = np.minimum(np.maximum(t1, t2).min(axis=1), 1.0)
+            candidates = np.flatnonzero(enter <= leave)
+            if candidates.size == 0:
+                continue
+
+            # Refine on the mapped elements at points spread over each clipped interval
+            t = enter[candidates, np.newaxis] + fractions * (leave - enter)[candidates, np.newaxis]
+            owners = np.repeat(candidates, _CROSSING_SAMPLES)
+            _, inside = self._invert(owners, a + t.reshape(-1, 1) * d)
+            inside = inside.reshape(len(candidates), _CROSSING_SAMPLES)
+            hit = inside.any(axis=1)
+            first = t[hit, inside[hit].argmax(axis=1)]
+            elements.append(candidates[hit])
+            distances.append(self._cumulative[s] + first * (self._cumulative[s + 1] - self._cumulative[s]))
+
+        elements = np.concatenate(elements)
+        distances = np.concatenate(distances)
+        order = np.argsort(distances, kind='stable')
+        elements = elements[order]
+        first = np.unique(elements, return_index=True)[1]
+        return elements[np.sort(first)]
+
+    def profile(self, field):
+        """
+        Extract a profile of a nodal field along the line.
+
+        Args:
+            field (numpy.ndarray): Field of shape (nElements, N1, N2, N3, ...)
+
+        Returns:
+            tuple: (distance, values) with values of shape (nSamples, ...)
+        """
+        return self.distance, self.evaluate(field)
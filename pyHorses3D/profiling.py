@@ -0,0 +1,187 @@
+# profiling.py
+
+"""
+Lightweight instrumentation for the pyHorses3D pipeline.
+
+Stages of the pipeline (file reads, derived quantities, plotting, solver
+runs) are wrapped in named timers that also count bytes read and elements
+processed. A single module-level Profiler collects them. While it is
+disabled, which is the default, a stage costs one attribute check. Summaries
+can be exported as JSON and the individual stage events as a Chrome trace
+(chrome://tracing or Perfetto).
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'bytes', 'elements', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.bytes = 0
+        self.elements = 0
+
+    def add(self, bytes=0, elements=0):
+        self.bytes += bytes
+        self.elements += elements
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.name, self.start, time.perf_counter(), self.bytes, self.elements)
+
+class _NullStage:
+    __slots__ = ()
+
+    def add(self, bytes=0, elements=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class Profiler:
+    """
+    Collector of per-stage timers and counters.
+
+    Attributes:
+        enabled (bool): Whether stages are recorded
+        stages (dict): Per-stage totals: calls, seconds, bytes and elements
+        events (list): Individual stage events kept for the Chrome trace
+        maxEvents (int): Maximum number of events kept
+    """
+    def __init__(self, maxEvents=100000):
+        self.enabled = False
+        self.maxEvents = maxEvents
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.stages = {}
+        self.events = []
+        self._origin = time.perf_counter()
+
+    def stage(self, name):
+        """
+        Time a block of code.
+
+        Usage::
+
+            with profiler.stage('solution.read') as stage:
+                ...
+                stage.add(bytes=nbytes, elements=nElements)
+
+        Args:
+            name (str): Stage name, dotted by component (e.g. 'mesh.read')
+
+        Returns:
+            A context manager whose ``add`` method counts bytes and elements
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def _record(self, name, start, end, nbytes, elements):
+        with self._lock:
+            totals = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'bytes': 0, 'elements': 0})
+            totals['calls'] += 1
+            totals['seconds'] += end - start
+            totals['bytes'] += nbytes
+            totals['elements'] += elements
+            if len(self.events) < self.maxEvents:
+                self.events.append((name, start, end, nbytes, elements, threading.get_ident()))
+
+    def summary(self):
+        """
+        Returns:
+            dict: Per-stage totals with derived throughput (MB/s, elements/s)
+        """
+        result = {}
+        for name, totals in sorted(self.stages.items()):
+            entry = dict(totals)
+            seconds = totals['seconds']
+            entry['megabytesPerSecond'] = totals['bytes'] / 1e6 / seconds if totals['bytes'] and seconds else None
+            entry['elementsPerSecond'] = totals['elements'] / seconds if totals['elements'] and seconds else None
+            result[name] = entry
+        return result
+
+    def saveSummary(self, filepath):
+        """
+        Write the stage summary as JSON.
+
+        Args:
+            filepath (str): Path of the JSON file
+        """
+        with open(filepath, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+        return filepath
+
+    def saveChromeTrace(self, filepath):
+        """
+        Write the recorded stage events in the Chrome trace event format.
+
+        Args:
+            filepath (str): Path of the JSON trace file
+        """
+        pid = os.getpid()
+        events = [{
+            'name': name,
+            'cat': name.split('.')[0],
+            'ph': 'X',
+            'ts': (start - self._origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': pid,
+            'tid': tid,
+            'args': {'bytes': nbytes, 'elements': elements},
+        } for name, start, end, nbytes, elements, tid in self.events]
+
+        with open(filepath, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        return filepath
+
+    def printSummary(self):
+        """
+        Print a table of the stage totals.
+        """
+        print(f"  {'stage':<32}{'calls':>8}{'time (s)':>12}{'MB/s':>10}{'elements/s':>14}")
+        for name, entry in self.summary().items():
+            mbs = f"{entry['megabytesPerSecond']:.1f}" if entry['megabytesPerSecond'] else '-'
+            eps = f"{entry['elementsPerSecond']:.3g}" if entry['elementsPerSecond'] else '-'
+            print(f"  {name:<32}{entry['calls']:>8}{entry['seconds']:>12.4f}{mbs:>10}{eps:>14}")
+
+# Shared by all pyHorses3D components
+profiler = Profiler()
+
+def profiled(name):
+    """
+    Decorator that times every call of a function as a profiler stage.
+
+    Args:
+        name (str): Stage name
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            with profiler.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,62 @@
+# region.py
+
+"""
+Region-of-interest selection of mesh elements.
+
+The bounding box of every element is computed once per mesh file, or read
+alone from its geometry store when there is one (Horses3DGeometry), and
+cached, so selecting the elements that overlap a region is a vectorized
+comparison of boxes. Together with hsol.read_elements this lets a solution
+be loaded for a region only, e.g. a wake that holds a few percent of the
+elements, with I/O and memory proportional to the region.
+"""
+
+import os
+from functools import lru_cache
+import numpy as np
+from .hsol import read_header, read_elements
+from .geometry import Horses3DGeometry
+from .probes import bounding_boxes
+
+@lru_cache(maxsize=16)
+def _element_boxes(meshFile, size, mtime):
+    boxes = Horses3DGeometry.storedField(meshFile, 'boxes')
+    if boxes is None:
+        mesh = read_elements(meshFile)[0].transpose(0, 2, 3, 4, 1)
+        boxes = bounding_boxes(mesh, read_header(meshFile)['nodeType'])
+    boxes.setflags(write=False)
+    return boxes
+
+def element_boxes(meshFile):
+    """
+    Bounding boxes of the elements of a mesh file, cached per file.
+
+    Args:
+        meshFile (str): Path to the .hmesh file
+
+    Returns:
+        numpy.ndarray: Read-only (nElements, 2, 3) lower and upper corners
+    """
+    stat = os.stat(meshFile)
+    return _element_boxes(os.path.abspath(meshFile), stat.st_size, stat.st_mtime_ns)
+
+def elements_in_region(mesh, region):
+    """
+    Elements whose bounding box overlaps an axis-aligned region.
+
+    Args:
+        mesh (str or numpy.ndarray): Path to the .hmesh file, or element bounding boxes
+                                     of shape (nElements, 2, 3)
+        region (array_like): Lower and upper corners ((xmin, ymin, zmin), (xmax, ymax, zmax)).
+                             Use -inf/inf to leave a direction unbounded.
+
+    Returns:
+        numpy.ndarray: Sorted element indices
+    """
+    boxes = element_boxes(mesh) if isinstance(mesh, (str, os.PathLike)) else np.asarray(mesh)
+    lower, upper = np.asarray(region, dtype=np.float64).reshape(2, 3)
+    if (lower > upper).any():
+        raise ValueError("The lower corner of the region must not exceed the upper corner")
+
+    overlap = (boxes[:, 0] <= upper) & (boxes[:, 1] >= lower)
+    return np.flatnonzero(overlap.all(axis=1))
@@ -0,0 +1,94 @@
+# reinterpolation.py
+
+"""
+p-reinterpolation of Horses3D solutions between polynomial orders.
+
+A nodal field is moved to another order (and optionally another node
+family) one direction at a time, with cached 1D transfer matrices from
+the polynomials module. Each direction is a single contraction over all
+elements, so the cost is a few batched matrix products per snapshot. With
+Horses3DSolution.saveSolution the result can be written back as a restart
+file for p-continuation runs.
+"""
+
+import numpy as np
+from .polynomials import transfer_matrix, node_type, NODE_TYPE_CODES
+from .solution import Horses3DSolution
+
+def _nodes(order):
+    order = np.broadcast_to(np.asarray(order, dtype=int), (3,))
+    return tuple(int(p) + 1 for p in order)
+
+def reinterpolate(field, order, nodeType='gauss', targetNodeType=None, method='projection'):
+    """
+    Move a nodal field to another polynomial order.
+
+    Args:
+        field (numpy.ndarray): Field of shape (nElements, N1, N2, N3, ...)
+        order (int or tuple): Target polynomial order, one value or one per direction
+        nodeType (int or str, optional): Node family of the field. Defaults to 'gauss'.
+        targetNodeType (int or str, optional): Node family of the result. Defaults to nodeType.
+        method (str, optional): 'projection' (L2, no aliasing when reducing the order)
+                                or 'interpolation'. Defaults to 'projection'.
+
+    Returns:
+        numpy.ndarray: Field of shape (nElements, P1+1, P2+1, P3+1, ...)
+    """
+    nodeType = node_type(nodeType)
+    targetNodeType = nodeType if targetNodeType is None else node_type(targetNodeType)
+    nodes = _nodes(order)
+
+    T = [transfer_matrix(n, m, nodeType, targetNodeType, method) for n, m in zip(field.shape[1:4], nodes)]
+    return np.einsum('ai,bj,ck,eijk...->eabc...', T[0], T[1], T[2], field, optimize=True)
+
+def reinterpolate_solution(solution, idx, order, nodeType=None, targetNodeType=None, method='projection'):
+    """
+    Reinterpolate one snapshot of a Horses3DSolution in place.
+
+    Conserved and derived quantities are transferred, and so are the stored
+    gradients. The node type of the snapshot header is updated.
+
+    Args:
+        solution (Horses3DSolution): Loaded solutions
+        idx (int): Index of the snapshot
+        order (int or tuple): Target polynomial order
+        nodeType (int or str, optional): Node family of the snapshot. Defaults to the
+                                         one in its header, or 'gauss'.
+        targetNodeType (int or str, optional): Node family of the result. Defaults to nodeType.
+        method (str, optional): 'projection' or 'interpolation'. Defaults to 'projection'.
+
+    Returns:
+        Horses3DSolution: The same object
+    """
+    header = solution.headers[idx] if idx < len(solution.headers) else None
+    if nodeType is None:
+        nodeType = header['nodeType'] if header is not None else 'gauss'
+    nodeType = node_type(nodeType)
+    targetNodeType = nodeType if targetNodeType is None else node_type(targetNodeType)
+
+    solution.solution[idx] = reinterpolate(solution.solution[idx], order, nodeType, targetNodeType, method)
+    if idx < len(solution.gradients) and solution.gradients[idx] is not None:
+        solution.gradients[idx] = reinterpolate(solution.gradients[idx], order, nodeType, targetNodeType, method)
+    if header is not None:
+        header['nodeType'] = NODE_TYPE_CODES[targetNodeType]
+    return solution
+
+def reinterpolate_file(solutionFile, outputFile, order, targetNodeType=None, method='projection'):
+    """
+    Write a solution file at another polynomial order, e.g. to restart a
+    run at a higher order.
+
+    Args:
+        solutionFile (str): Source .hsol file
+        outputFile (str): Path of the reinterpolated .hsol file
+        order (int or tuple): Target polynomial order
+        targetNodeType (int or str, optional): Node family of the result. Defaults to the source one.
+        method (str, optional): 'projection' or 'interpolation'. Defaults to 'projection'.
+
+    Returns:
+        str: The path of the written file
+    """
+    solution = Horses3DSolution()
+    solution.loadSingleSolution(solutionFile)
+    reinterpolate_solution(solution, 0, order, targetNodeType=targetNodeType, method=method)
+    return solution.saveSolution(0, outputFile)
@@ -0,0 +1,238 @@
+# resampling.py
+
+"""
+Resampling of nodal fields onto uniform Cartesian grids, and energy spectra.
+
+Every grid point is located once in its element and interpolated with the
+tensor-product Lagrange basis of that element, which makes resampling a
+linear map from the element nodes to the grid. The map is stored as a sparse
+matrix with N1*N2*N3 entries per grid point, built once per mesh and grid and
+cached on disk next to the mesh file. Resampling a snapshot is then a single
+sparse product, and a kinetic-energy spectrum adds one FFT and a shell
+average.
+"""
+
+import hashlib
+import os
+import numpy as np
+from scipy import sparse
+from .hsol import read_header, read_elements
+from .polynomials import interpolation_matrix, node_type
+from .probes import Horses3DProbes, bounding_boxes
+
+# Grid points located per batch while building the operator
+_BATCH_POINTS = 2**16
+
+def mesh_extent(mesh, nodeType='gauss'):
+    """
+    Lower and upper corners of the domain covered by a high-order mesh.
+
+    The element mapping is evaluated at the reference corners, since Gauss
+    nodes do not reach the element faces.
+
+    Args:
+        mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+        nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+
+    Returns:
+        numpy.ndarray: (2, 3) lower and upper corners
+    """
+    nodeType = node_type(nodeType)
+    L = [interpolation_matrix([-1.0, 1.0], n, nodeType) for n in mesh.shape[1:4]]
+    corners = np.einsum('ai,bj,ck,eijkd->eabcd', *L, mesh, optimize=True).reshape(-1, 3)
+    return np.stack((corners.min(axis=0), corners.max(axis=0)))
+
+class Horses3DResampler:
+    """
+    Sparse operator from the element nodes to a uniform Cartesian grid.
+
+    The grid has n[d] cell-centred points per direction, x_i = lo + (i + 1/2) h,
+    which suits FFTs of periodic fields.
+
+    Attributes:
+        shape (tuple): Grid points per direction
+        bounds (numpy.ndarray): (2, 3) lower and upper corners of the grid box
+        axes (list): Coordinates of the grid points in each direction
+        operator (scipy.sparse.csr_matrix): (nPoints, nElements*N1*N2*N3) resampling matrix
+        found (numpy.ndarray): Grid points located inside the mesh, shape `shape`
+        meshShape (tuple): (nElements, N1, N2, N3) of the mesh the operator applies to
+    """
+    def __init__(self, operator, found, bounds, meshShape):
+        self.operator = operator
+        self.found = found
+        self.shape = found.shape
+        self.bounds = np.asarray(bounds, dtype=np.float64)
+        self.meshShape = tuple(int(n) for n in meshShape)
+        h = (self.bounds[1] - self.bounds[0]) / np.array(self.shape)
+        self.axes = [self.bounds[0, d] + (np.arange(n) + 0.5) * h[d] for d, n in enumerate(self.shape)]
+
+    @classmethod
+    def build(cls, mesh, n, nodeType='gauss', bounds=None, boxes=None):
+        """
+        Locate the grid points in the mesh and assemble the operator.
+
+        Args:
+            mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+            n (int or tuple): Grid points, one value or one per direction
+            nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+            bounds (array_like, optional): (2, 3) corners of the grid box. Defaults to the
+                                           extent of the mesh.
+            boxes (numpy.ndarray, optional): Element bounding boxes, e.g. Horses3DGeometry.boxes.
+                                             Computed if not given.
+
+        Returns:
+            Horses3DResampler: The resampler
+        """
+        nodeType = node_type(nodeType)
+        shape = tuple(int(m) for m in np.broadcast_to(n, (3,)))
+        bounds = mesh_extent(mesh, nodeType) if bounds is None else np.asarray(bounds, dtype=np.float64)
+        h = (bounds[1] - bounds[0]) / np.array(shape)
+        axes = [bounds[0, d] + (np.arange(m) + 0.5) * h[d] for d, m in enumerate(shape)]
+        points = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+
+        nNodes = int(np.prod(mesh.shape[1:4]))
+        boxes = bounding_boxes(mesh, nodeType) if boxes is None else boxes
+        rows, columns, values = [], [], []
+        found = np.zeros(len(points), dtype=bool)
+        for start in range(0, len(points), _BATCH_POINTS):
+            probes = Horses3DProbes(mesh, points[start:start + _BATCH_POINTS], nodeType, boxes=boxes)
+            located = np.flatnonzero(probes.found)
+            found[start + located] = True
+            rows.append(np.repeat(start + located, nNodes))
+            columns.append((probes.elements[located, np.newaxis] * nNodes + np.arange(nNodes)).ravel())
+            values.append(probes.weights[located].ravel())
+
+        operator = sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                     shape=(len(points), mesh.shape[0] * nNodes))
+        return cls(operator, found.reshape(shape), bounds, mesh.shape[:4])
+
+    @classmethod
+    def fromFile(cls, meshFile, n, bounds=None, cache=True):
+        """
+        Resampler of a mesh file, cached on disk next to it.
+
+        The cache file is keyed by the mesh file (size and modification time),
+        the grid and the bounds, so it is rebuilt whenever any of them changes.
+
+        Args:
+            meshFile (str): Path to the .hmesh file
+            n (int or tuple): Grid points, one value or one per direction
+            bounds (array_like, optional): (2, 3) corners of the grid box. Defaults to the mesh extent.
+            cache (bool, optional): Read and write the on-disk cache. Defaults to True.
+
+        Returns:
+            Horses3DResampler: The resampler
+        """
+        shape = tuple(int(m) for m in np.broadcast_to(n, (3,)))
+        cacheFile = cls.cachePath(meshFile, shape, bounds)
+        if cache and os.path.exists(cacheFile):
+            return cls.load(cacheFile)
+
+        from .geometry import Horses3DGeometry
+        mesh = read_elements(meshFile)[0].transpose(0, 2, 3, 4, 1)
+        # Boxes of an existing geometry store, else computed from the mesh read here
+        resampler = cls.build(mesh, shape, read_header(meshFile)['nodeType'], bounds,
+                              Horses3DGeometry.storedField(meshFile, 'boxes'))
+        if cache:
+            resampler.save(cacheFile)
+        return resampler
+
+    @staticmethod
+    def cachePath(meshFile, shape, bounds=None):
+        """Path of the on-disk cache of a mesh file and grid."""
+        stat = os.stat(meshFile)
+        key = repr((stat.st_size, stat.st_mtime_ns, tuple(shape),
+                    None if bounds is None else np.asarray(bounds, dtype=np.float64).tolist()))
+        digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+        directory, name = os.path.split(os.path.abspath(meshFile))
+        return os.path.join(directory, f".{name}.resample_{'x'.join(map(str, shape))}_{digest}.npz")
+
+    def save(self, fname):
+        """
+        Write the operator as an .npz file.
+
+        Args:
+            fname (str): Path of the file
+        """
+        # Written under a temporary name, so concurrent readers never see a partial file
+        temporary = f"{fname}.{os.getpid()}.tmp.npz"
+        np.savez(temporary, data=self.operator.data, indices=self.operator.indices, indptr=self.operator.indptr,
+                 operatorShape=self.operator.shape, found=self.found, bounds=self.bounds, meshShape=self.meshShape)
+        os.replace(temporary, fname)
+
+    @classmethod
+    def load(cls, fname):
+        """
+        Read an operator written by :meth:`save`.
+
+        Args:
+            fname (str): Path of the file
+
+        Returns:
+            Horses3DResampler: The resampler
+        """
+        with np.load(fname) as data:
+            operator = sparse.csr_matrix((data['data'], data['indices'], data['indptr']),
+                                         shape=tuple(data['operatorShape']))
+            return cls(operator, data['found'], data['bounds'], data['meshShape'])
+
+    def resample(self, field):
+        """
+        Resample a nodal field onto the grid.
+
+        Args:
+            field (numpy.ndarray): Field of shape (nElements, N1, N2, N3, ...)
+
+        Returns:
+            numpy.ndarray: Values of shape (n1, n2, n3, ...). Points outside the mesh are NaN.
+        """
+        if field.shape[:4] != self.meshShape:
+            raise ValueError(f"Field shape {field.shape[:4]} does not match the mesh {self.meshShape}")
+
+        values = self.operator @ field.reshape(self.operator.shape[1], -1)
+        values[~self.found.ravel()] = np.nan
+        return values.reshape(*self.shape, *field.shape[4:])
+
+    def energySpectrum(self, velocity, lengths=None):
+        """
+        Kinetic-energy spectrum E(k) of a nodal velocity field (see :func:`energy_spectrum`).
+
+        Args:
+            velocity (numpy.ndarray): Velocity of shape (nElements, N1, N2, N3, 3)
+            lengths (array_like, optional): Period of the field in each direction.
+                                            Defaults to the size of the grid box.
+
+        Returns:
+            tuple: (k, E)
+        """
+        lengths = self.bounds[1] - self.bounds[0] if lengths is None else lengths
+        return energy_spectrum(self.resample(velocity), lengths)
+
+def energy_spectrum(velocity, lengths=2*np.pi):
+    """
+    Shell-averaged kinetic-energy spectrum of a periodic velocity on a uniform grid.
+
+    E(k) sums 1/2 |u_hat|^2 over the wavenumber shells k - dk/2 <= |k| < k + dk/2
+    and divides by the shell width dk, the fundamental wavenumber 2 pi / L of the
+    longest direction. The sum of E dk is then the mean kinetic energy 1/2 <u.u>.
+
+    Args:
+        velocity (numpy.ndarray): Velocity of shape (n1, n2, n3, 3)
+        lengths (float or array_like, optional): Period in each direction. Defaults to 2 pi.
+
+    Returns:
+        tuple: (k, E), wavenumbers of the shells and their energy
+    """
+    if np.isnan(velocity).any():
+        raise ValueError("The velocity has points outside the mesh; resample within its bounds")
+
+    shape = velocity.shape[:3]
+    lengths = np.broadcast_to(np.asarray(lengths, dtype=np.float64), (3,))
+    uHat = np.fft.fftn(velocity, axes=(0, 1, 2)) / np.prod(shape)
+    density = 0.5 * (np.abs(uHat)**2).sum(axis=-1)
+
+    waves = np.meshgrid(*[2*np.pi * np.fft.fftfreq(n, d=L/n) for n, L in zip(shape, lengths)], indexing='ij')
+    dk = 2*np.pi / lengths.max()
+    shell = np.rint(np.sqrt(sum(k**2 for k in waves)) / dk).astype(np.int64)
+    E = np.bincount(shell.ravel(), weights=density.ravel())
+    return dk * np.arange(len(E)), E / dk
@@ -0,0 +1,232 @@
+# resources.py
+
+"""
+Resource accounting of a running solver from /proc.
+
+A background thread samples the process tree of the solver (the process
+started by runHorses3D and all its descendants, e.g. MPI ranks) at a fixed
+interval. Each sample reads /proc/<pid>/stat and /proc/<pid>/io, a few
+hundred bytes per process, so sampling costs well under a millisecond. The
+samples give CPU utilization in cores, the resident set size of the tree and
+its storage reads and writes, and are summarized at the end of the run for
+capacity planning, e.g. how many concurrent jobs fit on a node.
+
+Counters are kept per process and the totals add the last value seen for
+every process, so processes that exit during the run still count. A process
+that starts and exits between two samples is not seen. /proc is Linux-only;
+elsewhere the sampler records nothing.
+"""
+
+import os
+import threading
+import time
+import numpy as np
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def available():
+    """Whether process accounting through /proc is available."""
+    return os.path.isdir('/proc/self/task')
+
+def _read_stat(pid):
+    # (ppid, start time, CPU seconds, RSS bytes); the command name may contain spaces and parentheses
+    with open(f'/proc/{pid}/stat', 'rb') as file:
+        fields = file.read().rsplit(b')', 1)[1].split()
+    return int(fields[1]), int(fields[19]), (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS, int(fields[21]) * _PAGE_SIZE
+
+def _read_io(pid):
+    # (read bytes, write bytes) reaching the storage layer
+    counters = {}
+    try:
+        with open(f'/proc/{pid}/io', 'rb') as file:
+            for line in file:
+                key, _, value = line.partition(b':')
+                counters[key] = int(value)
+    except (PermissionError, FileNotFoundError, ProcessLookupError):
+        return 0, 0
+    return counters.get(b'read_bytes', 0), counters.get(b'write_bytes', 0)
+
+def process_tree(pid):
+    """
+    A process and all its descendants.
+
+    Args:
+        pid (int): Root process
+
+    Returns:
+        list: Process ids, the root first
+    """
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        try:
+            tasks = os.listdir(f'/proc/{current}/task')
+        except FileNotFoundError:
+            continue
+        for task in tasks:
+            try:
+                with open(f'/proc/{current}/task/{task}/children') as file:
+                    pending.extend(int(child) for child in file.read().split())
+            except FileNotFoundError:
+                # Task exited meanwhile, or a kernel without the children file
+                continue
+    if len(tree) == 1 and not os.path.exists(f'/proc/{pid}/task/{pid}/children'):
+        tree = _scan_tree(pid)
+    return tree
+
+def _scan_tree(pid):
+    # Fallback: parent links of every process
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                children.setdefault(_read_stat(entry)[0], []).append(int(entry))
+            except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+                continue
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+class Horses3DResourceSampler:
+    """
+    Samples the CPU, memory and I/O of a process tree in a background thread.
+
+    Attributes:
+        pid (int): Root process
+        interval (float): Seconds between samples
+    """
+    def __init__(self, pid, interval=1.0):
+        """
+        Initialize the sampler.
+
+        Args:
+            pid (int): Root process, e.g. subprocess.Popen.pid
+            interval (float, optional): Seconds between samples. Defaults to 1.0.
+        """
+        self.pid = pid
+        self.interval = interval
+        # (pid, start time) -> last [CPU seconds, read bytes, write bytes], robust to pid reuse
+        self._counters = {}
+        self._rows = []
+        self._started = None
+        self._duration = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start sampling in a background thread.
+
+        Returns:
+            Horses3DResourceSampler: This sampler
+        """
+        self._started = time.perf_counter()
+        self._stopped.clear()
+        if available():
+            self.sample()
+            self._thread = threading.Thread(target=self._run, name='Horses3DResourceSampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            if not self.sample():
+                break
+
+    def sample(self):
+        """
+        Take one sample of the process tree.
+
+        Returns:
+            bool: Whether any process of the tree was alive
+        """
+        if self._started is None:
+            self._started = time.perf_counter()
+        rss = 0
+        processes = 0
+        for pid in process_tree(self.pid):
+            try:
+                _, start, cpu, resident = _read_stat(pid)
+            except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+                continue
+            read, written = _read_io(pid)
+            counters = self._counters.setdefault((pid, start), [0.0, 0, 0])
+            counters[:] = max(cpu, counters[0]), max(read, counters[1]), max(written, counters[2])
+            rss += resident
+            processes += 1
+        if not processes:
+            return False
+
+        cpu, read, written = (sum(values) for values in zip(*self._counters.values()))
+        self._rows.append((time.perf_counter() - self._started, processes, cpu, rss, read, written))
+        return True
+
+    def stop(self):
+        """
+        Stop sampling.
+
+        Returns:
+            dict: The summary, see :meth:`summary`
+        """
+        if self._stopped.is_set():
+            return self.summary()
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            # Last counters of the processes still alive, e.g. before the solver is reaped
+            self.sample()
+        self._duration = time.perf_counter() - self._started if self._started is not None else 0.0
+        return self.summary()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def samples(self):
+        """
+        Returns:
+            dict: 'time' (s since start), 'processes', 'cpu' (cumulative CPU seconds),
+                  'cpuUtilization' (cores used since the previous sample), 'rss' (bytes),
+                  'readBytes' and 'writeBytes' (cumulative), one value per sample
+        """
+        names = ('time', 'processes', 'cpu', 'rss', 'readBytes', 'writeBytes')
+        rows = np.array(self._rows, dtype=np.float64).reshape(-1, len(names))
+        samples = {name: rows[:, j] for j, name in enumerate(names)}
+        utilization = np.diff(samples['cpu']) / np.diff(samples['time']).clip(min=1e-9)
+        samples['cpuUtilization'] = np.concatenate(([np.nan], utilization))[:len(rows)]
+        return samples
+
+    def summary(self):
+        """
+        Resource profile of the run.
+
+        Returns:
+            dict: 'duration' (s), 'samples', 'cpuSeconds', 'cpuUtilization' (mean cores),
+                  'cpuUtilizationPeak' (cores), 'rssPeak' (bytes), 'readBytes', 'writeBytes'
+                  and 'processesPeak'. Empty when nothing was sampled.
+        """
+        if not self._rows:
+            return {}
+        samples = self.samples
+        duration = self._duration or float(samples['time'][-1])
+        peak = np.nanmax(samples['cpuUtilization']) if len(self._rows) > 1 else np.nan
+        return {
+            'duration': duration,
+            'samples': len(self._rows),
+            'cpuSeconds': float(samples['cpu'][-1]),
+            'cpuUtilization': float(samples['cpu'][-1] / duration) if duration > 0 else float('nan'),
+            'cpuUtilizationPeak': float(peak),
+            'rssPeak': int(samples['rss'].max()),
+            'readBytes': int(samples['readBytes'][-1]),
+            'writeBytes': int(samples['writeBytes'][-1]),
+            'processesPeak': int(samples['processes'].max()),
+        }
@@ -0,0 +1,183 @@
+# sharedmesh.py
+
+"""
+Mesh and geometry in shared memory for multi-process post-processing.
+
+The parent process reads the mesh once and places the node coordinates in
+named shared-memory blocks, together with the derived geometry: metric terms,
+Jacobians and element bounding boxes for spatial lookups. Workers attach to
+the blocks by name through a small picklable handle and get read-only numpy
+views without copying. Memory use therefore no longer grows with the number
+of workers.
+"""
+
+import os
+import sys
+import uuid
+from multiprocessing import shared_memory
+import numpy as np
+from .hsol import read_header
+from .polynomials import node_type
+
+# Before 3.13 attaching registers a block with the resource tracker, which unlinks it when
+# the tracker's processes exit; attachers take the registration back
+_TRACK_ON_ATTACH = sys.version_info < (3, 13) and os.name == 'posix'
+
+def _tracker_name(block):
+    # Name under which the resource tracker knows a POSIX block
+    return '/' + block.name
+
+def _attach_blocks(names):
+    if not _TRACK_ON_ATTACH:
+        kwargs = {'track': False} if sys.version_info >= (3, 13) else {}
+        return {key: shared_memory.SharedMemory(name=name, **kwargs) for key, name in names.items()}
+
+    from multiprocessing import resource_tracker
+    blocks = {key: shared_memory.SharedMemory(name=name) for key, name in names.items()}
+    for block in blocks.values():
+        resource_tracker.unregister(_tracker_name(block), 'shared_memory')
+    return blocks
+
+class Horses3DSharedMesh:
+    """
+    Mesh coordinates and geometry held in shared memory.
+
+    Attributes:
+        handle (dict): Picklable description of the blocks, passed to :meth:`attach`
+        nodeType (str): Node family of the elements
+        mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+        jacobianMatrix, jacobian, inverseMetric (numpy.ndarray): Metric terms (see Horses3DDerivatives)
+        boxes (numpy.ndarray): Element bounding boxes, shape (nElements, 2, 3)
+    """
+    def __init__(self, handle, blocks, owner):
+        self.handle = handle
+        self.nodeType = handle['nodeType']
+        self._blocks = blocks
+        self._owner = owner
+        self._arrays = {}
+        for key, (name, shape, dtype) in handle['arrays'].items():
+            array = np.ndarray(shape, dtype=dtype, buffer=blocks[key].buf)
+            array.setflags(write=False)
+            self._arrays[key] = array
+
+    @classmethod
+    def create(cls, mesh, nodeType='gauss', geometry=True):
+        """
+        Copy a mesh (and its geometry) into new shared-memory blocks.
+
+        Args:
+            mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+            nodeType (int or str, optional): Node family. Defaults to 'gauss'.
+            geometry (bool or Horses3DGeometry, optional): Also share the metric terms and
+                                                           bounding boxes, computed or given.
+                                                           Defaults to True.
+
+        Returns:
+            Horses3DSharedMesh: The owner of the blocks, which must call :meth:`unlink`
+        """
+        nodeType = node_type(nodeType)
+        arrays = {'mesh': np.asarray(mesh, dtype=np.float64)}
+        if geometry is True:
+            from .geometry import Horses3DGeometry
+            geometry = Horses3DGeometry(arrays['mesh'], nodeType)
+        if geometry:
+            arrays.update({key: getattr(geometry, key) for key in ('jacobianMatrix', 'jacobian', 'inverseMetric', 'boxes')})
+
+        prefix = f"pyh3d_{uuid.uuid4().hex[:12]}"
+        handle = {'nodeType': nodeType, 'arrays': {}}
+        blocks = {}
+        try:
+            for key, array in arrays.items():
+                block = shared_memory.SharedMemory(name=f"{prefix}_{key}", create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                blocks[key] = block
+                handle['arrays'][key] = (block.name, array.shape, array.dtype.str)
+        except Exception:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        return cls(handle, blocks, owner=True)
+
+    @classmethod
+    def fromFile(cls, meshFile, geometry=True, store=False):
+        """
+        Read a .hmesh file once and share it.
+
+        Args:
+            meshFile (str): Path to the .hmesh file
+            geometry (bool, optional): Also share the metric terms and bounding boxes.
+                                       Defaults to True.
+            store (bool, optional): Take the geometry from the geometry store of the file,
+                                    writing it if needed (see Horses3DGeometry.fromFile).
+                                    Defaults to False, computing it from the mesh read here.
+
+        Returns:
+            Horses3DSharedMesh: The owner of the blocks
+        """
+        from .mesh import Horses3DMesh
+        mesh = Horses3DMesh()._Q_from_file(meshFile).transpose(0,2,3,4,1)
+        if geometry and store:
+            from .geometry import Horses3DGeometry
+            geometry = Horses3DGeometry.fromFile(meshFile, store=True)
+        return cls.create(mesh, read_header(meshFile)['nodeType'], geometry)
+
+    @classmethod
+    def attach(cls, handle):
+        """
+        Attach to blocks created in another process, without copying.
+
+        Args:
+            handle (dict): The :attr:`handle` of the owner
+
+        Returns:
+            Horses3DSharedMesh: Read-only views of the shared arrays
+        """
+        blocks = _attach_blocks({key: name for key, (name, _, _) in handle['arrays'].items()})
+        return cls(handle, blocks, owner=False)
+
+    def __getattr__(self, name):
+        arrays = self.__dict__.get('_arrays', {})
+        if name in arrays:
+            return arrays[name]
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def derivatives(self):
+        """
+        Returns:
+            Horses3DDerivatives: Operator built on the shared metric terms
+        """
+        from .derivatives import Horses3DDerivatives
+        if 'jacobianMatrix' in self._arrays:
+            return Horses3DDerivatives.fromMetrics(self.jacobianMatrix, self.nodeType,
+                                                   self.jacobian, self.inverseMetric)
+        return Horses3DDerivatives(self.mesh, self.nodeType)
+
+    def close(self):
+        """Detach from the blocks. Views of the arrays must not be used afterwards."""
+        self._arrays = {}
+        for block in self._blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                # Views are still referenced elsewhere; the mapping is released with them
+                pass
+
+    def unlink(self):
+        """Release the blocks (owner only), after all workers have finished."""
+        if self._owner:
+            if _TRACK_ON_ATTACH:
+                # Pool workers share the owner's tracker, so their attach may have taken back
+                # the owner's registration: restore it for unlink to release
+                from multiprocessing import resource_tracker
+                for block in self._blocks.values():
+                    resource_tracker.register(_tracker_name(block), 'shared_memory')
+            for block in self._blocks.values():
+                block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.unlink()
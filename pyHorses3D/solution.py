@@ -1,30 +1,210 @@
 # solution.py
 
+import os
 import numpy as np
+from .hsol import read_header, read_elements, index_selection, write_file, SOLUTION_FILE, SOLUTION_AND_GRADIENTS_FILE
+from .cache import decode_cache
+from .profiling import profiler, profiled
 
 class Horses3DSolution:
+    # Method that adds each derived quantity to a snapshot
+    derivedQuantities = {
+        'u': 'computeVelocity',
+        'v': 'computeVelocity',
+        'w': 'computeVelocity',
+        'V': 'computeVelocityMagnitude',
+        'p': 'computePressure',
+        'T': 'computeTemperature',
+        'a': 'computeSpeedOfSound',
+        'M': 'computeMach',
+    }
+
+    # Quantities of the velocity gradient, which need a Horses3DDerivatives operator
+    gradientQuantities = {
+        'omegax': 'computeVorticity',
+        'omegay': 'computeVorticity',
+        'omegaz': 'computeVorticity',
+        'omega': 'computeVorticity',
+        'Q': 'computeQCriterion',
+        'lambda2': 'computeLambda2',
+    }
+
     def __init__(self):
         self.solution = []
+        self.gradients = []
+        self.headers = []
+        # Element indices of each snapshot in its file (None when all elements are loaded)
+        self.elements = []
         self.magnitudes = {'rho': 0, 'rhou': 1, 'rhov': 2, 'rhow': 3, 'rhoe': 4}
         self.gamma = 1.4
         self.R     = 287.1
     
-    def loadAllSolutions(self, allSolutionFiles):
+    def loadAllSolutions(self, allSolutionFiles, elements=None, region=None, meshFile=None):
+        elements = self.selectElements(elements, region, meshFile)
         for solutionFile in allSolutionFiles:
             print(solutionFile)
-            self.solution.append(self._Q_from_file(solutionFile).transpose(0,2,3,4,1))
+            self._load(solutionFile, elements)
 
-    def loadSolutionsInRange(self, allSolutionFiles, first_filename, last_filename, skip=0):
+    def loadSolutionsInRange(self, allSolutionFiles, first_filename, last_filename, skip=0,
+                             elements=None, region=None, meshFile=None):
         first_index = allSolutionFiles.index(first_filename)
         last_index = allSolutionFiles.index(last_filename)
 
+        elements = self.selectElements(elements, region, meshFile)
         for solutionFile in allSolutionFiles[first_index:last_index + 1:skip + 1]:
             print(solutionFile)
-            self.solution.append(self._Q_from_file(solutionFile).transpose(0,2,3,4,1))
+            self._load(solutionFile, elements)
+
+    def loadSingleSolution(self, solutionFileName, elements=None, region=None, meshFile=None):
+        """
+        Load one solution file, optionally only a subset of its elements.
+
+        With a subset, only the byte ranges of the selected elements are read,
+        so I/O and memory scale with the subset. The indices of the loaded
+        elements are kept in :attr:`elements`.
+
+        Args:
+            solutionFileName (str): Path to the .hsol file
+            elements (int, slice, tuple or array, optional): Elements to load. Defaults to all.
+            region (array_like, optional): Load the elements overlapping this box,
+                                           ((xmin, ymin, zmin), (xmax, ymax, zmax))
+            meshFile (str, optional): Mesh file of the run, required with region
+        """
+        self._load(solutionFileName, self.selectElements(elements, region, meshFile))
+
+    @staticmethod
+    def selectElements(elements=None, region=None, meshFile=None):
+        """
+        Resolve an element selection given as indices or as a region of the mesh.
+
+        Args:
+            elements (int, slice, tuple or array, optional): Element indices
+            region (array_like, optional): Lower and upper corners of a box
+            meshFile (str, optional): Mesh file of the run, required with region
+
+        Returns:
+            Selection usable by hsol.read_elements, or None for all elements
+        """
+        if region is None:
+            return elements
+        if elements is not None:
+            raise ValueError("Please provide either elements or region, not both")
+        if meshFile is None:
+            raise ValueError("Selecting a region needs the mesh file")
+        from .region import elements_in_region
+        return elements_in_region(meshFile, region)
+
+    def _load(self, solutionFileName, elements=None):
+        # Gradients are kept alongside each snapshot: (nElements, N1, N2, N3, nGradients, 3), or None
+        header = read_header(solutionFileName)
+        with profiler.stage('solution.read') as stage:
+            if elements is None:
+                if decode_cache.enabled:
+                    Sol, Grad = decode_cache.load(solutionFileName, self._read_file, count=2)
+                else:
+                    Sol, Grad = self._read_file(solutionFileName)
+                stage.add(bytes=os.path.getsize(solutionFileName), elements=Sol.shape[0])
+            else:
+                elements = index_selection(elements, header['nElements'])
+                Sol, Grad = read_elements(solutionFileName, elements)
+                stage.add(bytes=Sol.nbytes + (0 if Grad is None else Grad.nbytes), elements=Sol.shape[0])
+        self.solution.append(Sol.transpose(0,2,3,4,1))
+        self.headers.append(header)
+        self.gradients.append(None if Grad is None else Grad.transpose(0,2,3,4,1,5))
+        self.elements.append(elements)
+
+    def loadFromArchive(self, archive, elements=None, times=None):
+        # Alternative source: snapshots packed with archive.pack_run, reading only the needed chunks
+        from .archive import Horses3DArchive
+
+        if not isinstance(archive, Horses3DArchive):
+            with Horses3DArchive(archive) as opened:
+                return self.loadFromArchive(opened, elements, times)
+
+        indices = None if elements is None else index_selection(elements, archive.nElements)
+        for Q, header in zip(archive.readSnapshots(indices, times), archive.readHeaders(times)):
+            self.solution.append(Q)
+            self.gradients.append(None)
+            self.headers.append(header)
+            self.elements.append(indices)
+
+    def saveSolution(self, idx, fname, variables=None, gradients=True, partial=False, **header):
+        """
+        Write a snapshot as a Horses3D .hsol file, e.g. to restart the solver
+        from a filtered, averaged or reinterpolated state.
+
+        The header (iteration, time, node type, reference values and title) is
+        taken from the file the snapshot was loaded from. Any of these fields
+        can be overridden as keyword arguments.
+
+        Args:
+            idx (int): Index of the solution
+            fname (str): Path of the file to write
+            variables (list, optional): Quantities to write, in order. Defaults to the
+                                        conserved variables, as needed for a restart.
+            gradients (bool, optional): Write the stored gradients, if any, as a
+                                        solution-and-gradients file. Defaults to True.
+            partial (bool, optional): Allow writing a snapshot loaded for a subset of the
+                                      elements (e.g. a region), which no longer matches the
+                                      mesh. Defaults to False.
+            **header: iteration, time, nodeType, refValues or title
+
+        Returns:
+            str: The path of the written file
+
+        Raises:
+            ValueError: If the snapshot holds a subset of the elements and partial is False
+        """
+        elements = self.elements[idx] if idx < len(self.elements) else None
+        if elements is not None and not partial:
+            stored = self.headers[idx] if idx < len(self.headers) else None
+            total = stored.get('nElements') if stored else None
+            if total is None or not np.array_equal(elements, np.arange(total)):
+                raise ValueError(f"Solution {idx} holds {len(elements)} of {total or 'the'} elements and does "
+                                 "not match the mesh; pass partial=True to write it anyway")
+        if variables is None:
+            variables = ['rho', 'rhou', 'rhov', 'rhow', 'rhoe']
+        Q = self.solution[idx][..., [self.magnitudes[name] for name in variables]]
+
+        fields = {'iteration': 0, 'time': 0.0, 'nodeType': 1, 'refValues': None, 'title': 'pyHorses3D'}
+        stored = self.headers[idx] if idx < len(self.headers) else None
+        if stored is not None:
+            fields.update({key: stored[key] for key in ('iteration', 'time', 'nodeType', 'refValues')})
+            fields['title'] = stored['title'] or fields['title']
+        unknown = set(header) - set(fields)
+        if unknown:
+            raise ValueError(f"Unknown header fields: {', '.join(sorted(unknown))}")
+        fields.update(header)
+
+        records = [Q.transpose(0,4,1,2,3)]
+        fileType = SOLUTION_FILE
+        G = self.gradients[idx] if gradients and idx < len(self.gradients) else None
+        if G is not None:
+            records += [G[..., d].transpose(0,4,1,2,3) for d in range(3)]
+            fileType = SOLUTION_AND_GRADIENTS_FILE
 
-    def loadSingleSolution(self, solutionFileName):
-        self.solution.append(self._Q_from_file(solutionFileName).transpose(0,2,3,4,1))
+        with profiler.stage('solution.write') as stage:
+            write_file(fname, records, fileType=fileType, **fields)
+            stage.add(bytes=os.path.getsize(fname), elements=Q.shape[0])
+        return fname
 
+    def computeQuantities(self, idx, names, derivatives=None):
+        # Vorticity, Q and lambda-2 requested together share one velocity gradient
+        gradient = None
+        for name in names:
+            if name not in self.magnitudes:
+                if name in self.derivedQuantities:
+                    getattr(self, self.derivedQuantities[name])(idx)
+                elif name in self.gradientQuantities:
+                    if derivatives is None:
+                        raise ValueError(f"{name} needs a Horses3DDerivatives operator")
+                    if gradient is None:
+                        gradient = derivatives.velocityGradient(self.solution[idx], self.magnitudes)
+                    getattr(self, self.gradientQuantities[name])(idx, derivatives, gradient)
+                else:
+                    raise ValueError(f"Unknown quantity: {name}")
+
+    @profiled('solution.derived.V')
     def computeVelocityMagnitude(self, idx):
         # Extract the velocity components
         rhou = self.solution[idx][..., self.magnitudes['rhou']]
@@ -37,6 +217,21 @@ class Horses3DSolution:
 
         self.magnitudes['V'] = self.solution[idx].shape[-1] - 1
 
+    @profiled('solution.derived.velocity')
+    def computeVelocity(self, idx):
+        rho  = self.solution[idx][..., self.magnitudes['rho']]
+        rhou = self.solution[idx][..., self.magnitudes['rhou']]
+        rhov = self.solution[idx][..., self.magnitudes['rhov']]
+        rhow = self.solution[idx][..., self.magnitudes['rhow']]
+
+        uvw = np.stack((rhou / rho, rhov / rho, rhow / rho), axis=-1)
+
+        self.solution[idx] = np.concatenate((self.solution[idx], uvw), axis=-1)
+        self.magnitudes['u'] = self.solution[idx].shape[-1] - 3
+        self.magnitudes['v'] = self.solution[idx].shape[-1] - 2
+        self.magnitudes['w'] = self.solution[idx].shape[-1] - 1
+
+    @profiled('solution.derived.p')
     def computePressure(self, idx):
         rho  = self.solution[idx][..., self.magnitudes['rho']]
         rhou = self.solution[idx][..., self.magnitudes['rhou']]
@@ -54,6 +249,7 @@ class Horses3DSolution:
         self.solution[idx] = np.concatenate((self.solution[idx], p[..., np.newaxis]), axis=-1)
         self.magnitudes['p'] = self.solution[idx].shape[-1] - 1
 
+    @profiled('solution.derived.T')
     def computeTemperature(self, idx):
         if 'p' not in self.magnitudes:
             self.computePressure(idx)
@@ -66,6 +262,7 @@ class Horses3DSolution:
         self.solution[idx]   = np.concatenate((self.solution[idx], T[..., np.newaxis]), axis=-1)
         self.magnitudes['T'] = self.solution[idx].shape[-1] - 1
 
+    @profiled('solution.derived.a')
     def computeSpeedOfSound(self, idx):
         if 'p' not in self.magnitudes:
             self.computePressure(idx)
@@ -78,6 +275,7 @@ class Horses3DSolution:
         self.solution[idx] = np.concatenate((self.solution[idx], a[..., np.newaxis]), axis=-1)
         self.magnitudes['a'] = self.solution[idx].shape[-1] - 1
 
+    @profiled('solution.derived.M')
     def computeMach(self, idx):
         if 'V' not in self.magnitudes:
             self.computeVelocityMagnitude(idx)
@@ -92,7 +290,41 @@ class Horses3DSolution:
         self.solution[idx] = np.concatenate((self.solution[idx], Mach[..., np.newaxis]), axis=-1)
         self.magnitudes['M'] = self.solution[idx].shape[-1] - 1
 
+    def _velocity_gradient(self, idx, derivatives, gradient=None):
+        if gradient is None:
+            gradient = derivatives.velocityGradient(self.solution[idx], self.magnitudes)
+        return gradient
+
+    @profiled('solution.derived.vorticity')
+    def computeVorticity(self, idx, derivatives, gradient=None):
+        omega = derivatives.vorticity(self._velocity_gradient(idx, derivatives, gradient))
+        omega_magnitude = np.sqrt(np.sum(omega**2, axis=-1))
+
+        self.solution[idx] = np.concatenate((self.solution[idx], omega, omega_magnitude[..., np.newaxis]), axis=-1)
+        self.magnitudes['omegax'] = self.solution[idx].shape[-1] - 4
+        self.magnitudes['omegay'] = self.solution[idx].shape[-1] - 3
+        self.magnitudes['omegaz'] = self.solution[idx].shape[-1] - 2
+        self.magnitudes['omega'] = self.solution[idx].shape[-1] - 1
+
+    @profiled('solution.derived.Q')
+    def computeQCriterion(self, idx, derivatives, gradient=None):
+        Q = derivatives.qCriterion(self._velocity_gradient(idx, derivatives, gradient))
+
+        self.solution[idx] = np.concatenate((self.solution[idx], Q[..., np.newaxis]), axis=-1)
+        self.magnitudes['Q'] = self.solution[idx].shape[-1] - 1
+
+    @profiled('solution.derived.lambda2')
+    def computeLambda2(self, idx, derivatives, gradient=None):
+        lambda2 = derivatives.lambda2(self._velocity_gradient(idx, derivatives, gradient))
+
+        self.solution[idx] = np.concatenate((self.solution[idx], lambda2[..., np.newaxis]), axis=-1)
+        self.magnitudes['lambda2'] = self.solution[idx].shape[-1] - 1
+
     def _Q_from_file(self, fname):
+        return self._read_file(fname)[0]
+
+    def _read_file(self, fname):
+        file_type = np.fromfile(fname, dtype=np.int32, count=1, sep='', offset=128)[0]
         v1 = np.fromfile(fname, dtype=np.int32, count=2, sep='', offset=136)
         No_of_elements = v1[0]
         Iter = v1[1]
@@ -104,6 +336,7 @@ class Horses3DSolution:
         Mesh = []
         
         offset_value = 152+6*8+4
+        Grad = None
         
         for i in range(0,No_of_elements):
             
@@ -116,7 +349,7 @@ class Horses3DSolution:
             offset_value = offset_value + 4*4   
             size = P_order[0]*P_order[1]*P_order[2]*P_order[3]
             
-            Q = np.fromfile(fname, dtype=np.float32, count=size , sep='', offset=offset_value).reshape(P_order,order='F')
+            Q = np.fromfile(fname, dtype=np.float64, count=size , sep='', offset=offset_value).reshape(P_order,order='F')
             
             Q1 = np.zeros( (Q.shape[0], Q.shape[1], Q.shape[2], Q.shape[3] )   )
             size1 = P_order[0]*P_order[1]*P_order[2]*P_order[3] 
@@ -132,8 +365,22 @@ class Horses3DSolution:
             Sol[i,:,:,:,:] = Q1[:,:,:,:]
             
             offset_value = offset_value + size*8
+
+            # Solution and gradients files store U_x, U_y and U_z records after Q
+            if file_type == SOLUTION_AND_GRADIENTS_FILE:
+                for d in range(3):
+                    offset_value = offset_value + 4
+                    G_order = np.fromfile(fname, dtype=np.int32, count=4, sep='', offset=offset_value)
+                    offset_value = offset_value + 4*4
+                    gsize = G_order[0]*G_order[1]*G_order[2]*G_order[3]
+
+                    if (i==0 and d==0):
+                        Grad = np.zeros((No_of_elements,G_order[0],G_order[1],G_order[2],G_order[3],3))
+
+                    Grad[i,:,:,:,:,d] = np.fromfile(fname, dtype=np.float64, count=gsize, sep='', offset=offset_value).reshape(G_order,order='F')
+                    offset_value = offset_value + gsize*8
             
-        return Sol
+        return Sol, Grad
 
     class storage():
         Q = []
@@ -0,0 +1,273 @@
+# stats.py
+
+"""
+Streaming turbulence statistics over Horses3D snapshots.
+
+Means, variances and covariances are accumulated in a single pass with
+Welford updates, so memory depends on the mesh size only and not on the
+number of snapshots. Partial accumulators from parallel workers are
+combined with Chan's pairwise update and can be checkpointed to disk.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .solution import Horses3DSolution
+
+REYNOLDS_STRESSES = [('u', 'u'), ('v', 'v'), ('w', 'w'), ('u', 'v'), ('u', 'w'), ('v', 'w')]
+
+def _accumulate_files(args):
+    variables, covariances, files = args
+    stats = Horses3DStatistics(variables, covariances)
+    for solutionFile in files:
+        stats.updateFromFile(solutionFile)
+    return stats
+
+class Horses3DStatistics:
+    """
+    Single-pass accumulator of means, variances and covariances.
+
+    Attributes:
+        variables (list): Quantities whose mean and variance are accumulated
+        pairs (list): Variable pairs whose co-moments are accumulated. The
+                      diagonal pairs come first, followed by the covariances.
+        count (int): Number of snapshots accumulated
+        files (list): Solution files accumulated so far
+        mean (numpy.ndarray): Running mean, shape (nElements, N1, N2, N3, nVariables)
+        comoment (numpy.ndarray): Running sums of products of deviations,
+                                  shape (nElements, N1, N2, N3, nPairs)
+    """
+    def __init__(self, variables=None, covariances=None):
+        """
+        Initialize an empty accumulator.
+
+        Args:
+            variables (list, optional): Conserved or derived quantities to
+                                        track. Defaults to density, velocity
+                                        components and pressure.
+            covariances (list, optional): Extra (a, b) pairs whose covariance is
+                                          tracked. Defaults to the off-diagonal
+                                          Reynolds stresses when u, v and w are tracked.
+        """
+        self.variables = list(variables) if variables is not None else ['rho', 'u', 'v', 'w', 'p']
+        if covariances is None:
+            covariances = [pair for pair in REYNOLDS_STRESSES if pair[0] != pair[1]]
+            if not all(name in self.variables for name in 'uvw'):
+                covariances = []
+
+        for a, b in covariances:
+            if a not in self.variables or b not in self.variables:
+                raise ValueError(f"Covariance ({a}, {b}) refers to a variable that is not tracked")
+
+        self.pairs = [(name, name) for name in self.variables]
+        self.pairs += [tuple(pair) for pair in covariances if pair[0] != pair[1]]
+        self._pairIndex = [(self.variables.index(a), self.variables.index(b)) for a, b in self.pairs]
+
+        self.count = 0
+        self.files = []
+        self.mean = None
+        self.comoment = None
+
+    def _extract(self, Q, magnitudes):
+        missing = [name for name in self.variables if name not in magnitudes]
+        if missing:
+            raise ValueError(f"Snapshot is missing the quantities: {', '.join(missing)}")
+        return np.stack([Q[..., magnitudes[name]] for name in self.variables], axis=-1)
+
+    def update(self, Q, magnitudes):
+        """
+        Add one snapshot with a Welford update.
+
+        Args:
+            Q (numpy.ndarray): Snapshot of shape (nElements, N1, N2, N3, nQuantities)
+            magnitudes (dict): Mapping of quantity names to indices in the last axis of Q
+        """
+        x = self._extract(Q, magnitudes).astype(np.float64)
+        a, b = np.array(self._pairIndex).T
+
+        if self.count == 0:
+            self.mean = np.zeros_like(x)
+            self.comoment = np.zeros(x.shape[:-1] + (len(self.pairs),))
+
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.comoment += delta[..., a] * (x - self.mean)[..., b]
+
+    def updateFromFile(self, solutionFileName):
+        """
+        Load one solution file, derive the tracked quantities and add it.
+
+        Args:
+            solutionFileName (str): Path to the solution file
+        """
+        snapshot = Horses3DSolution()
+        snapshot.loadSingleSolution(solutionFileName)
+        snapshot.computeQuantities(0, self.variables)
+
+        self.update(snapshot.solution[0], snapshot.magnitudes)
+        self.files.append(solutionFileName)
+
+    def merge(self, other):
+        """
+        Combine another accumulator into this one with Chan's parallel update.
+
+        Args:
+            other (Horses3DStatistics): Accumulator over a disjoint set of snapshots
+
+        Returns:
+            Horses3DStatistics: This accumulator
+        """
+        if other.variables != self.variables or other.pairs != self.pairs:
+            raise ValueError("Cannot merge accumulators that track different quantities")
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.comoment = other.count, other.mean.copy(), other.comoment.copy()
+            self.files = list(other.files)
+            return self
+
+        a, b = np.array(self._pairIndex).T
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.comoment += other.comoment + delta[..., a] * delta[..., b] * (self.count * other.count / n)
+        self.mean += delta * (other.count / n)
+        self.count = n
+        self.files += other.files
+        return self
+
+    def accumulate(self, solutionFiles, jobs=1, checkpoint=None, checkpointInterval=50):
+        """
+        Accumulate a series of solution files.
+
+        Files that are already part of the accumulator (e.g. after loading a
+        checkpoint) are skipped, so an interrupted run can be resumed.
+
+        Args:
+            solutionFiles (list): Solution files to accumulate
+            jobs (int, optional): Number of worker processes. Defaults to 1.
+            checkpoint (str, optional): Path of a checkpoint file written every
+                                        ``checkpointInterval`` files
+            checkpointInterval (int, optional): Files between checkpoints. Defaults to 50.
+
+        Returns:
+            Horses3DStatistics: This accumulator
+        """
+        done = set(self.files)
+        pending = [f for f in solutionFiles if f not in done]
+
+        step = checkpointInterval if checkpoint else max(len(pending), 1)
+        for start in range(0, len(pending), step):
+            batch = pending[start:start + step]
+            if jobs > 1 and len(batch) > 1:
+                chunks = [batch[i::jobs] for i in range(jobs) if batch[i::jobs]]
+                with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+                    for partial in executor.map(_accumulate_files, [(self.variables, self._covariances(), c) for c in chunks]):
+                        self.merge(partial)
+            else:
+                for solutionFile in batch:
+                    self.updateFromFile(solutionFile)
+
+            if checkpoint:
+                self.save(checkpoint)
+
+        return self
+
+    def _covariances(self):
+        return self.pairs[len(self.variables):]
+
+    def _pair(self, a, b):
+        for i, pair in enumerate(self.pairs):
+            if pair == (a, b) or pair == (b, a):
+                return i
+        raise ValueError(f"Covariance ({a}, {b}) is not tracked")
+
+    def meanField(self, name):
+        """
+        Args:
+            name (str): Tracked quantity
+
+        Returns:
+            numpy.ndarray: Time-averaged field, shape (nElements, N1, N2, N3)
+        """
+        return self.mean[..., self.variables.index(name)]
+
+    def covariance(self, a, b, ddof=0):
+        """
+        Args:
+            a (str): First tracked quantity
+            b (str): Second tracked quantity
+            ddof (int, optional): Delta degrees of freedom. Defaults to 0.
+
+        Returns:
+            numpy.ndarray: Covariance field <a'b'>
+        """
+        if self.count - ddof <= 0:
+            raise ValueError("Not enough snapshots accumulated")
+        return self.comoment[..., self._pair(a, b)] / (self.count - ddof)
+
+    def variance(self, name, ddof=0):
+        return self.covariance(name, name, ddof)
+
+    def rms(self, name, ddof=0):
+        return np.sqrt(self.variance(name, ddof))
+
+    def reynoldsStresses(self):
+        """
+        Returns:
+            dict: Fields <u'u'>, <v'v'>, <w'w'>, <u'v'>, <u'w'> and <v'w'> keyed by pair
+        """
+        return {a + b: self.covariance(a, b) for a, b in REYNOLDS_STRESSES}
+
+    def toSolution(self):
+        """
+        Export the mean and RMS fields in the Horses3DSolution layout.
+
+        Returns:
+            Horses3DSolution: Solution with a single entry holding the mean of
+                              every quantity followed by its RMS (keys '<name>_rms')
+        """
+        result = Horses3DSolution()
+        rms = np.sqrt(self.comoment[..., :len(self.variables)] / self.count)
+        result.solution.append(np.concatenate((self.mean, rms), axis=-1))
+        result.magnitudes = {name: i for i, name in enumerate(self.variables)}
+        result.magnitudes.update({f"{name}_rms": len(self.variables) + i for i, name in enumerate(self.variables)})
+        return result
+
+    def save(self, filepath):
+        """
+        Write a checkpoint of the accumulator.
+
+        Args:
+            filepath (str): Path of the .npz checkpoint
+        """
+        tmp = filepath + '.tmp.npz'
+        empty = np.zeros(0)
+        np.savez(tmp, count=self.count,
+                 mean=self.mean if self.count else empty,
+                 comoment=self.comoment if self.count else empty,
+                 variables=np.array(self.variables), pairs=np.array(self.pairs, dtype=str).reshape(-1, 2),
+                 files=np.array(self.files, dtype=str))
+        os.replace(tmp, filepath)
+
+    @classmethod
+    def load(cls, filepath):
+        """
+        Restore an accumulator from a checkpoint written by :meth:`save`.
+
+        Args:
+            filepath (str): Path of the .npz checkpoint
+
+        Returns:
+            Horses3DStatistics: The restored accumulator
+        """
+        with np.load(filepath) as data:
+            variables = data['variables'].tolist()
+            pairs = [tuple(pair) for pair in data['pairs'].tolist()]
+            stats = cls(variables, pairs[len(variables):])
+            stats.count = int(data['count'])
+            if stats.count:
+                stats.mean = data['mean']
+                stats.comoment = data['comoment']
+            stats.files = data['files'].tolist()
+        return stats
@@ -0,0 +1,170 @@
+# synthetic.py
+
+"""
+Synthetic Horses3D runs for benchmarks and tests.
+
+Generates .hmesh/.hsol files of any element count and polynomial order in
+the same binary layout the solver writes. It also writes a residuals file
+and a control file, so the Horses3D class finds the outputs exactly as it
+would after a real run, without needing a solver binary.
+"""
+
+import os
+import numpy as np
+from .control import Horses3DControl
+from .hsol import write_file, MESH_FILE, SOLUTION_FILE, SOLUTION_AND_GRADIENTS_FILE
+from .polynomials import nodes_and_weights, node_type, GAUSS, NODE_TYPE_CODES
+
+def box_mesh(nElements, order, nodeType=GAUSS, length=2*np.pi):
+    """
+    Node coordinates of a box of hexahedral elements.
+
+    Elements fill a cube of ceil(nElements^(1/3)) elements per side in
+    row-major order; when nElements is not a perfect cube the last layer is
+    partially filled.
+
+    Args:
+        nElements (int): Number of elements
+        order (int): Polynomial order (order + 1 nodes per direction)
+        nodeType (str, optional): Node family. Defaults to 'gauss'.
+        length (float, optional): Side of the full cube. Defaults to 2*pi.
+
+    Returns:
+        numpy.ndarray: Node coordinates, shape (nElements, order+1, order+1, order+1, 3)
+    """
+    k = int(np.ceil(round(nElements ** (1.0/3.0), 6)))
+    h = length / k
+    xi, _ = nodes_and_weights(order + 1, node_type(nodeType))
+    local = (xi + 1.0) / 2.0 * h
+
+    i, j, l = np.unravel_index(np.arange(nElements), (k, k, k))
+    corner = np.stack((i, j, l), axis=-1) * h
+    X = corner[:, np.newaxis, np.newaxis, np.newaxis, :] + np.stack(np.meshgrid(local, local, local, indexing='ij'), axis=-1)
+    return X
+
+def taylor_green_state(mesh, time=0.0, mach=0.1, reynolds=1600.0, gamma=1.4):
+    """
+    Conserved variables of a (viscously decaying) Taylor-Green vortex.
+
+    Args:
+        mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+        time (float, optional): Time used for the decay factor. Defaults to 0.0.
+        mach (float, optional): Reference Mach number. Defaults to 0.1.
+        reynolds (float, optional): Reynolds number of the decay. Defaults to 1600.
+        gamma (float, optional): Ratio of specific heats. Defaults to 1.4.
+
+    Returns:
+        numpy.ndarray: State of shape (nElements, N1, N2, N3, 5) with rho, rhou, rhov, rhow, rhoe
+    """
+    x, y, z = mesh[..., 0], mesh[..., 1], mesh[..., 2]
+    decay = np.exp(-2.0 * time / reynolds)
+    u = np.sin(x) * np.cos(y) * np.cos(z) * decay
+    v = -np.cos(x) * np.sin(y) * np.cos(z) * decay
+    w = np.zeros_like(u)
+    p = 1.0 / (gamma * mach**2) + (np.cos(2*x) + np.cos(2*y)) * (np.cos(2*z) + 2.0) / 16.0 * decay**2
+    rho = np.ones_like(u)
+    rhoe = p / (gamma - 1.0) + 0.5 * rho * (u**2 + v**2 + w**2)
+    return np.stack((rho, rho*u, rho*v, rho*w, rhoe), axis=-1)
+
+def write_mesh(fname, mesh, nodeType=GAUSS):
+    """
+    Write node coordinates as a .hmesh file.
+
+    Args:
+        fname (str): Path of the file
+        mesh (numpy.ndarray): Node coordinates, shape (nElements, N1, N2, N3, 3)
+        nodeType (str, optional): Node family. Defaults to 'gauss'.
+    """
+    return write_file(fname, [mesh.transpose(0,4,1,2,3)], fileType=MESH_FILE,
+                      nodeType=NODE_TYPE_CODES[node_type(nodeType)], title='synthetic mesh')
+
+def write_solution(fname, Q, time=0.0, iteration=0, nodeType=GAUSS, gradients=None):
+    """
+    Write a state as a .hsol file.
+
+    Args:
+        fname (str): Path of the file
+        Q (numpy.ndarray): State, shape (nElements, N1, N2, N3, nVariables)
+        time (float, optional): Physical time. Defaults to 0.0.
+        iteration (int, optional): Iteration number. Defaults to 0.
+        nodeType (str, optional): Node family. Defaults to 'gauss'.
+        gradients (numpy.ndarray, optional): Gradients, shape (nElements, N1, N2, N3, nGradients, 3).
+                                             When given, a solution-and-gradients file is written.
+    """
+    records = [Q.transpose(0,4,1,2,3)]
+    fileType = SOLUTION_FILE
+    if gradients is not None:
+        records += [gradients[..., d].transpose(0,4,1,2,3) for d in range(3)]
+        fileType = SOLUTION_AND_GRADIENTS_FILE
+    return write_file(fname, records, fileType=fileType, nodeType=NODE_TYPE_CODES[node_type(nodeType)],
+                      iteration=iteration, time=time, refValues=[1.4, 287.1, 1.0, 1.0, 300.0, 0.1],
+                      title='synthetic solution')
+
+def write_residuals(fname, nIterations, dt=1e-3):
+    """
+    Write a residuals file with the column layout of Horses3D.
+
+    Args:
+        fname (str): Path of the file
+        nIterations (int): Number of iterations (rows)
+        dt (float, optional): Time step. Defaults to 1e-3.
+    """
+    columns = ['Iteration', 'Time', 'Elapsed Time (s)', 'CPU Time (s)',
+               'continuity', 'x-momentum', 'y-momentum', 'z-momentum', 'energy']
+    it = np.arange(1, nIterations + 1)
+    residuals = np.exp(-np.outer(it, [1.0, 1.1, 1.2, 1.3, 1.4]) / max(nIterations, 1) * 10.0)
+    table = np.column_stack((it, it*dt, it*0.01, it*0.01, residuals))
+    with open(fname, 'w') as file:
+        file.write('#' + '  '.join(columns) + '\n')
+        np.savetxt(file, table, fmt='%.10e', delimiter='  ')
+    return fname
+
+def generate_run(directory, nElements=512, order=4, nSnapshots=10, outputInterval=50,
+                 name='synthetic', nodeType=GAUSS, gradients=False, dt=1e-3):
+    """
+    Generate a complete synthetic run in the layout written by Horses3D.
+
+    Creates ``MESH/<name>_0.hmesh``, ``RESULTS/<name>_<iteration>.hsol``,
+    ``RESULTS/<name>.residuals`` and ``<name>.control`` under ``directory``.
+
+    Args:
+        directory (str): Run directory (created if needed)
+        nElements (int, optional): Number of elements. Defaults to 512.
+        order (int, optional): Polynomial order. Defaults to 4.
+        nSnapshots (int, optional): Number of solution files. Defaults to 10.
+        outputInterval (int, optional): Iterations between snapshots. Defaults to 50.
+        name (str, optional): Base name of the run. Defaults to 'synthetic'.
+        nodeType (str, optional): Node family. Defaults to 'gauss'.
+        gradients (bool, optional): Write solution-and-gradients files. Defaults to False.
+        dt (float, optional): Time step. Defaults to 1e-3.
+
+    Returns:
+        dict: Paths of the 'control', 'mesh', 'residuals' and 'solutions' files
+    """
+    os.makedirs(os.path.join(directory, 'MESH'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'RESULTS'), exist_ok=True)
+
+    mesh = box_mesh(nElements, order, nodeType)
+    meshFile = write_mesh(os.path.join(directory, 'MESH', f'{name}_0.hmesh'), mesh, nodeType)
+
+    solutionFiles = []
+    for s in range(nSnapshots):
+        iteration = s * outputInterval
+        Q = taylor_green_state(mesh, time=iteration*dt)
+        G = np.zeros(Q.shape + (3,)) if gradients else None
+        fname = os.path.join(directory, 'RESULTS', f'{name}_{iteration:010d}.hsol')
+        solutionFiles.append(write_solution(fname, Q, time=iteration*dt, iteration=iteration,
+                                            nodeType=nodeType, gradients=G))
+
+    residualsFile = write_residuals(os.path.join(directory, 'RESULTS', f'{name}.residuals'),
+                                    max((nSnapshots - 1) * outputInterval, 1), dt)
+
+    control = Horses3DControl()
+    control.set_parameter('mesh file name', f'"MESH/{name}.mesh"')
+    control.set_parameter('solution file name', f'"RESULTS/{name}.hsol"')
+    control.set_parameter('Polynomial order', str(order))
+    control.set_parameter('Output Interval', str(outputInterval))
+    control.set_parameter('save gradients with solution', '.true.' if gradients else '.false.')
+    controlFile = control.saveControlFile(os.path.join(directory, f'{name}.control'))
+
+    return {'control': controlFile, 'mesh': meshFile, 'residuals': residualsFile, 'solutions': solutionFiles}
@@ -0,0 +1,218 @@
+# telemetry.py
+
+"""
+Structured telemetry from the standard output of Horses3D.
+
+The solver prints a table of its progress: a header naming the columns
+(iteration, time, time step or CFL, residuals, wall time, ...) and one row
+every few iterations. Horses3DTelemetry parses the rows as they arrive into
+numpy ring buffers preallocated for a fixed number of rows, so memory stays
+bounded however long the run is, and stamps every row with the wall clock
+to derive live throughput (iterations/s and degree-of-freedom updates/s).
+Echoing to the terminal is optional and can be throttled to one table row
+per interval; other lines, such as warnings and errors, are always echoed.
+"""
+
+import re
+import sys
+import time
+from collections import deque
+import numpy as np
+
+DEFAULT_CAPACITY = 2**16
+
+def count_dofs(fname, variables=5):
+    """
+    Degrees of freedom of a Horses3D run, from its mesh or solution file.
+
+    Args:
+        fname (str): Path to an .hmesh or .hsol file
+        variables (int, optional): Solution variables per node. Defaults to 5.
+
+    Returns:
+        int: Nodes times variables
+    """
+    from .hsol import offset_table
+    shapes = offset_table(fname)['shapes'][:, 0, 1:]
+    return int(np.prod(shapes, axis=1, dtype=np.int64).sum()) * variables
+
+class Horses3DTelemetry:
+    """
+    Parser of the solver log into bounded ring buffers.
+
+    Attributes:
+        names (list): Column names of the progress table
+        capacity (int): Rows kept in the buffers
+        count (int): Rows parsed since the start (or since the columns changed)
+        messages (collections.deque): Most recent lines that are not table rows
+        dofs (int): Degrees of freedom, for DOF updates/s
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, echo=True, echoInterval=0.0, stream=None,
+                 dofs=None, maxMessages=1000):
+        """
+        Initialize the telemetry.
+
+        Args:
+            capacity (int, optional): Rows kept in the ring buffers. Defaults to 65536.
+            echo (bool, optional): Echo the log to the terminal. Defaults to True.
+            echoInterval (float, optional): Minimum seconds between echoed table rows;
+                                            0 echoes every line. Defaults to 0.0.
+            stream (file, optional): Terminal stream. Defaults to sys.stdout.
+            dofs (int or callable, optional): Degrees of freedom, or a callable returning
+                                              them once known (see :func:`count_dofs`)
+            maxMessages (int, optional): Lines other than table rows kept in messages.
+                                         Defaults to 1000.
+        """
+        self.capacity = capacity
+        self.echo = echo
+        self.echoInterval = echoInterval
+        self.stream = stream
+        self._dofs = dofs
+        self.messages = deque(maxlen=maxMessages)
+        self.names = []
+        self._lastEcho = -np.inf
+        self._reset([])
+
+    def _reset(self, names):
+        self.names = names
+        self.count = 0
+        self._values = np.full((self.capacity, len(names)), np.nan)
+        self._clock = np.full(self.capacity, np.nan)
+
+    @property
+    def dofs(self):
+        if callable(self._dofs):
+            try:
+                self._dofs = self._dofs()
+            except (OSError, ValueError, IndexError):
+                # Not known yet (e.g. the mesh file is not written): try again later
+                return None
+        return self._dofs
+
+    @dofs.setter
+    def dofs(self, value):
+        self._dofs = value
+
+    @staticmethod
+    def _split(line):
+        separator = r'\s*\|\s*' if '|' in line else r'\s{2,}'
+        return [field for field in re.split(separator, line.strip()) if field]
+
+    def feed(self, line, clock=None):
+        """
+        Parse one line of the solver output and echo it if due.
+
+        Args:
+            line (str): Line, with or without the newline
+            clock (float, optional): Arrival time (time.perf_counter). Defaults to now.
+
+        Returns:
+            bool: Whether the line was a table row
+        """
+        clock = time.perf_counter() if clock is None else clock
+        row = self._parse_row(line)
+        if row is not None:
+            i = self.count % self.capacity
+            self._values[i] = row
+            self._clock[i] = clock
+            self.count += 1
+            due = clock - self._lastEcho >= self.echoInterval
+        else:
+            fields = self._split(line)
+            if fields and fields[0].lower() == 'iteration':
+                # Table header, repeated by the solver every few rows
+                repeated = fields == self.names
+                if not repeated:
+                    self._reset(fields)
+                due = not (repeated and self.echoInterval > 0)
+            else:
+                if line.strip():
+                    self.messages.append(line.rstrip('\n'))
+                due = True
+
+        if self.echo and due:
+            if row is not None:
+                self._lastEcho = clock
+            stream = self.stream or sys.stdout
+            stream.write(line if line.endswith('\n') else line + '\n')
+        return row is not None
+
+    def _parse_row(self, line):
+        if not self.names:
+            return None
+        tokens = line.replace('|', ' ').split()
+        if len(tokens) != len(self.names) or not tokens[0].isdigit():
+            return None
+        try:
+            return [float(token.replace('D', 'E')) for token in tokens]
+        except ValueError:
+            return None
+
+    def _ordered(self, array):
+        # Chronological view of a ring buffer
+        if self.count <= self.capacity:
+            return array[:self.count]
+        start = self.count % self.capacity
+        return np.concatenate((array[start:], array[:start]))
+
+    def __getitem__(self, name):
+        """
+        Values of a column for the rows kept, oldest first.
+
+        Args:
+            name (str): Column name, e.g. 'Iteration' or a residual, or 'clock' for the arrival times
+
+        Returns:
+            numpy.ndarray: The values
+        """
+        if name == 'clock':
+            return self._ordered(self._clock)
+        return self._ordered(self._values[:, self.names.index(name)])
+
+    def columns(self):
+        """
+        Returns:
+            dict: Every column of the rows kept, oldest first, and their arrival times as 'clock'
+        """
+        values = self._ordered(self._values)
+        table = {name: values[:, j] for j, name in enumerate(self.names)}
+        table['clock'] = self._ordered(self._clock)
+        return table
+
+    def latest(self):
+        """
+        Returns:
+            dict: Last row, or an empty dict before the first one
+        """
+        if not self.count:
+            return {}
+        i = (self.count - 1) % self.capacity
+        return dict(zip(self.names, self._values[i].tolist()))
+
+    def throughput(self, window=None):
+        """
+        Live throughput from the arrival times of the rows.
+
+        Args:
+            window (float, optional): Seconds of the most recent rows to use. Defaults to all rows kept.
+
+        Returns:
+            dict: 'iterationsPerSecond', 'secondsPerIteration' and, when the degrees of
+                  freedom are known, 'dofUpdatesPerSecond'. Empty until two rows arrived.
+        """
+        if self.count < 2:
+            return {}
+        clock = self['clock']
+        iteration = self._ordered(self._values[:, 0])
+        first = 0 if window is None else int(np.searchsorted(clock, clock[-1] - window))
+        first = min(first, len(clock) - 2)
+        elapsed = clock[-1] - clock[first]
+        steps = iteration[-1] - iteration[first]
+        if elapsed <= 0 or steps <= 0:
+            return {}
+
+        rates = {'iterationsPerSecond': float(steps / elapsed), 'secondsPerIteration': float(elapsed / steps)}
+        dofs = self.dofs
+        if dofs:
+            rates['dofUpdatesPerSecond'] = rates['iterationsPerSecond'] * dofs
+        return rates
@@ -0,0 +1,168 @@
+# watch.py
+
+"""
+Live post-processing of solution files while Horses3D is running.
+
+A background thread polls for solution files matching a glob pattern. A file
+is considered finished once its size is unchanged over a number of
+consecutive polls. Finished files are handed to a user-supplied pipeline
+running in a worker pool, so post-processing overlaps the solver run instead
+of starting after it. When the watcher stops, every remaining file is taken
+as final, since the solver no longer writes to it.
+"""
+
+import glob
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from .hsol import HEADER_SIZE
+
+class Horses3DWatcher:
+    """
+    Watches for new solution files and processes them as they are completed.
+
+    Attributes:
+        pattern (str): Glob pattern of the watched files
+        results (dict): Result of the pipeline for each processed file
+        errors (dict): Exception raised by the pipeline for each failed file
+    """
+    def __init__(self, pattern, pipeline, jobs=1, pollInterval=1.0, stableChecks=2,
+                 ignoreExisting=False, useProcesses=True):
+        """
+        Initialize the watcher.
+
+        Args:
+            pattern (str): Glob pattern of the solution files, e.g. 'RESULTS/case_*.hsol'
+            pipeline (callable): Called with the path of every finished file. It must be
+                                 picklable (a module-level function or functools.partial)
+                                 when useProcesses is True.
+            jobs (int, optional): Number of workers. Defaults to 1.
+            pollInterval (float, optional): Seconds between polls. Defaults to 1.0.
+            stableChecks (int, optional): Consecutive polls with an unchanged size
+                                          before a file is processed. Defaults to 2.
+            ignoreExisting (bool, optional): Skip files present when the watcher starts,
+                                             unless they are rewritten afterwards (e.g. by a
+                                             rerun of the case). Defaults to False.
+            useProcesses (bool, optional): Run the pipeline in processes rather than threads.
+                                           Defaults to True.
+        """
+        self.pattern = pattern
+        self.pipeline = pipeline
+        self.jobs = jobs
+        self.pollInterval = pollInterval
+        self.stableChecks = stableChecks
+        self.ignoreExisting = ignoreExisting
+        self.useProcesses = useProcesses
+
+        self.results = {}
+        self.errors = {}
+        self._sizes = {}
+        # Files present at start -> (size, mtime) then, skipped while unchanged
+        self._existing = {}
+        self._submitted = set()
+        self._futures = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    def start(self):
+        """
+        Start polling in a background thread.
+
+        Returns:
+            Horses3DWatcher: This watcher
+        """
+        if self.ignoreExisting:
+            for fname in glob.glob(self.pattern):
+                try:
+                    stat = os.stat(fname)
+                except OSError:
+                    continue
+                self._existing[fname] = (stat.st_size, stat.st_mtime_ns)
+
+        pool = ProcessPoolExecutor if self.useProcesses else ThreadPoolExecutor
+        self._executor = pool(max_workers=self.jobs)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='Horses3DWatcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.pollInterval):
+            self.poll()
+
+    def poll(self, final=False):
+        """
+        Scan once for finished files and submit them to the pipeline.
+
+        Args:
+            final (bool, optional): Take every file as finished, without waiting
+                                    for its size to settle. Defaults to False.
+
+        Returns:
+            list: Files submitted by this scan, in name order
+        """
+        ready = []
+        with self._lock:
+            for fname in sorted(glob.glob(self.pattern)):
+                if fname in self._submitted:
+                    continue
+                try:
+                    stat = os.stat(fname)
+                except OSError:
+                    continue
+                size = stat.st_size
+                if fname in self._existing:
+                    if self._existing[fname] == (size, stat.st_mtime_ns):
+                        continue
+                    # Rewritten since the start, e.g. by a rerun in the same directory
+                    del self._existing[fname]
+
+                previous, count = self._sizes.get(fname, (None, 0))
+                count = count + 1 if size == previous else 0
+                self._sizes[fname] = (size, count)
+
+                if size > HEADER_SIZE and (final or count >= self.stableChecks - 1):
+                    self._submitted.add(fname)
+                    del self._sizes[fname]
+                    ready.append(fname)
+
+            for fname in ready:
+                future = self._executor.submit(self.pipeline, fname)
+                future.add_done_callback(lambda f, fname=fname: self._collect(fname, f))
+                self._futures.append(future)
+        return ready
+
+    def _collect(self, fname, future):
+        error = future.exception()
+        if error is None:
+            self.results[fname] = future.result()
+        else:
+            self.errors[fname] = error
+
+    def stop(self, wait=True):
+        """
+        Stop polling, process the remaining files and shut down the workers.
+
+        Args:
+            wait (bool, optional): Wait for the pipeline to finish. Defaults to True.
+
+        Returns:
+            dict: Results of the pipeline by file
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self.poll(final=True)
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        return self.results
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()